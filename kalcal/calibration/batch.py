@@ -0,0 +1,203 @@
+from omegaconf import OmegaConf as ocf
+from kalcal.calibration.vanilla import calibrate
+from kalcal.calibration.warmup import warmup_options
+from contextlib import redirect_stdout, redirect_stderr
+from glob import glob
+from time import time
+import numpy as np
+import traceback
+import json
+import os
+
+
+def expand_ms(patterns):
+    """Expand a list of ms paths and glob patterns into a
+    sorted list of unique ms paths, keeping the order of the
+    patterns."""
+
+    msnames, paths = [], set()
+    for pattern in patterns:
+        matches = sorted(glob(pattern)) or [pattern]
+        for msname in matches:
+            path = os.path.abspath(os.path.normpath(msname))
+            if path not in paths:
+                msnames.append(msname)
+                paths.add(path)
+
+    return msnames
+
+
+def _stem(msname):
+    return os.path.splitext(os.path.basename(os.path.normpath(msname)))[0]
+
+
+def ms_labels(msnames):
+    """Names to prefix the outputs of each ms with, which is the
+    name of the ms without its extension, unless two ms share a
+    name. Then the path of each ms relative to the directory
+    common to all is used, e.g. `a-obs` and `b-obs` for
+    `/data/a/obs.ms` and `/data/b/obs.ms`."""
+
+    labels = [_stem(msname) for msname in msnames]
+    if len(set(labels)) < len(labels):
+        paths = [os.path.abspath(os.path.normpath(msname))
+                    for msname in msnames]
+        root = os.path.commonpath(paths)
+        labels = [os.path.splitext(os.path.relpath(path, root))[0]\
+                    .replace(os.sep, "-") for path in paths]
+
+    # Outputs of different ms must not overwrite each other
+    duplicates = sorted({label for label in labels
+                            if labels.count(label) > 1})
+    if duplicates:
+        raise ValueError(f"Cannot name the outputs of each ms "\
+                            + f"uniquely, {duplicates} are used for "\
+                            + f"more than one ms.")
+
+    return labels
+
+
+def _out_path(label, out_dir, out):
+    """Output path for a single ms, prefixing the label of the
+    ms to `out` and placing it in `out_dir`."""
+
+    if out is None or out == "":
+        return out
+
+    return os.path.join(out_dir, f"{label}-{os.path.basename(out)}")
+
+
+def _init_worker(options):
+    """Set up a worker process once, before it calibrates
+    any ms, so that the numba kernels are compiled only once
+    per worker instead of once per ms."""
+
+    if options.get("ncpu"):
+        import numba
+        numba.set_num_threads(n=options["ncpu"])
+
+    try:
+        with open(os.devnull, "w") as null, redirect_stdout(null):
+            warmup_options(options)
+    except Exception as error:
+        # Compile on first ms instead, which reports the error
+        message = str(error).splitlines()[0] if str(error) else ""
+        print(f"==> Worker {os.getpid()} warm-up failed: "\
+                + f"{type(error).__name__}: {message}")
+
+
+def _calibrate_one(msname, label, options, out_dir):
+    """Calibrate a single ms in a worker, logging its output to
+    a file (prefixed by `label`) and catching any error, so that
+    one ms failing does not stop the others. Returns the result
+    of the ms."""
+
+    options = dict(options)
+    options["yaml"] = None
+    for key in ["out_filter", "out_smoother"]:
+        options[key] = _out_path(label, out_dir, options[key])
+
+    log = _out_path(label, out_dir, "calibrate.log")
+    result = {
+        "ms" : msname,
+        "status" : "ok",
+        "time" : None,
+        "error" : None,
+        "pid" : os.getpid(),
+        "log" : log,
+        "out_filter" : options["out_filter"],
+        "out_smoother" : options["out_smoother"]
+    }
+
+    start = time()
+    with open(log, "w") as file, redirect_stdout(file),\
+            redirect_stderr(file):
+        try:
+            calibrate(msname, **options)
+        except Exception as error:
+            traceback.print_exc()
+            result["status"] = "failed"
+            result["error"] = f"{type(error).__name__}: {error}"
+    result["time"] = time() - start
+
+    return result
+
+
+def calibrate_batch(ms, **kwargs):
+    """Calibrate a batch of ms, given as paths or glob patterns,
+    with the vanilla calibrate options on a pool of worker
+    processes. Each worker compiles the kernels once and then
+    calibrates an ms at a time, with per-ms results, timings
+    and logs in `out_dir`."""
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from concurrent.futures.process import BrokenProcessPool
+    import multiprocessing
+
+    # Options to dictionary, shared by every ms
+    if kwargs["yaml"] is not None:
+        options = ocf.to_container(ocf.load(kwargs["yaml"]))
+    else:
+        options = dict(kwargs)
+
+    # Batch options, not passed on to calibrate
+    workers = options.pop("workers", kwargs.get("workers")) or 1
+    out_dir = options.pop("out_dir", kwargs.get("out_dir")) or "."
+    summary = options.pop("summary", kwargs.get("summary"))
+
+    # Find ms to calibrate
+    msnames = expand_ms(ms)
+    if len(msnames) == 0:
+        raise ValueError("No ms given to calibrate.")
+    labels = ms_labels(msnames)
+
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Spawned processes, since forking after dask and numba
+    # have started threads can deadlock
+    n_workers = max(min(workers, len(msnames)), 1)
+    print(f"==> Calibrating {len(msnames)} ms on {n_workers} "\
+            + f"worker process(es)")
+
+    results = []
+    wall_start = time()
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=context,
+                                initializer=_init_worker,
+                                initargs=(options,)) as pool:
+        futures = {pool.submit(_calibrate_one, msname, label, options,
+                                out_dir): msname
+                        for msname, label in zip(msnames, labels)}
+
+        for future in as_completed(futures):
+            # A crashed worker fails its own ms and breaks the
+            # pool, failing the ms still queued on it
+            try:
+                result = future.result()
+            except BrokenProcessPool as error:
+                result = {"ms" : futures[future], "status" : "failed",
+                            "time" : None, "error" : f"Worker "\
+                            + f"process died: {error}"}
+            results.append(result)
+
+            if result["status"] == "ok":
+                print(f"==> `{result['ms']}` done in "\
+                        + f"{np.round(result['time'], 3)} s")
+            else:
+                print(f"==> `{result['ms']}` failed: {result['error']}")
+    wall_time = time() - wall_start
+
+    # Results in the order the ms were given
+    results.sort(key=lambda result: msnames.index(result["ms"]))
+    n_failed = sum(result["status"] != "ok" for result in results)
+    print(f"==> Batch complete: {len(results) - n_failed} ok, "\
+            + f"{n_failed} failed in {np.round(wall_time, 3)} s")
+
+    # Output results to json file
+    if summary is not None and summary != "":
+        with open(summary, "w") as file:
+            json.dump({"wall_time" : wall_time,
+                       "results" : results}, file, indent=2)
+        print(f"==> Batch summary saved to `{summary}`")
+
+    return results
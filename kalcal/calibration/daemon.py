@@ -0,0 +1,282 @@
+from omegaconf import OmegaConf as ocf
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+from time import time
+import numpy as np
+import traceback
+import json
+import os
+
+
+def _column_files(msname, columns):
+    """Files of the main table of an ms holding `columns`, i.e.
+    those of the data managers storing them."""
+
+    from casacore.tables import table
+
+    with table(msname, ack=False) as tab:
+        managers = tab.getdminfo().values()
+    prefixes = [f"table.f{manager['SEQNR']}" for manager in managers
+                    if set(manager["COLUMNS"]) & set(columns)]
+
+    return [os.path.join(msname, name) for name in os.listdir(msname)
+                for prefix in prefixes
+                    if name == prefix or name == prefix + "i"
+                        or name.startswith(prefix + "_")]
+
+
+def _ms_mtime(msname, columns):
+    """Last modification time of the files of an ms holding
+    `columns`, which changes whenever one of them is written to,
+    but not when other columns are. All table files are used if
+    the columns are not found."""
+
+    paths = _column_files(msname, columns)\
+                or [os.path.join(msname, name) for name in os.listdir(msname)]
+
+    return max(os.path.getmtime(path) for path in paths)
+
+
+class MSCache:
+    """Columns of each ms loaded into memory, with the model
+    visibilities read, keyed by the ms and the columns and
+    precision they were read with. An ms is loaded again if any
+    of the columns read have been written to since it was
+    cached."""
+
+    def __init__(self):
+        self.entries = {}
+
+    @staticmethod
+    def _key(msname, options):
+        return (os.path.abspath(os.path.normpath(msname)),
+                options.model_column, options.vis_column,
+                options.weight_column, options.precision.upper())
+
+    @staticmethod
+    def _columns(key):
+        """Columns read for a cache entry."""
+
+        return key[1].replace(" ", "").split(",") + [key[2], key[3],
+                    "TIME", "ANTENNA1", "ANTENNA2"]
+
+    def get(self, msname, options):
+        """Loaded columns of an ms, and whether they were cached."""
+
+        key = self._key(msname, options)
+        mtime = _ms_mtime(msname, self._columns(key))
+        entry = self.entries.get(key)
+        if entry is not None and entry["mtime"] == mtime:
+            return entry["data"], True
+
+        # Load ms and read model visibilities once
+        from kalcal.calibration.vanilla import load_ms
+        data = load_ms(msname, options)
+        data["model"] = np.asarray(data["model"])
+        self.entries[key] = {"data" : data, "mtime" : mtime}
+
+        return data, False
+
+    def written(self, msname, columns):
+        """Update the cache after the daemon wrote `columns` to an
+        ms, keeping the entries not reading them, which may share
+        files with the columns written."""
+
+        path = os.path.abspath(os.path.normpath(msname))
+        for key in [key for key in self.entries if key[0] == path]:
+            if set(columns) & set(self._columns(key)):
+                del self.entries[key]
+            else:
+                self.entries[key]["mtime"] = _ms_mtime(path,
+                                                self._columns(key))
+
+    def evict(self, msname=None):
+        """Remove an ms from the cache (every ms if not given),
+        returning the number of entries removed."""
+
+        if msname is None:
+            keys = list(self.entries)
+        else:
+            path = os.path.abspath(os.path.normpath(msname))
+            keys = [key for key in self.entries if key[0] == path]
+
+        for key in keys:
+            del self.entries[key]
+
+        return len(keys)
+
+    def status(self):
+        """The ms in the cache, with the columns read and the
+        size of the arrays held."""
+
+        return [{"ms" : key[0],
+                 "model_column" : key[1],
+                 "vis_column" : key[2],
+                 "weight_column" : key[3],
+                 "precision" : key[4],
+                 "nbytes" : int(sum(value.nbytes
+                                for value in entry["data"].values()
+                                    if isinstance(value, np.ndarray)))}
+                    for key, entry in self.entries.items()]
+
+
+def run_job(cache, defaults, job):
+    """Calibrate the ms of a job with its options on top of the
+    daemon options, using the cached columns of the ms. Returns
+    the result of the job."""
+
+    if "ms" not in job:
+        raise ValueError("Job has no `ms` to calibrate.")
+
+    from kalcal.calibration.vanilla import solve, save
+
+    # Job options over daemon options
+    options = ocf.merge(defaults, job.get("options", {}))
+    if options.utime:
+        raise ValueError("Streaming with `utime` cannot be used "\
+                            + "with the daemon, which keeps the ms "\
+                            + "in memory.")
+
+    # Cached columns of ms
+    load_start = time()
+    data, cached = cache.get(job["ms"], options)
+    load_time = time() - load_start
+
+    # Calibrate and output gains
+    solve_start = time()
+    filter_gains, smooth_gains, stats = solve(data, options)
+    solve_time = time() - solve_start
+    save(job["ms"], filter_gains, smooth_gains, data["corr"], 
+            options, stats)
+
+    # Columns written by the job keep the other entries cached
+    if options.out_data:
+        cache.written(job["ms"], [column for column in
+                        [options.out_data, options.out_weight] if column])
+
+    return {
+        "status" : "ok",
+        "ms" : job["ms"],
+        "cached" : cached,
+        "load_time" : load_time,
+        "solve_time" : solve_time,
+        "out_filter" : options.out_filter,
+        "out_smoother" : options.out_smoother
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Requests to the daemon, as JSON. Jobs are run one at a
+    time in the order they arrive, as each one uses all the
+    threads of numba and dask."""
+
+    def _reply(self, code, body):
+        content = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path == "/status":
+            self._reply(200, {"status" : "ok",
+                              "cache" : self.server.cache.status()})
+        else:
+            self._reply(404, {"status" : "failed",
+                              "error" : f"Unknown path `{self.path}`"})
+
+    def do_POST(self):
+        try:
+            body = self._body()
+            if self.path == "/calibrate":
+                result = run_job(self.server.cache,
+                                    self.server.defaults, body)
+                print(f"==> `{result['ms']}` done in "\
+                    + f"{np.round(result['solve_time'], 3)} s "\
+                    + f"(cached: {result['cached']})")
+                self._reply(200, result)
+            elif self.path == "/status":
+                self._reply(200, {"status" : "ok",
+                                  "cache" : self.server.cache.status()})
+            elif self.path == "/evict":
+                count = self.server.cache.evict(body.get("ms"))
+                self._reply(200, {"status" : "ok", "evicted" : count})
+            elif self.path == "/shutdown":
+                self._reply(200, {"status" : "ok"})
+                self.server.running = False
+            else:
+                self._reply(404, {"status" : "failed",
+                                "error" : f"Unknown path `{self.path}`"})
+        except Exception as error:
+            # Failed jobs do not stop the daemon
+            traceback.print_exc()
+            self._reply(500, {"status" : "failed",
+                              "error" : f"{type(error).__name__}: {error}"})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def daemon(**kwargs):
+    """Run a calibration daemon on localhost, which keeps the
+    columns of each ms it calibrates and the compiled kernels in
+    memory. Jobs are posted to `/calibrate` as JSON with the `ms`
+    and the `options` to change from those the daemon was started
+    with, so re-calibrating an ms skips loading and compiling."""
+
+    # Calibration imports here, so submitting jobs stays quick
+    from kalcal.calibration.vanilla import _setup
+    from kalcal.calibration.warmup import warmup_options
+
+    host = kwargs.pop("host")
+    port = kwargs.pop("port")
+
+    # Daemon options, with thread counts set once
+    defaults = _setup(kwargs)
+
+    # Compile kernels of default options
+    print("==> Compiling kernels")
+    warmup_options(defaults)
+
+    server = HTTPServer((host, port), _Handler)
+    server.cache = MSCache()
+    server.defaults = defaults
+    server.running = True
+    print(f"==> Calibration daemon listening on "\
+            + f"http://{host}:{server.server_port}")
+
+    try:
+        while server.running:
+            server.handle_request()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+    print("==> Calibration daemon stopped.")
+
+
+def submit(ms, host="127.0.0.1", port=8765, options=None,
+                path="/calibrate"):
+    """Post a job (or other request) to a running daemon,
+    returning its JSON reply. `ms` may be None for requests
+    that do not take one, e.g. evicting every ms."""
+
+    # Absolute path, as the daemon may run elsewhere
+    body = {"options" : options or {}}
+    if ms is not None:
+        body["ms"] = os.path.abspath(ms)
+    request = Request(f"http://{host}:{port}{path}",
+                        data=json.dumps(body).encode(),
+                        headers={"Content-Type" : "application/json"})
+    try:
+        with urlopen(request) as response:
+            return json.loads(response.read())
+    except HTTPError as error:
+        return json.loads(error.read())
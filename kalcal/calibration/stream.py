@@ -0,0 +1,140 @@
+from kalcal.tools.utils import concat_dir_axis
+from daskms import xds_from_ms
+from dask import array as da
+from threading import Thread, Event
+from queue import Queue, Empty
+from time import time
+import numpy as np
+
+
+def time_chunks(msname, utime):
+    """Open the ms with row chunks aligned to the time-bins,
+    such that each chunk holds `utime` unique times. Only the
+    TIME column is read to find the chunking. Returns the
+    dataset, the time-bin indices and counts over the whole
+    ms, and a list of (row slice, time-bin indices, time-bin
+    counts) for each chunk, with indices local to the chunk."""
+
+    # Find time-bins from the time column only
+    MS = xds_from_ms(msname, columns=["TIME"])[0]
+    _, tbin_indices, tbin_counts = np.unique(MS.TIME.data.compute(),
+                                        return_index=True,
+                                        return_counts=True)
+
+    # Group time-bins into chunks
+    n_time = len(tbin_indices)
+    utime = n_time if not utime else utime
+    chunks = []
+    for start in range(0, n_time, utime):
+        end = min(start + utime, n_time)
+        row_start = tbin_indices[start]
+        row_end = tbin_indices[end - 1] + tbin_counts[end - 1]
+        chunks.append((slice(row_start, row_end),
+                        tbin_indices[start:end] - row_start,
+                        tbin_counts[start:end]))
+
+    # Reopen ms with row chunks aligned to time-bins
+    row_chunks = tuple(rows.stop - rows.start for rows, _, _ in chunks)
+    MS = xds_from_ms(msname, chunks={"row": row_chunks})[0]
+
+    return MS, tbin_indices, tbin_counts, chunks
+
+
+def load_chunk(MS, rows, model_columns, vis_column, weight_column,
+                corr=slice(None), dtype=np.complex128):
+    """Read a single row chunk from the ms into memory, returning
+    model (with directions stacked on axis 2), data visibilities,
+    weights and antenna arrays. Only the correlations in `corr`
+    are read, and visibilities are cast to `dtype` (weights to
+    its real counterpart)."""
+
+    model = concat_dir_axis(MS, model_columns)[rows][..., corr]
+    vis = MS.get(vis_column).data[rows][..., corr]
+    weight = MS.get(weight_column).data[rows][..., corr]
+    ant1 = MS.ANTENNA1.data[rows]
+    ant2 = MS.ANTENNA2.data[rows]
+
+    # Compute in a single pass
+    model, vis, weight, ant1, ant2 = da.compute(
+                                model, vis, weight, ant1, ant2)
+
+    return (model.astype(dtype), vis.astype(dtype),
+            weight.astype(np.finfo(dtype).dtype), ant1, ant2)
+
+
+class Prefetcher:
+    """Iterate over `load(item)` for each item, with the loading
+    done ahead of time on a background thread. At most `depth` 
+    loaded items wait in the queue and one more can wait to be put
+    on it, so up to `depth + 1` items are held in memory besides the
+    one in use. With a depth of 1 the next chunk is read while the 
+    current one is being filtered. A depth of 0 loads each item 
+    when it is needed. If the consumer stops early, the thread 
+    stops after the item it is loading. The time spent loading 
+    and the time the consumer spent waiting on the queue (stalled)
+    are kept in `load_time` and `stall_time`."""
+
+    _done = object()
+
+    def __init__(self, load, items, depth=1):
+        self.load = load
+        self.items = items
+        self.depth = depth
+        self.load_time = 0.0
+        self.stall_time = 0.0
+
+    def _timed_load(self, item):
+        start = time()
+        loaded = self.load(item)
+        self.load_time += time() - start
+        return loaded
+
+    def _worker(self, queue, stop):
+        try:
+            for item in self.items:
+                if stop.is_set():
+                    return
+                queue.put((self._timed_load(item), None))
+        except Exception as error:
+            queue.put((None, error))
+            return
+
+        if not stop.is_set():
+            queue.put((self._done, None))
+
+    def __iter__(self):
+        # Load in the foreground
+        if self.depth < 1:
+            for item in self.items:
+                loaded = self._timed_load(item)
+                self.stall_time = self.load_time
+                yield loaded
+            return
+
+        # Load on background thread
+        queue = Queue(maxsize=self.depth)
+        stop = Event()
+        thread = Thread(target=self._worker, args=(queue, stop), 
+                        daemon=True)
+        thread.start()
+        try:
+            while True:
+                start = time()
+                loaded, error = queue.get()
+                self.stall_time += time() - start
+
+                if error is not None:
+                    raise error
+                if loaded is self._done:
+                    return
+                yield loaded
+        finally:
+            # Stop the thread, freeing the queue for a put it 
+            # may be blocked on, which is then its last
+            stop.set()
+            try:
+                while True:
+                    queue.get_nowait()
+            except Empty:
+                pass
+            thread.join()
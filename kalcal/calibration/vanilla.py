@@ -1,24 +1,634 @@
 from omegaconf import OmegaConf as ocf
 from kalcal.filters import ekf, iekf
 from kalcal.smoothers import eks
-from kalcal.tools.utils import gains_vector, concat_dir_axis
+from kalcal.tools.utils import gains_vector, gains_reshape, concat_dir_axis
+from kalcal.calibration.stream import time_chunks, load_chunk, Prefetcher
 from dask import array as da 
 from dask.diagnostics import ProgressBar
 from daskms import xds_from_ms, xds_to_table
-from africanus.calibration.utils import corrupt_vis, correct_vis
+from africanus.calibration.utils.dask import corrupt_vis, correct_vis
 import numpy as np
 from time import time
+from functools import partial
+import os
+from numba import njit, prange
 
 
-def calibrate(msname, **kwargs):
-    """A vanilla calibrate command to use the kalman
-    filter and smoother in an ordinary manner with an ms."""
+def _flip_time(tbin_indices, tbin_counts, *arrays):
+    """Reverse the row (time) axis of the arrays, along 
+    with the time-bin indices and counts to match."""
+
+    n_row = arrays[0].shape[0]
+    flipped = [array[::-1] for array in arrays]
+    tbin_indices = n_row - (tbin_indices + tbin_counts)[::-1]
+    tbin_counts = tbin_counts[::-1]
+
+    return (tbin_indices, tbin_counts, *flipped)
+
+
+def _precision(options):
+    """Complex and real dtypes for the requested precision."""
+
+    return {
+        "double" : (np.complex128, np.float64),
+        "single" : (np.complex64, np.float32)
+    }[options.precision.lower()]
+
+
+def _priors(n_ant, n_chan, n_dir, diag_cov, options):
+    """Create the prior state, prior covariance and the 
+    process and measurement noise for a single correlation."""
+
+    # Compute precision
+    cdtype, rdtype = _precision(options)
+
+    # Create priors
+    mp = np.ones((n_ant, n_chan, n_dir, 2), dtype=cdtype)
+    mp = gains_vector(mp)
+
+    if diag_cov:
+        # Prior covariance diagonal
+        Pp = np.ones(mp.size, dtype=rdtype)
+
+        # Noise Matrix diagonals
+        Q = 2 * options.sigma_f * np.ones(mp.size, dtype=rdtype)
+        R = 2 * options.sigma_n\
+            * np.ones(n_ant * (n_ant - 1) * n_chan, dtype=rdtype)
+    else:
+        Pp = np.eye(mp.size, dtype=np.complex128)
+
+        # Noise Matrices
+        Q = 2 * options.sigma_f * np.eye(mp.size, dtype=np.complex128)
+        R = 2 * options.sigma_n\
+            * np.eye(n_ant * (n_ant - 1) * n_chan, dtype=np.complex128) 
+
+    return mp, Pp, Q, R
+
+
+def _run_smoother(kalman_smoother, m, P, Q, options):
+    """Run the smoother on the (forward) filter results for 
+    the requested number of times, returning the smoother 
+    gains in forward order."""
+
+    # Variable to keep track of algorithm direction
+    a_dir = "forward"
+
+    # Run Kalman Smoother for requested number of times
+    for i in range(options.smoother):
+        ms, Ps, _ = kalman_smoother(m, P, Q)        
+
+        # Correct flipping if last iteration
+        if i == options.smoother - 1:
+            if a_dir == "backward":
+                # Reset algorithm direction
+                a_dir = "forward"
+                
+                # Flip arrays
+                ms = ms[::-1]
+                Ps = Ps[::-1]
+        else:
+            # Set algorithm direction
+            if a_dir == "forward":
+                a_dir = "backward"
+            elif a_dir == "backward":
+                a_dir = "forward"
+            
+            # Flip arrays
+            m = ms[::-1]
+            P = Ps[::-1]
+
+    return ms
+
+
+def _calibrate_corr(kalman_filter, kalman_smoother, model, vis, 
+                    weight, ant1, ant2, tbin_indices, tbin_counts,
+                    n_ant, diag_cov, options):
+    """Run the filter and smoother on a single correlation, 
+    returning the filter gains, smoother gains, the (filter, 
+    smoother, total) timings and the (iterations, residual norms)
+    of the last filter run for the ADAPTIVE filter, else None."""
+
+    # Read model visibilities of the correlation
+    model = np.ascontiguousarray(model, dtype=vis.dtype)
+
+    # Dimensions
+    n_chan, n_dir = model.shape[1:]
+
+    # Create priors
+    mp, Pp, Q, R = _priors(n_ant, n_chan, n_dir, diag_cov, options)
+
+    # Variable to keep track of algorithm direction
+    a_dir = "forward"
+
+    # Run Kalman Filter for requested number of times
+    total_start = filter_start = time()
+
+    for i in range(options.filter):
+        m, P, *stats = kalman_filter(mp, Pp, model, vis, weight, Q, R, 
+                                ant1, ant2, tbin_indices, 
+                                tbin_counts, options.step_control)        
+
+        # Correct flipping if last iteration
+        if i == options.filter - 1:
+            if a_dir == "backward":
+                # Reset algorithm direction
+                a_dir = "forward"
+                
+                # Flip arrays
+                m = m[::-1]
+                P = P[::-1]
+                stats = [x[::-1] for x in stats]
+                tbin_indices, tbin_counts, model, vis, weight, ant1, ant2\
+                    = _flip_time(tbin_indices, tbin_counts, model, 
+                                    vis, weight, ant1, ant2)
+        else:
+            # Set algorithm direction
+            if a_dir == "forward":
+                a_dir = "backward"
+            elif a_dir == "backward":
+                a_dir = "forward"
+            
+            # Flip arrays
+            mp = gains_vector(m[-1])
+            Pp = P[-1]
+            tbin_indices, tbin_counts, model, vis, weight, ant1, ant2\
+                = _flip_time(tbin_indices, tbin_counts, model, 
+                                vis, weight, ant1, ant2)
+
+    # Keep filter gains
+    filter_gains = m.copy()
+
+    # Stop filter timer and start smoother timer
+    filter_time = time() - filter_start
+    smoother_start = time()
+
+    # Run Kalman Smoother
+    ms = _run_smoother(kalman_smoother, m, P, Q, options)
+
+    # Stop time
+    stop_time = time()
+    total_time = stop_time - total_start
+    smoother_time = stop_time - smoother_start  
+
+    # Return gains, timings and iteration statistics
+    return filter_gains, ms.copy(), (filter_time, smoother_time, total_time),\
+            tuple(stats) if stats else None
+
+
+def _window_bounds(n_time, n_windows, overlap):
+    """Split the time axis into `n_windows` equal windows, each
+    extended by `overlap` time-bins on either side, returning the
+    (start, end) time-bins of each window. There are at most 
+    `n_time` windows, so none is empty."""
+
+    n_windows = min(n_windows, n_time)
+    cores = np.linspace(0, n_time, n_windows + 1).astype(np.int64)
+    return [(max(cores[w] - overlap, 0), min(cores[w + 1] + overlap, n_time))
+                for w in range(n_windows)]
+
+
+def _window_ramps(bounds, n_time, overlap):
+    """Blending weights over time for each window. Neighbouring
+    windows fade linearly into each other across the 2 * `overlap`
+    time-bins that they share, normalised to sum to one."""
+
+    ramps = []
+    time_bins = np.arange(n_time) + 0.5
+    for w, (t0, t1) in enumerate(bounds):
+        ramp = np.zeros(n_time)
+        ramp[t0:t1] = 1.0
+        if overlap:
+            if w > 0:
+                ramp *= np.clip((time_bins - t0)/(2 * overlap), 0, 1)
+            if w < len(bounds) - 1:
+                ramp *= np.clip((t1 - time_bins)/(2 * overlap), 0, 1)
+        ramps.append(ramp)
+
+    return [ramp/np.sum(ramps, axis=0) for ramp in ramps]
+
+
+def _window_calibrate(corr_kwargs, n_time, options):
+    """Split the time axis into overlapping windows and calibrate 
+    every window of every correlation in a separate process, each
+    starting from the same prior. The windows are then blended 
+    into one solution per correlation, and the timings are those
+    of the slowest window. Iteration statistics are taken from 
+    the window weighted most at each time-bin."""
+
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+
+    bounds = _window_bounds(n_time, options.windows, options.overlap)
+    ramps = _window_ramps(bounds, n_time, options.overlap)
+
+    # Keyword arguments for each window, with local time-bins
+    tasks = []
+    for kw in corr_kwargs:
+        tbin_indices, tbin_counts = kw["tbin_indices"], kw["tbin_counts"]
+        for t0, t1 in bounds:
+            r0 = tbin_indices[t0]
+            r1 = tbin_indices[t1 - 1] + tbin_counts[t1 - 1]
+            window_kw = dict(kw)
+            for key in ["model", "vis", "weight", "ant1", "ant2"]:
+                window_kw[key] = np.asarray(kw[key][r0:r1])
+            window_kw["tbin_indices"] = tbin_indices[t0:t1] - r0
+            window_kw["tbin_counts"] = tbin_counts[t0:t1]
+            tasks.append(window_kw)
+
+    # Run windows in parallel processes (spawned, since forking
+    # after dask and numba have started threads can deadlock)
+    n_workers = min(len(tasks), options.ncpu or multiprocessing.cpu_count())
+    print(f"==> Running {len(bounds)} window(s) per correlation "\
+            + f"on {n_workers} process(es)")
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=n_workers, 
+                                mp_context=context) as pool:
+        futures = [pool.submit(_calibrate_corr, **kw) for kw in tasks]
+        outputs = [future.result() for future in futures]
+
+    # Blend windows per correlation
+    results = []
+    n_windows = len(bounds)
+    best = np.argmax(ramps, axis=0)
+    for i in range(len(corr_kwargs)):
+        windows = outputs[i * n_windows:(i + 1) * n_windows]
+        m, ms, _, stats = windows[0]
+        filter_gains = np.zeros((n_time,) + m.shape[1:], dtype=m.dtype)
+        smooth_gains = np.zeros((n_time,) + ms.shape[1:], dtype=ms.dtype)
+        for (t0, t1), ramp, (m, ms, _, _) in zip(bounds, ramps, windows):
+            weight = ramp[t0:t1].reshape((-1,) + (1,) * (m.ndim - 1))
+            filter_gains[t0:t1] += weight * m
+            smooth_gains[t0:t1] += weight * ms
+        timings = tuple(np.max([w[2] for w in windows], axis=0))
+
+        # Iteration statistics of the window weighted most
+        if stats is not None:
+            stats = tuple(np.zeros((n_time,) + x.shape[1:], dtype=x.dtype)
+                            for x in stats)
+            for w, ((t0, t1), window) in enumerate(zip(bounds, windows)):
+                local = np.nonzero(best[t0:t1] == w)[0]
+                for full, x in zip(stats, window[3]):
+                    full[t0 + local] = x[local]
+
+        results.append((filter_gains, smooth_gains, timings, stats))
+
+    return results
+
+
+def _corr_mode(model):
+    """Find the correlation mode and correlations to
+    calibrate by sampling a row + chan + dir from model."""
+
+    # Sample a row + chan + dir from model
+    n_row, n_chan, n_dir = model.shape[:3]
+    s_row = np.random.randint(0, n_row)
+    s_chan = np.random.randint(0, n_chan)
+    s_dir = np.random.randint(0, n_dir)
+    s_model = np.asarray(model[s_row, s_chan, s_dir])
+
+    # Check correlation axis size
+    if s_model.shape[0] != 4:
+        raise NotImplementedError("Only uses (4,) correlation shape.")
+
+    # Find mode to use
+    if s_model.all():
+        # All correlations
+        return "FULL", [0, 1, 2, 3]
+
+    elif s_model[[0, 3]].all():
+        # First and last correlations
+        return "DIAG", [0, 3]
+
+    elif s_model[0]:
+        # No correlations
+        return "NONE", [0]
+
+    else:
+        # (2 x 2) not implemented yet
+        raise ValueError("Cannot identify correlation shape.")
+
+
+def _stream_calibrate(MS, chunks, corr, kalman_smoother, model_columns,
+                        n_ant, n_chan, n_dir, options):
+    """Run the matrix-free filter on all correlations by reading
+    the ms one time-chunk at a time, so only a single chunk of
+    visibilities is in memory, followed by the smoother. Returns
+    the filter gains, smoother gains and the (filter, smoother,
+    total) timings for each correlation."""
+
+    # Create priors (the same for each correlation)
+    mp, Pp, Q, _ = _priors(n_ant, n_chan, n_dir, True, options)
+    cdtype, _ = _precision(options)
+    priors = {c: (mp, Pp) for c in corr}
+    shape = (n_ant, n_chan, n_dir, 2)
+
+    # Run correlations on threads (numba kernels release the 
+    # GIL), if the threading layer is thread-safe, or one 
+    # after the other
+    if options.concurrent and len(corr) > 1 and _threadsafe_layer():
+        from concurrent.futures import ThreadPoolExecutor
+
+        pool = ThreadPoolExecutor(max_workers=len(corr))
+        run = pool.map
+    else:
+        if options.concurrent and len(corr) > 1:
+            print("==> Numba threading layer is not thread-safe "\
+                    + "(tbb or omp), running correlations in turn")
+
+        pool = None
+        run = map
+
+    # Variable to keep track of algorithm direction
+    a_dir = "forward"
+
+    # Run Kalman Filter for requested number of times
+    total_start = filter_start = time()
+
+    for i in range(options.filter):
+        state = dict(priors)
+        posts = {c: ([], []) for c in corr}
+
+        # Stream chunks in the direction of the filter
+        order = chunks if a_dir == "forward" else chunks[::-1]
+        backward = a_dir == "backward"
+
+        def prepare(chunk):
+            rows, tbin_indices, tbin_counts = chunk
+            model, vis, weight, ant1, ant2 = load_chunk(MS, rows,
+                model_columns, options.vis_column, options.weight_column,
+                corr, cdtype)
+
+            # Create own weights
+            if options.sigma_n is not None:
+                cvar = 2 * options.sigma_n**2
+                weight = 1.0/cvar * np.ones_like(weight)
+
+            # Flip chunk for backward direction
+            if backward:
+                tbin_indices, tbin_counts, model, vis, weight, ant1, ant2\
+                    = _flip_time(tbin_indices, tbin_counts, model,
+                                    vis, weight, ant1, ant2)
+
+            # Contiguous arrays per correlation
+            data = {c: (np.ascontiguousarray(model[..., i]),
+                        np.ascontiguousarray(vis[..., i]),
+                        np.ascontiguousarray(weight[..., i])) 
+                            for i, c in enumerate(corr)}
+
+            return (data, np.ascontiguousarray(ant1),
+                    np.ascontiguousarray(ant2), tbin_indices, tbin_counts)
+
+        # Read and prepare next chunk(s) while filtering
+        prefetch = Prefetcher(prepare, order, options.prefetch)
+        for n, chunk in enumerate(prefetch):
+            print(f"\r==> Filter run {i + 1}/{options.filter} "\
+                + f"({a_dir}): chunk {n + 1}/{len(chunks)}", end="")
+            data, ant1, ant2, tbin_indices, tbin_counts = chunk
+
+            # Filter each correlation over the chunk
+            def advance(c):
+                return ekf.mfree_chunk(*state[c], *data[c], Q, ant1, 
+                            ant2, tbin_indices, tbin_counts,
+                            options.step_control, n_ant, 
+                            options.row_chunk or 0)
+
+            for c, (m, P) in zip(corr, run(advance, corr)):
+                state[c] = (gains_vector(m[-1]), P[-1])
+                posts[c][0].append(m)
+                posts[c][1].append(P)
+        print()
+        print(f"==> Chunks read in {np.round(prefetch.load_time, 3)} s, "\
+                + f"filter stalled on reads for "\
+                + f"{np.round(prefetch.stall_time, 3)} s")
+
+        # Prior followed by posteriors, where the last
+        # time-bin has no next state to update
+        results = {}
+        for c in corr:
+            mp, Pp = priors[c]
+            m = np.concatenate([gains_reshape(mp, shape)[None]]
+                                    + posts[c][0])[:-1]
+            P = np.concatenate([Pp[None]] + posts[c][1])[:-1]
+            results[c] = (m, P)
+
+        # Correct flipping if last iteration
+        if i == options.filter - 1:
+            if a_dir == "backward":
+                # Reset algorithm direction
+                a_dir = "forward"
+
+                # Flip arrays
+                results = {c: (m[::-1], P[::-1])
+                            for c, (m, P) in results.items()}
+        else:
+            # Set algorithm direction
+            if a_dir == "forward":
+                a_dir = "backward"
+            elif a_dir == "backward":
+                a_dir = "forward"
+
+            # Next priors
+            priors = {c: (gains_vector(m[-1]), P[-1])
+                        for c, (m, P) in results.items()}
+
+    if pool is not None:
+        pool.shutdown()
+
+    # Stop filter timer
+    filter_time = time() - filter_start
+
+    # Run Kalman Smoother on each correlation
+    outputs = []
+    for c in corr:
+        smoother_start = time()
+        m, P = results[c]
+        ms = _run_smoother(kalman_smoother, m, P, Q, options)
+        smoother_time = time() - smoother_start
+        total_time = time() - total_start
+        outputs.append((m.copy(), ms.copy(),
+                        (filter_time, smoother_time, total_time), None))
+
+    return outputs
+
+
+def _correction_jones(smooth_gains, corr):
+    """Diagonal gains to correct the data with, as the smoother
+    gains of the first and last correlations with ones on the
+    off-diagonals. Without gains for the last correlation (NONE
+    mode), the gains of the first are used for both."""
+
+    # Set off-diagonals to ones for gains
+    jones = np.ones_like(smooth_gains[..., 0])
+    jones[..., 0] = smooth_gains[..., 0, 0]
+    jones[..., 3] = smooth_gains[..., 3 if 3 in corr else 0, 0]
+
+    return jones
+
+
+def _write_columns(msname, smooth_gains, n_dir, corr, options):
+    """Correct the data visibilities with the smoother gains
+    and scale the imaging weights, writing both to the ms.
+    Each time-chunk is computed and written lazily."""
+
+    MS, tbin_indices, tbin_counts, chunks = time_chunks(msname,
+                                                options.utime)
+    row_chunks = MS.chunks["row"]
+    time_chunk = tuple(len(idx) for _, idx, _ in chunks)
+
+    # Time-bin arrays aligned with the row chunks
+    tbin_indices = da.from_array(tbin_indices, chunks=(time_chunk,))
+    tbin_counts = da.from_array(tbin_counts, chunks=(time_chunk,))
+    ant1 = MS.ANTENNA1.data
+    ant2 = MS.ANTENNA2.data
+
+    jones = _correction_jones(smooth_gains, corr)
+    jones = da.from_array(jones, chunks=(time_chunk,) + jones.shape[1:])
+
+    # Correct Visibilties
+    vis = MS.get(options.vis_column).data
+    corrected_data = correct_vis(
+        tbin_indices,
+        tbin_counts,
+        ant1,
+        ant2,
+        jones,
+        vis.astype(np.complex128),
+        MS.FLAG.data)
+
+    # Assign and write to ms
+    print(f"==> Writing corrected smoother visibilties to `{options.out_data}`")
+    MS = MS.assign(**{options.out_data: (("row", "chan", "corr"),
+                corrected_data.astype(np.complex64))})
+
+    columns = [options.out_data]
+
+    if options.out_weight is not None and options.out_weight != "":
+        abs_sqr_gains = da.absolute(jones)**2
+        cvar = 2 * options.sigma_n**2
+        n_chan, n_corr = vis.shape[1:]
+        weight = da.full((vis.shape[0], n_chan, n_dir, n_corr), 1.0/cvar,
+                    chunks=(row_chunks, n_chan, n_dir, n_corr))
+        weight_spectrum = corrupt_vis(tbin_indices, tbin_counts,
+                            ant1, ant2, abs_sqr_gains, weight).real
+
+        print(f"==> Writing new imaging weights to `{options.out_weight}`")
+        MS = MS.assign(**{options.out_weight: (("row", "chan", "corr"),
+                weight_spectrum.astype(np.float32))})
+
+        columns.append(options.out_weight)
+
+    write = xds_to_table(MS, msname, columns)
+
+    # Begin writing
+    with ProgressBar():
+        da.compute(write)
+
+
+@njit(parallel=True, cache=True)
+def _start_threads(n):
+    total = 0
+    for i in prange(n):
+        total += i
+    return total
+
+
+def _threadsafe_layer():
+    """Whether parallel kernels can be launched from several
+    threads at once, i.e. the numba threading layer is tbb or omp.
+    The layer is chosen when the first parallel kernel runs, after
+    which it cannot be changed, so it is started here if needed.
+    Set NUMBA_THREADING_LAYER=threadsafe to require one."""
+
+    import numba
+
+    try:
+        layer = numba.threading_layer()
+    except ValueError:
+        _start_threads(1)
+        layer = numba.threading_layer()
+
+    return layer in ["tbb", "omp"]
+
+
+def _algorithms(options):
+    """Choose the filter and smoother algorithms from the options,
+    checking they are compatible. Returns the filter, smoother and
+    whether only covariance diagonals are stored."""
+
+    # Choose filter algorithm
+    kalman_filter = {
+        "numba" : ekf.numba_algorithm,
+        "sparse" : ekf.sparse_algorithm,
+        "diag" : ekf.diag_algorithm,
+        "mfree" : ekf.mfree_algorithm,
+        "info" : ekf.info_algorithm,
+        "adaptive" : iekf.adaptive_algorithm
+    }[options.algorithm.lower()]
+
+    # Iteration control of the adaptive filter
+    if options.algorithm.lower() == "adaptive":
+        kalman_filter = partial(kalman_filter, tol=options.tol,
+                                maxiter=options.maxiter, 
+                                reuse_tol=options.reuse_tol,
+                                damping=options.damping)
+
+    # Accumulate each time-bin over chunks of rows
+    if options.row_chunk:
+        if options.algorithm.lower() not in ["mfree", "info", "adaptive"]:
+            raise ValueError("Row chunks require the MFREE, "\
+                                + "INFO or ADAPTIVE algorithm.")
+        kalman_filter = partial(kalman_filter, 
+                                row_chunk=options.row_chunk)
+
+    # Diagonal-only covariance storage
+    diag_cov = options.algorithm.lower() in ["diag", "mfree", "info",
+                                                "adaptive", "sparse"]
+
+    # Compute precision, single only with diagonal filters
+    cdtype, _ = _precision(options)
+    if cdtype != np.complex128 and options.algorithm.lower()\
+            not in ["diag", "mfree", "info", "adaptive"]:
+        raise ValueError("Single precision requires the DIAG, "\
+                            + "MFREE, INFO or ADAPTIVE algorithm.")
+    
+    # Choose smoother algorithm
+    if diag_cov and options.scan_smoother:
+        kalman_smoother = eks.scan_algorithm
+    elif diag_cov:
+        kalman_smoother = eks.diag_algorithm
+    elif options.scan_smoother:
+        raise ValueError("Parallel-in-time smoother requires the "\
+                            + "DIAG, MFREE, INFO, ADAPTIVE or SPARSE "\
+                            + "algorithm.")
+    else:
+        kalman_smoother = eks.numba_algorithm
+
+    return kalman_filter, kalman_smoother, diag_cov
+
+
+def _with_defaults(options):
+    """Options over the defaults of the vanilla calibrate command,
+    so configs without the newer options still load."""
+
+    from kalcal.cli.calibrate_vanilla import vanilla
+
+    # Defaults as parsed by the command, for a placeholder ms
+    ctx = vanilla.make_context("vanilla", ["ms"])
+    defaults = {name : value for name, value in ctx.params.items()
+                    if name != "ms"}
+
+    return ocf.merge(ocf.create(defaults), options)
+
+
+def _setup(kwargs):
+    """Options from the yaml config file or keyword arguments,
+    setting the number of threads dask and numba can use."""
 
     # Options to attributed dictionary
     if kwargs["yaml"] is not None:
-        options = ocf.load(kwargs["yaml"])
+        options = _with_defaults(ocf.load(kwargs["yaml"]))
     else:    
-        options = ocf.create(kwargs)    
+        options = _with_defaults(kwargs)
 
     # Set to struct
     ocf.set_struct(options, True)
@@ -31,41 +641,40 @@ def calibrate(msname, **kwargs):
         dask.config.set(pool=ThreadPool(options.ncpu))
         numba.set_num_threads(n=options.ncpu)
     else:
+        from multiprocessing.pool import ThreadPool
         import multiprocessing
+        import dask
         dask.config.set(pool=ThreadPool(multiprocessing.cpu_count()))
 
-    # Choose filter algorithm
-    kalman_filter = {
-        "numba" : ekf.numba_algorithm,
-        "sparse" : ekf.sparse_algorithm
-    }[options.algorithm.lower()]
-    
-    # Choose smoother algorithm
-    kalman_smoother = eks.numba_algorithm
+    return options
+
+
+def load_ms(msname, options):
+    """Load the columns of an ms needed to calibrate it in memory,
+    returning them with its dimensions and correlations in a
+    dictionary. Model visibilities stay lazy and are read per
+    correlation."""
+
+    # Compute precision
+    cdtype, _ = _precision(options)
+
+    # Check if single or multiple model columns
+    model_columns = options.model_column.replace(" ", "").split(",")    
 
     # Load ms
     MS = xds_from_ms(msname)[0]
 
     # Get dimensions (correlations need to be adapted)
     dims = ocf.create(dict(MS.sizes))
-    n_row = dims.row
-    n_chan = dims.chan
-    n_corr = dims.corr
-    
-    # Check if single or multiple model columns
-    model_columns = options.model_column.replace(" ", "").split(",")    
-
-    # Load model visibilities (dask ignored for now)
-    model = concat_dir_axis(MS, model_columns).compute().astype(np.complex128)
 
-    # Get number of directions from model visibilities column
-    n_dir = model.shape[2]
+    # Lazily stack model visibilities, read per correlation
+    model = concat_dir_axis(MS, model_columns)
 
     # Load data visibilities (dask ignored for now)
-    vis = MS.get(options.vis_column).data.compute().astype(np.complex128)
+    vis = MS.get(options.vis_column).data.compute().astype(cdtype)
     
     # Load weights (dask ignored for now)
-    weight = MS.get(options.weight_column).data.compute().astype(np.complex128)
+    weight = MS.get(options.weight_column).data.compute().astype(cdtype)
 
     # Get time-bin indices and counts
     _, tbin_indices, tbin_counts = np.unique(MS.TIME,
@@ -76,220 +685,169 @@ def calibrate(msname, **kwargs):
     ant1 = MS.ANTENNA1.data.compute()
     ant2 = MS.ANTENNA2.data.compute()
 
-    # Set antenna dimension
-    n_ant = np.max((np.max(ant1), np.max(ant2))) + 1
+    # Find mode to use
+    mode, corr = _corr_mode(model)
+
+    return {
+        "model" : model,
+        "vis" : vis,
+        "weight" : weight,
+        "ant1" : ant1,
+        "ant2" : ant2,
+        "tbin_indices" : tbin_indices,
+        "tbin_counts" : tbin_counts,
+        "n_ant" : int(np.max((np.max(ant1), np.max(ant2))) + 1),
+        "n_chan" : dims.chan,
+        "n_corr" : dims.corr,
+        "n_dir" : model.shape[2],
+        "n_time" : len(tbin_indices),
+        "mode" : mode,
+        "corr" : corr
+    }
+
+
+def _collect(results, corr, shape, wall_time, options):
+    """Gather the gains of each correlation into full gains
+    arrays of `shape`, printing the timings of each. Returns the
+    filter and smoother gains, and the iteration counts with 
+    shape (n_time, n_chan, n_dir, n_corr) and residual norms with
+    shape (n_time, n_chan, n_corr) for the ADAPTIVE filter, else
+    None."""
 
-    # Get flag column
-    flag = MS.FLAG.data.compute()
-    
-    # Set time dimension
-    n_time = len(tbin_indices)
+    # Gains solutions
+    filter_gains = np.zeros(shape, dtype=np.complex128)
+    smooth_gains = np.zeros(shape, dtype=np.complex128)
+
+    # Iteration statistics
+    stats = None
+    if results[0][3] is not None:
+        n_time, _, n_chan, n_dir, n_corr, _ = shape
+        stats = (np.zeros((n_time, n_chan, n_dir, n_corr), dtype=np.int32),
+                    np.zeros((n_time, n_chan, n_corr), dtype=np.float64))
+
+    for c, (m, ms, timings, corr_stats) in zip(corr, results):
+        # Save filter and smoother gains
+        filter_gains[..., c, :] = m
+        smooth_gains[..., c, :] = ms
+
+        # Save and show iteration statistics, without the prior
+        if stats is not None:
+            iters, resid = corr_stats
+            stats[0][..., c] = iters
+            stats[1][..., c] = resid
+            print(f"==> corr={c}: {np.round(np.mean(iters[1:]), 2)} "\
+                + f"iteration(s) per time-bin and direction, mean "\
+                + f"residual norm {np.round(np.mean(resid[1:]), 6)}")
 
-    # Sample a row + chan + dir from model
-    s_row = np.random.randint(0, n_row)
-    s_chan = np.random.randint(0, n_chan)
-    s_dir = np.random.randint(0, n_dir)
-    s_model = model[s_row, s_chan, s_dir]
+        # Show timer results
+        filter_time, smoother_time, total_time = timings
+        print(f"==> corr={c}: {options.filter} filter run(s) "\
+            + f"in {np.round(filter_time, 3)} s, "\
+            + f"{options.smoother} smoother run(s) "\
+            + f"in {np.round(smoother_time, 3)} s, "\
+            + f"total taken: {np.round(total_time, 3)} s")
 
-    # Check correlation axis size
-    if s_model.shape[0] != 4:
-        raise NotImplementedError("Only uses (4,) correlation shape.")
+    print(f"==> All correlations done in {np.round(wall_time, 3)} s")
 
-    # Find mode to use
-    if s_model.all():
-        # All correlations
-        mode = "FULL"
-        corr = [0, 1, 2, 3]
-        
-    elif s_model[[0, 3]].all():
-        # First and last correlations
-        mode = "DIAG"
-        corr = [0, 3]
+    return filter_gains, smooth_gains, stats
 
-    elif s_model[0]:
-        # No correlations
-        mode = "NONE"
-        corr = [0]
 
-    else:
-        # (2 x 2) not implemented yet
-        raise ValueError("Cannot identify correlation shape.")
-    
-    # Gains solutions
-    filter_gains = np.zeros((n_time, n_ant, n_chan, n_dir, n_corr, 2),
-                                dtype=np.complex128)
+def solve(data, options):
+    """Calibrate an ms loaded into memory with `load_ms`,
+    returning the filter and smoother gains and the iteration
+    statistics (see `_collect`). The arrays in `data` are not 
+    modified, so it can be solved again with different options."""
 
-    smooth_gains = np.zeros((n_time, n_ant, n_chan, n_dir, n_corr, 2),
-                                dtype=np.complex128)
+    # Choose filter and smoother algorithms
+    kalman_filter, kalman_smoother, diag_cov = _algorithms(options)
 
     # Run algorithm on each correlation independently
-    print(f"==> Correlation Mode: {mode}")
+    corr = list(data["corr"])
+    print(f"==> Correlation Mode: {data['mode']}")
+
+    wall_start = time()
 
     # Create own weights
+    weight = data["weight"]
     if options.sigma_n is not None:
         cvar = 2 * options.sigma_n**2
         weight = 1.0/cvar * np.ones_like(weight)
     
-    for i, c in enumerate(corr):
-        print(f"==> Running corr={c} ({i + 1}/{len(corr)})")
-        
-        # Get data related to correlation
-        cmodel = model[..., c]
-        cvis = vis[..., c]
-        cweight = weight[..., c]
-
-        # Create priors
-        mp = np.ones((n_ant, n_chan, n_dir, 2), dtype=np.complex128)
-        mp = gains_vector(mp)
-        Pp = np.eye(mp.size, dtype=np.complex128)
+    # Keyword arguments for each correlation run
+    corr_kwargs = [dict(
+        kalman_filter=kalman_filter,
+        kalman_smoother=kalman_smoother,
+        model=data["model"][..., c],
+        vis=data["vis"][..., c],
+        weight=weight[..., c],
+        ant1=data["ant1"],
+        ant2=data["ant2"],
+        tbin_indices=data["tbin_indices"],
+        tbin_counts=data["tbin_counts"],
+        n_ant=data["n_ant"],
+        diag_cov=diag_cov,
+        options=options) for c in corr]
+
+    # Run time windows in separate processes, all correlations 
+    # at once on threads (numba kernels release the GIL) or one
+    # after the other
+    if options.windows and options.windows > 1:
+        results = _window_calibrate(corr_kwargs, data["n_time"], options)
+    elif options.concurrent and len(corr) > 1 and _threadsafe_layer():
+        from concurrent.futures import ThreadPoolExecutor
+
+        print(f"==> Running corr={corr} concurrently")
+        with ThreadPoolExecutor(max_workers=len(corr)) as pool:
+            futures = [pool.submit(_calibrate_corr, **kw) 
+                            for kw in corr_kwargs]
+            results = [future.result() for future in futures]
+    else:
+        if options.concurrent and len(corr) > 1:
+            print("==> Numba threading layer is not thread-safe "\
+                    + "(tbb or omp), running correlations in turn")
 
-        # Noise Matrices
-        Q = 2 * options.sigma_f * np.eye(mp.size, dtype=np.complex128)
-        R = 2 * options.sigma_n\
-            * np.eye(n_ant * (n_ant - 1) * n_chan, dtype=np.complex128) 
+        results = []
+        for i, (c, kw) in enumerate(zip(corr, corr_kwargs)):
+            print(f"==> Running corr={c} ({i + 1}/{len(corr)})")
+            results.append(_calibrate_corr(**kw))
+    wall_time = time() - wall_start
 
-        # Variable to keep track of algorithm direction
-        a_dir = "forward"
-
-        # Run Kalman Filter for requested number of times
-        total_start = filter_start = time()
-
-        for i in range(options.filter):
-            m, P = kalman_filter(mp, Pp, cmodel, cvis, cweight, Q, R, 
-                                    ant1, ant2, tbin_indices, 
-                                    tbin_counts, options.step_control)        
-
-            # Correct flipping if last iteration
-            if i == options.filter - 1:
-                if a_dir == "backward":
-                    # Reset algorithm direction
-                    a_dir = "forward"
-                    
-                    # Flip arrays
-                    m = m[::-1]
-                    P = P[::-1]
-                    model = model[::-1]
-                    vis = vis[::-1]
-                    weight = weight[::-1]
-                    tbin_indices = tbin_indices[::-1] # For consistency
-                    tbin_counts = tbin_counts[::-1] # For consistency
-            else:
-                # Set algorithm direction
-                if a_dir == "forward":
-                    a_dir = "backward"
-                elif a_dir == "backward":
-                    a_dir = "forward"
-                
-                # Flip arrays
-                mp = gains_vector(m[-1])
-                Pp = P[-1]
-                model = model[::-1]
-                vis = vis[::-1]
-                weight = weight[::-1]
-                tbin_indices = tbin_indices[::-1] # For consistency
-                tbin_counts   
-
-        # Save filter gains
-        filter_gains[..., c, :] = m.copy()
-
-        # Stop filter timer and start smoother timer
-        filter_time = time() - filter_start
-        smoother_start = time()
+    shape = (data["n_time"], data["n_ant"], data["n_chan"], 
+                data["n_dir"], data["n_corr"], 2)
+    return _collect(results, corr, shape, wall_time, options)
 
-        # Run Kalman Smoother for requested number of times
-        for i in range(options.smoother):
-            ms, Ps, _ = kalman_smoother(m, P, Q)        
-
-            # Correct flipping if last iteration
-            if i == options.smoother - 1:
-                if a_dir == "backward":
-                    # Reset algorithm direction
-                    a_dir = "forward"
-                    
-                    # Flip arrays
-                    ms = ms[::-1]
-                    Ps = Ps[::-1]
-            else:
-                # Set algorithm direction
-                if a_dir == "forward":
-                    a_dir = "backward"
-                elif a_dir == "backward":
-                    a_dir = "forward"
-                
-                # Flip arrays
-                m = ms[::-1]
-                P = Ps[::-1]
 
-        # Save smoother gains
-        smooth_gains[..., c, :] = ms.copy()
+def stats_path(out_filter):
+    """Path of the iteration statistics saved next to the 
+    filter gains in `out_filter`."""
 
-        # Stop time
-        stop_time = time()
-        total_time = stop_time - total_start
-        smoother_time = stop_time - smoother_start        
+    return os.path.splitext(out_filter)[0] + ".stats.npz"
 
-        # Show timer results
-        print(f"==> {options.filter} filter run(s) "\
-            + f"in {np.round(filter_time, 3)} s, "\
-            + f"{options.smoother} smoother run(s) "\
-            + f"in {np.round(smoother_time, 3)} s, "\
-            + f"total taken: {np.round(total_time, 3)} s")
 
-    print("==> Calibration complete.")
+def save(msname, filter_gains, smooth_gains, corr, options, stats=None):
+    """Write the corrected data (and imaging weights) to the ms
+    and the filter and smoother gains to npy files, as set in
+    the options, where `corr` are the correlations calibrated.
+    Iteration statistics from `solve`, if any, are saved next to
+    the filter gains."""
 
     if options.out_data is not None and options.out_data != "":
-        # Set off-diagonals to ones for gains
-        jones = np.ones_like(smooth_gains[..., 0])
-        jones[..., 0] = smooth_gains[..., 0, 0]
-        jones[..., 3] = smooth_gains[..., 0, 0]
-
-        # Correct Visibilties
-        corrected_data = correct_vis(
-            tbin_indices, 
-            tbin_counts, 
-            ant1, 
-            ant2, 
-            jones, 
-            vis, 
-            flag)
-        
-        # To dask
-        corrected_data = da.from_array(corrected_data,
-                            chunks=MS.get(options.vis_column).chunks)
-        
-        # Assign and write to ms
-        print(f"==> Writing corrected smoother visibilties to `{options.out_data}`")
-        MS = MS.assign(**{options.out_data: (("row", "chan", "corr"), 
-                    corrected_data.astype(np.complex64))})
-
-        columns = [options.out_data]
-
-        if options.out_weight is not None and options.out_weight != "":
-            abs_sqr_gains = np.power(np.abs(smooth_gains[..., 0]), 2)
-            cvar = 2 * options.sigma_n**2
-            weight = 1.0/cvar * np.ones((n_row, n_chan, n_dir, n_corr))
-            weight_spectrum = corrupt_vis(tbin_indices, tbin_counts, ant1, ant2, abs_sqr_gains, weight).real
-
-            weight_spectrum = da.from_array(weight_spectrum,
-                            chunks=MS.get(options.vis_column).chunks)
-
-            print(f"==> Writing new imaging weights to `{options.out_weight}`")
-            MS = MS.assign(**{options.out_weight: (("row", "chan", "corr"), 
-                    weight_spectrum.astype(np.float32))})
-
-            columns.append(options.out_weight)
-
-        write = xds_to_table(MS, msname, columns)
-        
-        # Begin writing
-        with ProgressBar():
-            write.compute()
+        _write_columns(msname, smooth_gains, smooth_gains.shape[3], 
+                        corr, options)
     
     # Output filter gains to npy file
     if options.out_filter is not None and options.out_filter != "":
         with open(options.out_filter, "wb") as file:
             np.save(file, filter_gains)
         print(f"==> Filter gains saved to `{options.out_filter}`")
+
+        # Output iteration counts and residual norms to npz file
+        if stats is not None:
+            iters, resid = stats
+            with open(stats_path(options.out_filter), "wb") as file:
+                np.savez(file, iters=iters, resid=resid)
+            print(f"==> Iteration statistics saved to "\
+                    + f"`{stats_path(options.out_filter)}`")
     else:
         print(f"==> Filter gains not saved")
 
@@ -299,4 +857,71 @@ def calibrate(msname, **kwargs):
             np.save(file, smooth_gains)
         print(f"==> Smoother gains saved to `{options.out_smoother}`")
     else:
-        print(f"==> Smoother gains not saved")
\ No newline at end of file
+        print(f"==> Smoother gains not saved")
+
+
+def calibrate(msname, **kwargs):
+    """A vanilla calibrate command to use the kalman
+    filter and smoother in an ordinary manner with an ms."""
+
+    # Options with thread counts set
+    options = _setup(kwargs)
+
+    # Check filter and smoother algorithms
+    _, kalman_smoother, _ = _algorithms(options)
+
+    if options.utime and options.windows and options.windows > 1:
+        raise ValueError("Streaming with `utime` cannot be combined "\
+                            + "with time windows.")
+
+    if options.utime:
+        # Stream time-chunks, requires the matrix-free filter
+        if options.algorithm.lower() != "mfree":
+            raise ValueError("Streaming with `utime` requires "\
+                                + "the MFREE algorithm.")
+
+        # Check if single or multiple model columns
+        model_columns = options.model_column.replace(" ", "").split(",")
+
+        # Load ms with row chunks aligned to time-bins
+        MS, tbin_indices, _, chunks = time_chunks(msname, options.utime)
+
+        # Get dimensions (correlations need to be adapted)
+        dims = ocf.create(dict(MS.sizes))
+        n_chan = dims.chan
+        n_corr = dims.corr
+        n_dir = len(model_columns)
+
+        # Set antenna dimension
+        n_ant = da.maximum(MS.ANTENNA1.data.max(), 
+                            MS.ANTENNA2.data.max()).compute() + 1
+
+        # Set time dimension
+        n_time = len(tbin_indices)
+
+        # Find mode to use
+        mode, corr = _corr_mode(concat_dir_axis(MS, model_columns))
+
+        # Run algorithm on each correlation independently
+        print(f"==> Correlation Mode: {mode}")
+        print(f"==> Streaming {len(chunks)} chunk(s) of "\
+                + f"{options.utime} time-bin(s)")
+
+        wall_start = time()
+        results = _stream_calibrate(MS, chunks, corr, kalman_smoother, 
+                        model_columns, n_ant, n_chan, n_dir, options)
+        wall_time = time() - wall_start
+
+        shape = (n_time, n_ant, n_chan, n_dir, n_corr, 2)
+        filter_gains, smooth_gains, stats = _collect(results, corr, 
+                                                shape, wall_time, options)
+    else:
+        # Load ms and run algorithm on each correlation
+        data = load_ms(msname, options)
+        corr = data["corr"]
+        filter_gains, smooth_gains, stats = solve(data, options)
+
+    print("==> Calibration complete.")
+
+    # Output corrected data and gains
+    save(msname, filter_gains, smooth_gains, corr, options, stats)
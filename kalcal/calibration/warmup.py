@@ -0,0 +1,173 @@
+from omegaconf import OmegaConf as ocf
+from kalcal.filters import ekf
+from kalcal.calibration.vanilla import (_algorithms, _calibrate_corr,
+    _flip_time, _precision, _priors, _with_defaults)
+from contextlib import redirect_stdout
+from itertools import product
+from time import time
+import numpy as np
+import os
+
+
+def _observation(cdtype, n_ant=3, n_time=3):
+    """A tiny synthetic observation of a single channel and
+    direction, with every baseline in every time-bin. The arrays
+    have the same types and layouts as those read from an ms,
+    where data and weights are strided views of a correlation."""
+
+    # Baselines of each time-bin
+    ant1, ant2 = np.triu_indices(n_ant, 1)
+    n_bl = ant1.size
+    ant1 = np.tile(ant1.astype(np.int32), n_time)
+    ant2 = np.tile(ant2.astype(np.int32), n_time)
+    tbin_counts = np.full(n_time, n_bl, dtype=np.int64)
+    tbin_indices = np.arange(0, n_bl * n_time, n_bl, dtype=np.int64)
+
+    # Unit model, data and weights
+    n_row = ant1.size
+    model = np.ones((n_row, 1, 1), dtype=cdtype)
+    vis = np.ones((n_row, 1, 2), dtype=cdtype)[..., 0]
+    weight = np.ones((n_row, 2), dtype=cdtype)[..., 0]
+
+    return model, vis, weight, ant1, ant2, tbin_indices, tbin_counts
+
+
+def _warmup_stream(options, n_ant=3):
+    """Compile the chunked matrix-free filter used when streaming,
+    for chunks in both directions."""
+
+    cdtype, rdtype = _precision(options)
+    mp, Pp, Q, _ = _priors(n_ant, 1, 1, True, options)
+    model, vis, weight, ant1, ant2, tbin_indices, tbin_counts\
+        = _observation(cdtype, n_ant)
+    weight = weight.real.astype(rdtype)
+
+    for backward in [False, True]:
+        if backward:
+            tbin_indices, tbin_counts, model, vis, weight, ant1, ant2\
+                = _flip_time(tbin_indices, tbin_counts, model,
+                                vis, weight, ant1, ant2)
+
+        ekf.mfree_chunk(mp, Pp, np.ascontiguousarray(model),
+                        np.ascontiguousarray(vis),
+                        np.ascontiguousarray(weight), Q,
+                        np.ascontiguousarray(ant1),
+                        np.ascontiguousarray(ant2), tbin_indices,
+                        tbin_counts, options.step_control,
+                        np.int32(n_ant), options.row_chunk or 0)
+
+
+def warmup_options(options):
+    """Compile the filter and smoother chosen by the vanilla
+    calibrate `options` by calibrating a tiny synthetic
+    observation. An even number of runs leaves the arrays
+    time-reversed (strided), so single runs are followed by
+    two runs if more are requested."""
+
+    options = _with_defaults(dict(options))
+    options.sigma_n = options.sigma_n or 1.0
+    runs = sorted({(1, 1), (min(options.filter, 2),
+                            min(options.smoother, 2))})
+    ocf.set_struct(options, True)
+
+    kalman_filter, kalman_smoother, diag_cov = _algorithms(options)
+    cdtype, _ = _precision(options)
+
+    model, vis, weight, ant1, ant2, tbin_indices, tbin_counts\
+        = _observation(cdtype)
+    for options.filter, options.smoother in runs:
+        _calibrate_corr(kalman_filter, kalman_smoother, model, vis,
+                        weight, ant1, ant2, tbin_indices, tbin_counts,
+                        3, diag_cov, options)
+
+    # Streaming filter
+    if options.get("utime"):
+        _warmup_stream(options)
+
+
+def _configurations(algorithms, precisions):
+    """Vanilla calibrate options for every valid combination
+    of algorithm, precision, smoother and row chunking."""
+
+    configs = []
+    for algorithm, precision in product(algorithms, precisions):
+        algorithm, precision = algorithm.upper(), precision.upper()
+        diag_only = algorithm in ["DIAG", "MFREE", "INFO", "ADAPTIVE"]
+        diag_cov = diag_only or algorithm == "SPARSE"
+        if precision == "SINGLE" and not diag_only:
+            continue
+
+        scan_smoothers = [False, True] if diag_cov else [False]
+        row_chunks = [None, 2] if algorithm in ["MFREE", "INFO", "ADAPTIVE"]\
+                        else [None]
+        for scan_smoother, row_chunk in product(scan_smoothers,
+                                                    row_chunks):
+            configs.append({
+                "filter" : 2,
+                "smoother" : 2,
+                "algorithm" : algorithm,
+                "precision" : precision,
+                "scan_smoother" : scan_smoother,
+                "sigma_f" : 0.1,
+                "sigma_n" : 1.0,
+                "step_control" : 0.5,
+                "row_chunk" : row_chunk,
+                "utime" : 1 if algorithm == "MFREE" else None
+            })
+
+    return configs
+
+
+def _precompile(configs, ncpu):
+    """Compile every configuration, returning the time taken
+    for each."""
+
+    if ncpu:
+        import numba
+        numba.set_num_threads(n=ncpu)
+
+    times = []
+    for config in configs:
+        start = time()
+        with open(os.devnull, "w") as null, redirect_stdout(null):
+            warmup_options(config)
+        times.append(time() - start)
+
+    return times
+
+
+def warmup(**kwargs):
+    """Compile the numba kernels of the calibrate commands ahead
+    of time into the on-disk cache, for the chosen algorithms and
+    precisions, so that later runs load them instead."""
+
+    options = ocf.create(kwargs)
+    configs = _configurations(options.algorithm, options.precision)
+    print(f"==> Compiling {len(configs)} configuration(s)")
+
+    if options.cache_dir:
+        from concurrent.futures import ProcessPoolExecutor
+        import multiprocessing
+
+        # Numba reads the cache directory when it is imported, so
+        # compile in a spawned process with it set
+        cache_dir = os.path.abspath(options.cache_dir)
+        os.makedirs(cache_dir, exist_ok=True)
+        os.environ["NUMBA_CACHE_DIR"] = cache_dir
+        print(f"==> Cache directory: `{cache_dir}`")
+
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=1,
+                                    mp_context=context) as pool:
+            times = pool.submit(_precompile, configs,
+                                    options.ncpu).result()
+    else:
+        times = _precompile(configs, options.ncpu)
+
+    for config, config_time in zip(configs, times):
+        print(f"==> {config['algorithm']}, {config['precision']}, "\
+            + f"scan_smoother={config['scan_smoother']}, "\
+            + f"row_chunk={config['row_chunk']}: "\
+            + f"{np.round(config_time, 3)} s")
+
+    print(f"==> Warm-up complete in {np.round(sum(times), 3)} s")
@@ -0,0 +1,37 @@
+import click
+from kalcal.cli.calibrate_vanilla import vanilla
+
+
+@click.command()
+@click.argument("ms", type=str, nargs=-1)
+
+@click.option("-w", "--workers", type=int,
+                default=1, show_default=True,
+                help="Number of worker processes, each compiling once "\
+                    + "and then calibrating one ms at a time.")
+
+@click.option("--out-dir", type=str,
+                default=".", show_default=True,
+                help="Directory for the gains and log of each ms, "\
+                    + "prefixed by the name of the ms (or its path, if "\
+                    + "names repeat).")
+
+@click.option("--summary", type=str,
+                help="Output .json file for the result, timing and "\
+                    + "error of each ms.")
+
+def batch(ms, **kwargs):
+    """Batch calibrate command, running the vanilla calibrate
+    command on a list of ms (or glob patterns) on a pool of
+    worker processes. Takes the same options as vanilla, with
+    output gains per ms, and a failed ms does not stop the rest."""
+
+    # Import when run, to keep the cli quick to start
+    from kalcal.calibration.batch import calibrate_batch
+
+    return calibrate_batch(ms, **kwargs)
+
+
+# Same calibrate options as vanilla
+batch.params.extend(param for param in vanilla.params
+                        if param.name != "ms")
@@ -0,0 +1,87 @@
+import click
+from kalcal.cli.calibrate_vanilla import vanilla
+import json
+
+
+@click.command()
+
+@click.option("--host", type=str,
+                default="127.0.0.1", show_default=True,
+                help="Address to listen on. Jobs can read and write any "\
+                    + "ms the daemon can, so keep it local.")
+
+@click.option("--port", type=int,
+                default=8765, show_default=True,
+                help="Port to listen on. Use 0 for any free port.")
+
+def daemon(**kwargs):
+    """Calibration daemon command, which keeps each ms it calibrates
+    and the compiled kernels in memory. Takes the same options as
+    vanilla, used for every job unless the job changes them. Jobs
+    are sent with the submit command."""
+
+    # Import when run, to keep the cli quick to start
+    from kalcal.calibration.daemon import daemon as daemon_cmd
+
+    return daemon_cmd(**kwargs)
+
+
+@click.command()
+@click.argument("ms", type=str, required=False)
+
+@click.option("--host", type=str,
+                default="127.0.0.1", show_default=True,
+                help="Address of the daemon.")
+
+@click.option("--port", type=int,
+                default=8765, show_default=True,
+                help="Port of the daemon.")
+
+@click.option("--action",
+                type=click.Choice(["CALIBRATE", "EVICT", "STATUS",
+                                    "SHUTDOWN"], case_sensitive=False),
+                default="CALIBRATE", show_default=True,
+                help="Calibrate the ms, remove it (or every ms, if not "\
+                    + "given) from the daemon cache, list the cache or "\
+                    + "stop the daemon.")
+
+@click.pass_context
+def submit(ctx, ms, host, port, action, **kwargs):
+    """Submit command, sending a calibration job for an ms to a
+    running daemon, or another request with --action. Only the
+    vanilla options given (on the command line or in the yaml
+    file) are sent, and the daemon's options are used for the
+    rest. The ms is required to calibrate, evicts only that ms
+    if given, and is not used to list the cache or stop."""
+
+    # Only calibrate and evict use the ms
+    action = action.upper()
+    if action == "CALIBRATE" and ms is None:
+        raise click.UsageError("An ms is required to calibrate.")
+    if action not in ["CALIBRATE", "EVICT"]:
+        ms = None
+
+    # Import when run, to keep the cli quick to start
+    from omegaconf import OmegaConf as ocf
+    from kalcal.calibration.daemon import submit as submit_cmd
+
+    # Options from yaml, then command line
+    options = {}
+    if kwargs["yaml"] is not None:
+        options.update(ocf.to_container(ocf.load(kwargs["yaml"])))
+    for name, value in kwargs.items():
+        source = ctx.get_parameter_source(name)
+        if name != "yaml" and source == click.core.ParameterSource.COMMANDLINE:
+            options[name] = value
+
+    reply = submit_cmd(ms, host, port, options, f"/{action.lower()}")
+    print(json.dumps(reply, indent=2))
+
+    if reply["status"] != "ok":
+        ctx.exit(1)
+
+
+# Same calibrate options as vanilla
+for command in [daemon, submit]:
+    command.params.extend(param for param in vanilla.params
+                            if param.name != "ms")
@@ -1,5 +1,4 @@
 import click
-from kalcal.calibration.vanilla import calibrate as calibrate_cmd
 
 
 @click.command()
@@ -14,9 +13,28 @@ from kalcal.calibration.vanilla import calibrate as calibrate_cmd
                 help="Number of RTS Smoother runs.")
 
 @click.option("-a", "--algorithm", 
-                type=click.Choice(["NUMBA", "SPARSE"], case_sensitive=False),
+                type=click.Choice(["NUMBA", "SPARSE", "DIAG", "MFREE", 
+                                    "INFO", "ADAPTIVE"], case_sensitive=False),
                 default="NUMBA", show_default=True,
-                help="Algorithm optimization to use for the filter.")
+                help="Algorithm optimization to use for the filter. DIAG "\
+                    + "only stores the diagonal of the covariance matrices "\
+                    + "and MFREE does the same without building the jacobian. "\
+                    + "INFO is MFREE with the inverse covariances carried "\
+                    + "between time-bins. ADAPTIVE is an iterated INFO that "\
+                    + "stops iterating each direction once converged.")
+
+@click.option("-p", "--precision", 
+                type=click.Choice(["DOUBLE", "SINGLE"], 
+                                    case_sensitive=False),
+                default="DOUBLE", show_default=True,
+                help="Precision of the visibilities, jacobian terms and "\
+                    + "state. SINGLE (complex64) accumulates in double "\
+                    + "precision and requires DIAG, MFREE, INFO or ADAPTIVE.")
+
+@click.option("--scan-smoother", is_flag=True,
+                help="Run the smoother in parallel over chunks of time, "\
+                    + "instead of over channels. Requires DIAG, MFREE, "\
+                    + "INFO, ADAPTIVE or SPARSE.")
 
 @click.option("-q", "--sigma-f", type=float, 
                 default=0.1, show_default=True,
@@ -30,6 +48,25 @@ from kalcal.calibration.vanilla import calibrate as calibrate_cmd
                 default=1/2, show_default=True,
                 help="Step-control on filter update step.")
 
+@click.option("--tol", type=float, 
+                default=1e-5, show_default=True,
+                help="Mean absolute change of a direction below which "\
+                    + "ADAPTIVE stops iterating it.")
+
+@click.option("--maxiter", type=int, 
+                default=5, show_default=True,
+                help="Maximum iterations per time-bin for ADAPTIVE.")
+
+@click.option("--reuse-tol", type=float, 
+                default=0.0, show_default=True,
+                help="Maximum absolute change below which ADAPTIVE reuses "\
+                    + "JHJ and JHr instead of computing them again.")
+
+@click.option("--damping", type=float, 
+                default=0.0, show_default=True,
+                help="Initial Levenberg damping for ADAPTIVE, or 0 for "\
+                    + "Gauss-Newton steps.")
+
 @click.option("--model-column", type=str, 
                 default="MODEL_VIS", show_default=True,
                 help="Name of ms column with model visibilities. If there "\
@@ -60,6 +97,35 @@ from kalcal.calibration.vanilla import calibrate as calibrate_cmd
                 default="WEIGHT_SPECTRUM", show_default=True,
                 help="Name of ms column to put scaled imaging weights in.")
 
+@click.option("--utime", type=int,
+                help="Stream the ms in chunks of this many unique times "\
+                    + "instead of loading it all at once. Requires MFREE.")
+
+@click.option("--prefetch", type=int,
+                default=1, show_default=True,
+                help="Number of chunks to read ahead on a background thread "\
+                    + "while streaming with --utime. Use 0 to read in place.")
+
+@click.option("--row-chunk", type=int,
+                help="Accumulate each time-bin over chunks of this many "\
+                    + "rows before updating, to bound memory for large "\
+                    + "arrays. Requires MFREE, INFO or ADAPTIVE.")
+
+@click.option("--windows", type=int,
+                help="Split the time axis into this many windows and "\
+                    + "calibrate each in a separate process, blending "\
+                    + "the overlapping regions into one solution.")
+
+@click.option("--overlap", type=int,
+                default=10, show_default=True,
+                help="Time-bins each window is extended by on either "\
+                    + "side, used to blend neighbouring windows.")
+
+@click.option("--concurrent", is_flag=True,
+                help="Calibrate correlations concurrently on separate threads "\
+                    + "instead of one after the other. Requires the tbb or "\
+                    + "omp numba threading layer, otherwise they run in turn.")
+
 @click.option("--ncpu", type=int,
                 help="Number of CPUs allowed for numba and dask to use. Default is all.")
 
@@ -72,4 +138,7 @@ def vanilla(ms, **kwargs):
     as a simple implementation of the Kalman and Filter algorithm
     to get to grips with how it works."""
 
+    # Import when run, to keep the cli quick to start
+    from kalcal.calibration.vanilla import calibrate as calibrate_cmd
+
     return calibrate_cmd(ms, **kwargs)
\ No newline at end of file
@@ -0,0 +1,41 @@
+import click
+
+
+@click.command()
+
+@click.option("-a", "--algorithm",
+                type=click.Choice(["NUMBA", "SPARSE", "DIAG", "MFREE",
+                                    "INFO", "ADAPTIVE"], case_sensitive=False),
+                multiple=True,
+                default=["NUMBA", "SPARSE", "DIAG", "MFREE", "INFO",
+                            "ADAPTIVE"],
+                show_default=True,
+                help="Filter algorithm to compile for, can be given "\
+                    + "multiple times.")
+
+@click.option("-p", "--precision",
+                type=click.Choice(["DOUBLE", "SINGLE"],
+                                    case_sensitive=False),
+                multiple=True, default=["DOUBLE", "SINGLE"],
+                show_default=True,
+                help="Precision to compile for, can be given multiple "\
+                    + "times. SINGLE is only compiled for DIAG, MFREE, "\
+                    + "INFO and ADAPTIVE.")
+
+@click.option("--cache-dir", type=str,
+                help="Directory to compile into. Set NUMBA_CACHE_DIR "\
+                    + "to the same directory for later runs to load "\
+                    + "from it. Default is numba's own cache directory.")
+
+@click.option("--ncpu", type=int,
+                help="Number of CPUs allowed for numba to use. Default is all.")
+
+def warmup(**kwargs):
+    """Warm-up command that compiles the filters, smoothers and
+    their kernels ahead of time into numba's on-disk cache, so
+    that later calibrate runs skip compiling them."""
+
+    # Import when run, to keep the cli quick to start
+    from kalcal.calibration.warmup import warmup as warmup_cmd
+
+    return warmup_cmd(**kwargs)
@@ -1,5 +1,4 @@
 import click
-from kalcal.create.data import new as new_cmd
 
 
 @click.command()
@@ -42,4 +41,7 @@ def data(ms, sky_model, gains, **kwargs):
     """Generate model visibilties per source (as direction axis)
     for stokes I and Q and generate relevant visibilities."""
 
+    # Import when run, to keep the cli quick to start
+    from kalcal.create.data import new as new_cmd
+
     return new_cmd(ms, sky_model, gains, **kwargs)
\ No newline at end of file
@@ -1,5 +1,4 @@
 import click
-from kalcal.create.gains import new as new_cmd
 
 
 @click.command()
@@ -35,4 +34,7 @@ def gains(ms, sky_model, **kwargs):
     """Create command to simulate either normal or phase-only
     gains for a given measurement set and sky-model."""
 
+    # Import when run, to keep the cli quick to start
+    from kalcal.create.gains import new as new_cmd
+
     return new_cmd(ms, sky_model, **kwargs)
\ No newline at end of file
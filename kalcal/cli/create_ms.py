@@ -1,5 +1,4 @@
 import click
-from kalcal.create.ms import new as new_cmd
 
 
 @click.command()
@@ -53,4 +52,7 @@ def ms(msname, **kwargs):
     """Create command to make a new empty measurement set using
     `simms` with some added features to make it easier to create."""
     
+    # Import when run, to keep the cli quick to start
+    from kalcal.create.ms import new as new_cmd
+
     return new_cmd(msname, **kwargs)
\ No newline at end of file
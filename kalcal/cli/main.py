@@ -1,21 +1,37 @@
 import click
 import oyaml as yl
-from omegaconf import OmegaConf as ocf
-import subprocess, os, tempfile
+import sys, traceback
 from kalcal.cli import calibrate_vanilla
+from kalcal.cli import calibrate_batch
+from kalcal.cli import calibrate_warmup
+from kalcal.cli import calibrate_daemon
 from kalcal.cli import create_ms
 from kalcal.cli import create_gains
 from kalcal.cli import create_data
 from kalcal.cli import plot_gains
+from kalcal.cli.pipeline import run_pipeline
 
 
 # Main command for kalcal
 @click.command()
 @click.argument("yaml", type=str)
-def kalcal_main(yaml):
+@click.option("-w", "--workers", type=int,
+                default=1, show_default=True,
+                help="Number of worker processes to run independent "\
+                    + "steps on concurrently. With 1, steps run in "\
+                    + "order in this process.")
+@click.option("-f", "--force", is_flag=True,
+                help="Run every step, even if its outputs are up to "\
+                    + "date with its options and inputs.")
+def kalcal_main(yaml, workers, force):
     """Main kalcal command to call sub-commands from a yaml config
-    file. Ordering is important as it indicates order of execution
-    of each command."""
+    file. Each step waits for the earlier steps that write the
+    files and ms columns it reads or writes, given by its `inputs`
+    and `outputs` or inferred from its command, otherwise for
+    every earlier step. With one worker, all steps run in order in
+    this process, so imports and compiled kernels are shared.
+    Steps whose outputs are up to date with their options and the
+    contents of their inputs are skipped."""
     
     # Options to dictionary
     with open(yaml, 'r') as file:        
@@ -23,51 +39,23 @@ def kalcal_main(yaml):
 
     # Go through each step and run command
     # with appropriate settings
-    for pos, exec_block in options.items():       
-
-        # Get command and subcommand
-        topcmd, subcmd = exec_block["command"].split()
-        print(f"==> Running: {topcmd} {subcmd}")
-
-        # Get arguments for function
-        try:
-            args = list(exec_block["arguments"].values())
-            print(f"==> Arguments:\n")
-            print(yl.dump(exec_block["arguments"]))
-        except:
-            args = []
-
-        # Get options for function
-        try:
-            kwargs = yl.dump(exec_block["options"])                   
-            print(f"==> Options:\n")
-            print(kwargs)
-        except:
-            kwargs = None
-
-        # Create temp config yaml file
-        filename, path = tempfile.mkstemp()
-
-        # Dump kwargs into config file
-        try:
-            with os.fdopen(filename, 'w') as tmp:
-                yl.dump(kwargs, tmp)
-        except:
-            pass
-
-        # Build command
-        cmd = [topcmd, subcmd, "--yaml", path] + args
-        
-        # Run and wait
-        proc = subprocess.Popen(cmd)
-        proc.wait()
-
-        # Remove config file
-        os.remove(path)        
-
+    try:
+        run_pipeline(command_groups(), options, workers, force)
+    except Exception as error:
         # Stop if command failed
-        if proc.returncode > 0:
-            exit()
+        traceback.print_exc()
+        print(f"==> {error}, stopping.")
+        sys.exit(1)
+
+
+def command_groups():
+    """Commands of each pipeline step, by command group."""
+
+    return {
+        "kal-calibrate" : kalcal_calibrate,
+        "kal-create" : kalcal_create,
+        "kal-plot" : kalcal_plot
+    }
 
 
 # Commands for kal-calibrate 
@@ -90,6 +78,10 @@ def kalcal_plot():
 
 # Add commands to kal-calibrate
 kalcal_calibrate.add_command(calibrate_vanilla.vanilla)
+kalcal_calibrate.add_command(calibrate_batch.batch)
+kalcal_calibrate.add_command(calibrate_warmup.warmup)
+kalcal_calibrate.add_command(calibrate_daemon.daemon)
+kalcal_calibrate.add_command(calibrate_daemon.submit)
 
 # Add commands to kal-create
 kalcal_create.add_command(create_ms.ms)
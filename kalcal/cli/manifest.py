@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+
+
+# Manifest of pipeline outputs, in the directory of the outputs
+MANIFEST = ".kalcal-manifest.json"
+
+# Main table columns describing an ms, apart from its data
+MS_COLUMNS = ["TIME", "ANTENNA1", "ANTENNA2", "UVW"]
+
+
+def _hash_path(path, sha):
+    """Add the contents of a file, or of every file in a directory
+    (except table locks), to `sha`."""
+
+    if os.path.isfile(path):
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                sha.update(block)
+        return
+
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if name == "table.lock":
+                continue
+            sha.update(os.path.relpath(os.path.join(root, name),
+                                        path).encode())
+            _hash_path(os.path.join(root, name), sha)
+
+
+def _hash_column(ms, column, sha):
+    """Add the contents of a main table column of an ms to `sha`,
+    reading it a chunk of rows at a time."""
+
+    from daskms import xds_from_table
+
+    data = xds_from_table(ms, columns=[column],
+                            chunks={"row": 100000})[0][column].data
+    sha.update(f"{column}{data.dtype}{data.shape}".encode())
+    for block in data.blocks:
+        sha.update(block.compute().tobytes())
+
+
+def _is_table(path):
+    return os.path.isfile(os.path.join(path, "table.dat"))
+
+
+def resource_digest(resource):
+    """Content hash of a file, directory or ms column
+    (`<ms>::<column>`), or None if it does not exist. An ms
+    itself is hashed by its sub-tables and the main table
+    columns describing it, so writing data columns to it does
+    not change its hash."""
+
+    path, _, column = resource.partition("::")
+    if not os.path.exists(path):
+        return None
+
+    sha = hashlib.sha256()
+    try:
+        if column:
+            _hash_column(path, column, sha)
+        elif _is_table(path):
+            for name in MS_COLUMNS:
+                _hash_column(path, name, sha)
+            for name in sorted(os.listdir(path)):
+                if _is_table(os.path.join(path, name)):
+                    sha.update(name.encode())
+                    _hash_path(os.path.join(path, name), sha)
+        else:
+            _hash_path(path, sha)
+    except (RuntimeError, ValueError, KeyError):
+        # Missing column or unreadable table
+        return None
+
+    return sha.hexdigest()
+
+
+def step_fingerprint(command, params, inputs):
+    """Hash of the command and parameters of a step and the
+    contents of its inputs."""
+
+    step = {
+        "command" : command,
+        "params" : params,
+        "inputs" : {resource : resource_digest(resource)
+                        for resource in sorted(inputs)}
+    }
+
+    return hashlib.sha256(json.dumps(step, sort_keys=True,
+                                        default=str).encode()).hexdigest()
+
+
+def _manifest_entry(resource):
+    """Path of the manifest for an output, and its key in it."""
+
+    path, sep, column = resource.partition("::")
+    path = os.path.normpath(path)
+
+    return (os.path.join(os.path.dirname(path), MANIFEST),
+            os.path.basename(path) + sep + column)
+
+
+def _load(manifest):
+    if not os.path.isfile(manifest):
+        return {}
+
+    with open(manifest, "r") as file:
+        try:
+            return json.load(file)
+        except json.JSONDecodeError:
+            return {}
+
+
+def up_to_date(fingerprint, outputs):
+    """Whether every output was made by a step with this
+    fingerprint and is unchanged since."""
+
+    for resource in outputs:
+        manifest, key = _manifest_entry(resource)
+        entry = _load(manifest).get(key)
+        if entry is None or entry["fingerprint"] != fingerprint:
+            return False
+
+        digest = resource_digest(resource)
+        if digest is None or digest != entry["digest"]:
+            return False
+
+    return True
+
+
+def record(fingerprint, outputs):
+    """Record the outputs made by a step with this fingerprint
+    in the manifests next to them."""
+
+    manifests = {}
+    for resource in outputs:
+        manifest, key = _manifest_entry(resource)
+        entries = manifests.setdefault(manifest, _load(manifest))
+        entries[key] = {
+            "fingerprint" : fingerprint,
+            "digest" : resource_digest(resource)
+        }
+
+    for manifest, entries in manifests.items():
+        with open(manifest, "w") as file:
+            json.dump(entries, file, indent=2, sort_keys=True)
@@ -0,0 +1,317 @@
+import oyaml as yl
+from kalcal.cli.manifest import step_fingerprint, up_to_date, record
+from time import time
+import os
+
+
+def step_command(groups, command):
+    """Click command of a pipeline step from its `command`,
+    e.g. 'kal-calibrate vanilla', looked up in `groups`."""
+
+    topcmd, subcmd = command.split()
+    if topcmd not in groups or subcmd not in groups[topcmd].commands:
+        raise ValueError(f"Unknown command `{command}`.")
+
+    return groups[topcmd].commands[subcmd]
+
+
+def step_params(command, name, arguments, options):
+    """Parameters to call the command of a step with, i.e. its
+    arguments and options over the defaults of the command.
+    Returns the click context and the parameters."""
+
+    # Arguments in order, where a list fills a variadic argument
+    args = []
+    for value in arguments.values():
+        args.extend(value if isinstance(value, list) else [value])
+
+    # Parse arguments for the command defaults
+    ctx = command.make_context(name, [str(arg) for arg in args])
+    unknown = set(options) - set(ctx.params)
+    if unknown:
+        raise ValueError(f"Unknown option(s) {sorted(unknown)} "\
+                            + f"for `{name}`.")
+
+    params = dict(ctx.params)
+    params.update(options)
+    params["yaml"] = None
+
+    return ctx, params
+
+
+def run_step(groups, exec_block):
+    """Run a pipeline step in this process, by calling its command
+    with the arguments and options of the step. Imports, dask and
+    numba settings and compiled kernels are shared between steps."""
+
+    # Get command and subcommand
+    command = step_command(groups, exec_block["command"])
+    print(f"==> Running: {exec_block['command']}")
+
+    # Get arguments and options for function
+    arguments = exec_block.get("arguments") or {}
+    options = exec_block.get("options") or {}
+    for title, block in [("Arguments", arguments), ("Options", options)]:
+        if block:
+            print(f"==> {title}:\n")
+            print(yl.dump(dict(block)))
+
+    ctx, params = step_params(command, exec_block["command"],
+                                arguments, options)
+    with ctx:
+        return ctx.invoke(command.callback, **params)
+
+
+def _column(ms, column):
+    """Resource name of a column of an ms."""
+
+    return f"{os.path.normpath(ms)}::{column}"
+
+
+def _files(*paths):
+    """Resource names of the given files, skipping unset ones."""
+
+    return [os.path.normpath(path) for path in paths
+                if path is not None and path != ""]
+
+
+def infer_resources(name, params):
+    """Inputs and outputs of a step of a known command, as files
+    and ms columns (`<ms>::<column>`), from its parameters. Returns
+    None if they cannot be inferred for the command."""
+
+    if name == "kal-create ms":
+        return [], _files(params["msname"])
+
+    if name == "kal-create gains":
+        return (_files(params["ms"], params["sky_model"]),
+                _files(params["out_file"]))
+
+    if name == "kal-create data":
+        inputs = _files(params["ms"], params["sky_model"], params["gains"])
+
+        # Model columns are named after sources, unless summed
+        if not params["die"]:
+            return inputs, _files(params["ms"])
+
+        outputs = [_column(params["ms"], column) for column in
+                        [params["mname"], "CLEAN_" + params["dname"],
+                            "NOISE", params["dname"]]]
+        return inputs, outputs
+
+    if name == "kal-calibrate vanilla":
+        ms = params["ms"]
+        columns = params["model_column"].replace(" ", "").split(",")
+        columns += [params["vis_column"], params["weight_column"]]
+        outputs = _files(params["out_filter"], params["out_smoother"])
+
+        # Iteration statistics next to the filter gains, as
+        # in `kalcal.calibration.vanilla.stats_path`
+        if params["algorithm"].upper() == "ADAPTIVE"\
+                and params["out_filter"]:
+            outputs += _files(os.path.splitext(params["out_filter"])[0]\
+                                + ".stats.npz")
+        if params["out_data"]:
+            outputs += [_column(ms, params["out_data"])]
+            if params["out_weight"]:
+                outputs += [_column(ms, params["out_weight"])]
+
+        return [_column(ms, column) for column in columns], outputs
+
+    if name == "kal-plot gains":
+        return (_files(*[plot[0] for plot in params["plot"]]),
+                _files(params["out_file"]))
+
+    return None
+
+
+def step_resources(groups, exec_block):
+    """Inputs and outputs of a step, as declared by its `inputs`
+    and `outputs`, or otherwise inferred from its command. Returns
+    None if the step has neither, so it runs on its own."""
+
+    if "inputs" in exec_block or "outputs" in exec_block:
+        return ([str(value) for value in exec_block.get("inputs") or []],
+                [str(value) for value in exec_block.get("outputs") or []])
+
+    return infer_resources(exec_block["command"],
+                            _block_params(groups, exec_block))
+
+
+def _block_params(groups, exec_block):
+    """Parameters the command of a step is called with."""
+
+    command = step_command(groups, exec_block["command"])
+    _, params = step_params(command, exec_block["command"],
+                                exec_block.get("arguments") or {},
+                                exec_block.get("options") or {})
+
+    return params
+
+
+def _normalise(resource):
+    """Resource name with its path normalised."""
+
+    ms, sep, column = resource.partition("::")
+    return os.path.normpath(ms) + sep + column
+
+
+def _covers(written, other):
+    """Whether writing `written` changes `other`, where writing
+    an ms changes all of its columns."""
+
+    written, other = _normalise(written), _normalise(other)
+    return written == other or other.startswith(written + "::")
+
+
+def step_dependencies(resources):
+    """Earlier steps each step has to wait for, given the inputs
+    and outputs of each step in order (None if unknown). A step
+    waits for those writing what it reads or writes, and for those
+    reading what it writes. Steps with unknown inputs and outputs
+    wait for, and are waited on by, every other step."""
+
+    dependencies = []
+    for i, current in enumerate(resources):
+        depends = set()
+        for j, earlier in enumerate(resources[:i]):
+            if current is None or earlier is None:
+                depends.add(j)
+                continue
+
+            inputs, outputs = current
+            earlier_inputs, earlier_outputs = earlier
+            if any(_covers(written, read)
+                        for written in earlier_outputs for read in inputs)\
+                or any(_covers(written, read)
+                        for written in outputs for read in earlier_inputs)\
+                or any(_covers(a, b) or _covers(b, a)
+                        for a in outputs for b in earlier_outputs):
+                depends.add(j)
+
+        dependencies.append(depends)
+
+    return dependencies
+
+
+def _check_step(groups, pos, exec_block, resources, force):
+    """Fingerprint of a step, and whether its outputs are up to
+    date with it so it can be skipped. Steps without known outputs
+    have no fingerprint and always run."""
+
+    if resources is None or len(resources[1]) == 0:
+        return None, False
+
+    fingerprint = step_fingerprint(exec_block["command"],
+                                    _block_params(groups, exec_block),
+                                    resources[0])
+    if not force and up_to_date(fingerprint, resources[1]):
+        print(f"==> Step {pos} is up to date, skipping.")
+        return fingerprint, True
+
+    return fingerprint, False
+
+
+def _run_step_process(exec_block):
+    """Run a step in a worker process, returning the time taken."""
+
+    from kalcal.cli.main import command_groups
+
+    start = time()
+    run_step(command_groups(), exec_block)
+    return time() - start
+
+
+def run_pipeline(groups, steps, workers=1, force=False):
+    """Run the steps of a pipeline, given by position, once the
+    steps they depend on are done. With one worker, steps run in
+    order in this process, otherwise independent steps run
+    concurrently on a pool of worker processes. A step is skipped
+    if its outputs were made with the same command, parameters
+    and input contents and are unchanged since, as recorded in a
+    manifest next to them, unless `force` is set. Raises a
+    RuntimeError for the first step that fails, after the steps
+    already running have finished."""
+
+    positions = list(steps)
+    blocks = [steps[pos] for pos in positions]
+    resources = [step_resources(groups, block) for block in blocks]
+    dependencies = step_dependencies(resources)
+
+    # Steps in order in this process
+    if workers <= 1:
+        for pos, block, step in zip(positions, blocks, resources):
+            fingerprint, skip = _check_step(groups, pos, block,
+                                                step, force)
+            if skip:
+                continue
+
+            try:
+                start = time()
+                run_step(groups, block)
+            except Exception as error:
+                raise RuntimeError(f"Step {pos} failed") from error
+            print(f"==> Step {pos} done in {round(time() - start, 3)} s")
+
+            if fingerprint is not None:
+                record(fingerprint, step[1])
+        return
+
+    from concurrent.futures import (ProcessPoolExecutor, wait,
+                                    FIRST_COMPLETED)
+    import multiprocessing
+
+    print(f"==> Running {len(blocks)} step(s) on {workers} "\
+            + f"worker process(es)")
+    for pos, depends in zip(positions, dependencies):
+        if depends:
+            print(f"==> Step {pos} waits on step(s) "\
+                    + f"{', '.join(str(positions[j]) for j in sorted(depends))}")
+
+    # Spawned processes, since forking after dask and numba
+    # have started threads can deadlock
+    remaining = list(range(len(blocks)))
+    done, running, failed = set(), {}, None
+    fingerprints = {}
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers,
+                                mp_context=context) as pool:
+        while remaining or running:
+            # Submit steps whose dependencies are done, stopping
+            # once a step has failed. Skipped steps are done, so
+            # check again for steps waiting on them
+            ready = [i for i in remaining if dependencies[i] <= done]
+            while failed is None and ready:
+                for i in ready:
+                    remaining.remove(i)
+                    fingerprints[i], skip = _check_step(groups,
+                        positions[i], blocks[i], resources[i], force)
+                    if skip:
+                        done.add(i)
+                    else:
+                        running[pool.submit(_run_step_process,
+                                            blocks[i])] = i
+                ready = [i for i in remaining if dependencies[i] <= done]
+
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                i = running.pop(future)
+                try:
+                    step_time = future.result()
+                except Exception as error:
+                    failed = failed or (i, error)
+                    print(f"==> Step {positions[i]} failed")
+                    continue
+
+                done.add(i)
+                print(f"==> Step {positions[i]} done in "\
+                        + f"{round(step_time, 3)} s")
+                if fingerprints[i] is not None:
+                    record(fingerprints[i], resources[i][1])
+
+    if failed is not None:
+        i, error = failed
+        raise RuntimeError(f"Step {positions[i]} failed") from error
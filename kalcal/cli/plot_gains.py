@@ -1,5 +1,4 @@
 import click
-from kalcal.plotting.plot import gains as gains_cmd
 
 
 @click.command()
@@ -49,4 +48,7 @@ def gains(**kwargs):
     g_p x g_q^*, where p is the reference antenna for each 
     jones data present in args."""
 
+    # Import when run, to keep the cli quick to start
+    from kalcal.plotting.plot import gains as gains_cmd
+
     return gains_cmd(**kwargs)
\ No newline at end of file
@@ -1,35 +1,31 @@
-# kalcal.dataset.sky_models attributes
-from pkg_resources import resource_filename
+# kalcal.dataset.antenna_tables attributes
+from importlib.resources import files
+
+
+def _path(name):
+    """Path of a file in this package."""
+
+    return str(files(__name__) / name)
 
 # Antenna tables made by Sphe on `simms` package (KERN)
 # See: https://github.com/ratt-ru/simms/tree/master/simms/observatories
 
-KAT7 = resource_filename(
-    'kalcal', 'datasets/antenna_tables/kat-7.itrf.txt')
+KAT7 = _path('kat-7.itrf.txt')
 
-LOFAR = resource_filename(
-    'kalcal', 'datasets/antenna_tables/lofar_ml.itrf.txt')
+LOFAR = _path('lofar_nl.itrf.txt')
 
-MEERKAT = resource_filename(
-    'kalcal', 'datasets/antenna_tables/meerkat.itrf.txt')
+MEERKAT = _path('meerkat.itrf.txt')
 
-SKA197 = resource_filename(
-    'kalcal', 'datasets/antenna_tables/skamid197.itrf.txt')
+SKA197 = _path('skamid197.itrf.txt')
 
-SKA254 = resource_filename(
-    'kalcal', 'datasets/antenna_tables/skamid254.itrf.txt')
+SKA254 = _path('skamid254.itrf.txt')
 
-VLAA = resource_filename(
-    'kalcal', 'datasets/antenna_tables/vlaa.itrf.txt')
+VLAA = _path('vlaa.itrf.txt')
 
-VLAB = resource_filename(
-    'kalcal', 'datasets/antenna_tables/vlab.itrf.txt')
+VLAB = _path('vlab.itrf.txt')
 
-VLAC = resource_filename(
-    'kalcal', 'datasets/antenna_tables/vlac.itrf.txt')
+VLAC = _path('vlac.itrf.txt')
 
-VLAD = resource_filename(
-    'kalcal', 'datasets/antenna_tables/vlad.itrf.txt')
+VLAD = _path('vlad.itrf.txt')
 
-WSRT = resource_filename(
-    'kalcal', 'datasets/antenna_tables/wsrt.itrf.txt')
\ No newline at end of file
+WSRT = _path('wsrt.itrf.txt')
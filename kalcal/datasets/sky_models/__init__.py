@@ -1,13 +1,16 @@
 # kalcal.dataset.sky_models attributes
-from pkg_resources import resource_filename
+from importlib.resources import files
+
+
+def _path(name):
+    """Path of a file in this package."""
+
+    return str(files(__name__) / name)
 
 # Custom basic sky-models for to use
 
-MODEL_1 = resource_filename('kalcal', 
-            'datasets/sky_models/MODEL-1.txt')
+MODEL_1 = _path('MODEL-1.txt')
 
-MODEL_4 = resource_filename('kalcal', 
-            'datasets/sky_models/MODEL-4.txt')
+MODEL_4 = _path('MODEL-4.txt')
 
-MODEL_50 = resource_filename('kalcal', 
-            'datasets/sky_models/MODEL-50.txt')
\ No newline at end of file
+MODEL_50 = _path('MODEL-50.txt')
@@ -60,9 +60,15 @@ def main():
         "filter"            : 1,
         "smoother"          : 1,
         "algorithm"         : "NUMBA",
+        "precision"         : "DOUBLE",
+        "scan_smoother"     : False,
         "sigma_f"           : 0.0075,
         "sigma_n"           : 1.0,
         "step_control"      : 0.5,
+        "tol"               : 1e-5, # ADAPTIVE only
+        "maxiter"           : 5,
+        "reuse_tol"         : 0.0,
+        "damping"           : 0.0,
         "model_column"      : "MODEL_DATA",
         "vis_column"        : "DATA",
         "weight_column"     : "WEIGHT",
@@ -70,6 +76,12 @@ def main():
         "out_smoother"      : "smoother.npy",
         "out_data"          : "", # Not using corrected data
         "out_weight"        : "", # Not using imaging weights
+        "utime"             : None, # Not streaming the ms
+        "prefetch"          : 1,
+        "row_chunk"         : None, # Whole time-bins
+        "windows"           : None, # Not using time windows
+        "overlap"           : 10,
+        "concurrent"        : False,
         "ncpu"              : 8, 
         "yaml"              : None
     }
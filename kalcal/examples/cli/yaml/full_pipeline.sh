@@ -15,8 +15,16 @@ kal-create gains --yaml create_gains.yml meerkat.ms skymodel.txt
 # Generate visibilities for the measurement set with gains
 kal-create data --yaml create_data.yml meerkat.ms skymodel.txt true_gains.npy
 
+# Compile the calibration algorithms once into a shared cache, which
+# later commands load from when NUMBA_CACHE_DIR points to it
+export NUMBA_CACHE_DIR=$PWD/numba_cache
+kal-calibrate warmup --cache-dir $NUMBA_CACHE_DIR
+
 # Calibrate the noisy corrupted gains
 kal-calibrate vanilla --yaml calibrate_vanilla.yml meerkat.ms
 
 # Plot results of calibration against true gains as a gains-product plot
-kal-plot gains --yaml plot_gains.yml
\ No newline at end of file
+kal-plot gains --yaml plot_gains.yml
+
+# Calibrate a batch of measurement sets on a pool of worker processes
+kal-calibrate batch --yaml calibrate_batch.yml "*.ms"
@@ -1,11 +1,15 @@
 import numpy as np
-from numba import jit, objmode
+from numba import jit, prange
 from kalcal.tools.utils import (
     gains_vector, gains_reshape, 
     measure_vector, progress_bar,
-    diag_mat_dot_mat)
-from kalcal.tools.jacobian import compute_aug_csr, compute_aug_np
-from kalcal.tools.sparseops import csr_dot_vec
+    diag_mat_dot_mat, chan_vector,
+    chan_vector_assign, cov_diagonal,
+    info_predict, info_update)
+from kalcal.tools.jacobian import (
+    compute_aug_csr_pattern, update_aug_csr, 
+    compute_aug_np, chunked_jhj_jhr)
+from kalcal.tools.sparseops import csr_dot_vec, chan_block_solve
 
 
 def sparse_algorithm(
@@ -23,7 +27,11 @@ def sparse_algorithm(
     alpha        : np.float64): 
 
     """Sparse-matrix implementation of EKF algorithm. Not
-    numba-compiled."""
+    numba-compiled. The covariances `Pp`, `Q` and `R` are 
+    diagonal and can be given as matrices or 1D diagonals, 
+    with `P` returned in the same form as `Pp`. The update is 
+    solved in information form per channel, without inverting
+    any dense matrices."""
 
     # Time counts
     n_time = len(tbin_indices)
@@ -46,24 +54,29 @@ def sparse_algorithm(
     # Jacobian shape
     shape = gains_shape[1:]
 
-    # Covariance shape
-    covs_shape = (n_time, 2*axis_length, 2*axis_length)
+    # Return covariance matrices if given
+    full_cov = np.ndim(Pp) == 2
+
+    # Covariances as diagonals
+    Pp, Q, R = cov_diagonal(Pp), cov_diagonal(Q), cov_diagonal(R)
 
     # State vectors
     m = np.zeros(gains_shape, dtype=np.complex128)
 
-    # Covariance matrices
-    P = np.zeros(covs_shape, dtype=np.complex128)
+    # Covariance diagonals
+    P = np.zeros((n_time, 2*axis_length), dtype=np.float64)
     
     # Initial state and covariance
     m[0] = gains_reshape(mp, shape)
     P[0] = Pp
     
-    # Select CSR jacobian function 
-    aug_jac = compute_aug_csr
+    # CSR jacobian pattern and its baselines, built 
+    # once and refilled in-place at each step
+    J = None
+    J_ant1 = J_ant2 = None
     
     # Calculate R^{-1} for a diagonal
-    Rinv = np.diag(1.0/np.diag(R))
+    Rinv = 1.0/R
     
     # Run Extended Kalman Filter with 
     # Sparse matrices
@@ -90,36 +103,43 @@ def sparse_algorithm(
         ant2_slice = ant2[row_slice]
         jones_slice = m[k - 1]        
 
-        # Calculate Augmented Jacobian
-        J = aug_jac(model_slice, weight_slice, 
+        # Rebuild jacobian pattern if baselines changed
+        if J is None or not (np.array_equal(J_ant1, ant1_slice)
+                and np.array_equal(J_ant2, ant2_slice)):
+            J = compute_aug_csr_pattern(ant1_slice, ant2_slice, 
+                                        n_ant, n_chan, n_dir, 
+                                        model_slice.dtype)
+            J_ant1, J_ant2 = ant1_slice, ant2_slice
+
+        # Refill Augmented Jacobian in-place
+        J = update_aug_csr(J, model_slice, weight_slice, 
                         jones_slice, ant1_slice, ant2_slice)
         
-        # Hermitian of Jacobian
-        J_herm = J.conjugate().T
-        
         # Calculate Measure Vector
         y = measure_vector(vis_slice, weight_slice, 
                             n_ant, n_chan)        
         
-        # Update Step
+        # Update Step, with K v = T^{-1} J^H R^{-1} v and 
+        # diag(K J Pp) = Pp - diag(T^{-1})
         v = y - csr_dot_vec(J, mp) 
-        Pinv = np.diag(1.0/np.diag(Pp))       
-        Tinv = np.linalg.inv(Pinv + J_herm @ Rinv @ J)
-        Sinv = Rinv - Rinv @ J @ Tinv @ J_herm @ Rinv
-        K = Pp @ J_herm @ Sinv
+        Kv, Tinv = chan_block_solve(J, 1.0/Pp, Rinv, v, n_chan)
 
         # Record Posterior values
-        m[k] = gains_reshape(mp + alpha * K @ v, shape)
-        P[k] = np.diag(np.diag(Pp - alpha * K @ J @ Pp).real)
+        m[k] = gains_reshape(mp + alpha * Kv, shape)
+        P[k] = (1.0 - alpha) * Pp + alpha * Tinv
 
     # Newline
     print()
 
+    # Covariance matrices, if given as matrices
+    if full_cov:
+        P = np.array([np.diag(p) for p in P], dtype=np.complex128)
+
     # Return Posterior states and covariances
     return m, P
 
 
-@jit(nopython=True, fastmath=True)
+@jit(nopython=True, fastmath=True, cache=True)
 def numba_algorithm(
     mp           : np.ndarray, 
     Pp           : np.ndarray, 
@@ -179,13 +199,10 @@ def numba_algorithm(
     I = np.eye(Rinv.shape[0])
     # Run Extended Kalman Filter with 
     # NUMPY matrices
-    head = "==> Extended Kalman Filter (NUMPY|JIT): "
+    print("==> Extended Kalman Filter (NUMPY|JIT): "\
+            + "filtering time-bins")
     for k in range(1, n_time): 
-        
-        # Progress Bar in object-mode
-        with objmode():
-            progress_bar(head, n_time, k)
-        
+                
         # Predict Step
         mp = gains_vector(m[k - 1])
         Pp = (P[k - 1] + Q)
@@ -256,8 +273,401 @@ def numba_algorithm(
         m[k] = gains_reshape(est_m, shape)
         P[k] = np.diag(est_P.real)
 
-    # Newline
-    print()
-
     # Return Posterior states and covariances
-    return m, P
\ No newline at end of file
+    return m, P
+
+@jit(nopython=True, fastmath=True, nogil=True, parallel=True,
+        cache=True)
+def diag_algorithm(
+    mp           : np.ndarray, 
+    Pp           : np.ndarray, 
+    model        : np.ndarray, 
+    vis          : np.ndarray, 
+    weight       : np.ndarray, 
+    Q            : np.ndarray, 
+    R            : np.ndarray, 
+    ant1         : np.ndarray, 
+    ant2         : np.ndarray, 
+    tbin_indices : np.ndarray, 
+    tbin_counts  : np.ndarray,
+    alpha        : np.float64):  
+
+    """Numpy-matrix implementation of EKF algorithm with
+    diagonal-only covariance storage, i.e. `Pp`, `Q` and `R` 
+    are the diagonals of their matrices and `P` is returned 
+    with shape (n_time, 2N). The jacobian is block diagonal
+    over channels, so each channel is filtered independently 
+    and in parallel. It is numba-compiled."""
+
+    # Time counts
+    n_time = len(tbin_indices)
+
+    # Number of Baselines
+    n_bl = model.shape[0]//n_time
+
+    # Number of Antennas
+    n_ant = int((np.sqrt(8*n_bl + 1) + 1)/2)
+
+    # Dimensions
+    n_chan, n_dir = model.shape[1], model.shape[2]
+
+    # Matrix-size
+    axis_length = n_ant * n_chan * n_dir
+
+    # Original matrix size    
+    gains_shape = (n_time, n_ant, n_chan, n_dir, 2)
+
+    # Jacobian shape
+    shape = gains_shape[1:]
+
+    # Single channel jacobian shape
+    chan_shape = (n_ant, 1, n_dir, 2)
+
+    # Covariance shape (diagonal only)
+    covs_shape = (n_time, 2*axis_length)
+
+    # State vectors
+    m = np.zeros(gains_shape, dtype=mp.dtype)
+
+    # Covariance diagonals
+    P = np.zeros(covs_shape, dtype=Pp.real.dtype)
+    
+    # Initial state and covariance
+    m[0] = gains_reshape(mp, shape)
+    P[0] = Pp.real
+    
+    # Select numpy jacobian function 
+    aug_jac = compute_aug_np
+
+    # Run Extended Kalman Filter with 
+    # NUMPY matrices and diagonal covariances,
+    # per channel in parallel
+    print("==> Extended Kalman Filter (DIAG|JIT): "\
+            + "filtering channels in parallel")
+    for nu in prange(n_chan):
+
+        # Process noise for channel
+        q = chan_vector(Q.real, nu, n_chan).astype(np.float64)
+        
+        for k in range(1, n_time): 
+        
+            # Predict Step
+            mk = gains_vector(m[k - 1, :, nu:nu + 1]).astype(np.complex128)
+            p = chan_vector(P[k - 1], nu, n_chan).astype(np.float64) + q
+            
+            # Slice indices
+            start = tbin_indices[k - 1]
+            end = start + tbin_counts[k - 1]
+            
+            # Calculate Slices
+            row_slice = slice(start, end)
+            vis_slice = vis[row_slice, nu:nu + 1]
+            model_slice = model[row_slice, nu:nu + 1]
+            weight_slice = weight[row_slice]
+            ant1_slice = ant1[row_slice]
+            ant2_slice = ant2[row_slice]
+            jones_slice = m[k - 1, :, nu:nu + 1]        
+
+            # Calculate Augmented Jacobian (channel block)
+            J = aug_jac(model_slice, weight_slice, 
+                            jones_slice, ant1_slice, ant2_slice)
+            
+            # Hermitian of Jacobian
+            J_herm = J.conjugate().T
+
+            # Calculate Measure Vector
+            y = measure_vector(vis_slice, weight_slice, 
+                                n_ant, 1)        
+
+            # Update Step, with the jacobian products in the 
+            # precision of the jacobian and the update in double
+            v = y - J @ mk.astype(J.dtype)
+            pinv = 1.0/p
+            u = np.sum(np.abs(J)**2, axis=0) # Diagonal of JHJ
+            
+            z = J_herm @ v # JHr
+            updt = alpha / (pinv + u)
+            est_m = mk + z * updt
+            est_P = (1 - alpha) * p + updt
+            
+            # Record Posterior values
+            m[k, :, nu:nu + 1] = gains_reshape(est_m, chan_shape)
+            chan_vector_assign(P[k], est_P, nu, n_chan)
+
+    # Return Posterior states and covariance diagonals
+    return m, P
+
+
+@jit(nopython=True, fastmath=True, nogil=True, parallel=True,
+        cache=True)
+def mfree_chunk(
+    mp           : np.ndarray, 
+    Pp           : np.ndarray, 
+    model        : np.ndarray, 
+    vis          : np.ndarray, 
+    weight       : np.ndarray, 
+    Q            : np.ndarray, 
+    ant1         : np.ndarray, 
+    ant2         : np.ndarray, 
+    tbin_indices : np.ndarray, 
+    tbin_counts  : np.ndarray,
+    alpha        : np.float64,
+    n_ant        : np.int32,
+    row_chunk    : np.int32=0):
+
+    """Matrix-free EKF over every time-bin in a chunk of data, 
+    starting from the prior `mp` and `Pp` (diagonal), and 
+    returning the posterior state and covariance diagonal after 
+    each time-bin. Consecutive chunks can be fed through the 
+    filter by using the last posterior as the next prior. Each
+    channel is filtered independently and in parallel, with the
+    sums over a time-bin taken over `row_chunk` rows at a time
+    (all at once if 0). It is numba-compiled."""
+
+    # Time counts
+    n_time = len(tbin_indices)
+
+    # Dimensions
+    n_chan, n_dir = model.shape[1], model.shape[2]
+
+    # Matrix-size
+    axis_length = n_ant * n_chan * n_dir
+
+    # Original matrix size    
+    gains_shape = (n_time, n_ant, n_chan, n_dir, 2)
+
+    # Single channel jacobian shape
+    chan_shape = (n_ant, 1, n_dir, 2)
+
+    # Covariance shape (diagonal only)
+    covs_shape = (n_time, 2*axis_length)
+
+    # Posterior state vectors
+    m = np.zeros(gains_shape, dtype=mp.dtype)
+
+    # Posterior covariance diagonals
+    P = np.zeros(covs_shape, dtype=Pp.real.dtype)
+
+    # Run Extended Kalman Filter without
+    # building the jacobian, per channel in parallel
+    for nu in prange(n_chan):
+
+        # Prior and process noise for channel
+        mt = chan_vector(mp, nu, n_chan).astype(np.complex128)
+        pt = chan_vector(Pp.real, nu, n_chan).astype(np.float64)
+        q = chan_vector(Q.real, nu, n_chan).astype(np.float64)
+
+        for k in range(n_time): 
+        
+            # Predict Step
+            p = pt + q
+            
+            # Slice indices
+            start = tbin_indices[k]
+            end = start + tbin_counts[k]
+            
+            # Calculate Slices
+            row_slice = slice(start, end)
+            vis_slice = vis[row_slice, nu:nu + 1]
+            model_slice = model[row_slice, nu:nu + 1]
+            weight_slice = weight[row_slice]
+            ant1_slice = ant1[row_slice]
+            ant2_slice = ant2[row_slice]
+            jones_slice = gains_reshape(mt, chan_shape).astype(model.dtype)
+
+            # Diagonal of JHJ and JHr
+            u, z = chunked_jhj_jhr(model_slice, weight_slice, vis_slice,
+                            jones_slice, jones_slice, ant1_slice, ant2_slice,
+                            row_chunk)
+
+            # Update Step
+            pinv = 1.0/p
+            updt = alpha / (pinv + u)
+            mt = mt + z * updt
+            pt = (1 - alpha) * p + updt
+            
+            # Record Posterior values
+            m[k, :, nu:nu + 1] = gains_reshape(mt, chan_shape)
+            chan_vector_assign(P[k], pt, nu, n_chan)
+
+    # Return Posterior states and covariance diagonals
+    return m, P
+
+
+@jit(nopython=True, fastmath=True, nogil=True, cache=True)
+def mfree_algorithm(
+    mp           : np.ndarray, 
+    Pp           : np.ndarray, 
+    model        : np.ndarray, 
+    vis          : np.ndarray, 
+    weight       : np.ndarray, 
+    Q            : np.ndarray, 
+    R            : np.ndarray, 
+    ant1         : np.ndarray, 
+    ant2         : np.ndarray, 
+    tbin_indices : np.ndarray, 
+    tbin_counts  : np.ndarray,
+    alpha        : np.float64,
+    row_chunk    : np.int32=0):  
+
+    """Matrix-free implementation of EKF algorithm with
+    diagonal-only covariance storage. The diagonal of JHJ
+    and JHr are computed directly from the data, so the
+    jacobian is never built. Each channel is filtered 
+    independently and in parallel (see `mfree_chunk`, also 
+    for `row_chunk`). It is numba-compiled."""
+
+    # Time counts
+    n_time = len(tbin_indices)
+
+    # Number of Baselines
+    n_bl = model.shape[0]//n_time
+
+    # Number of Antennas
+    n_ant = int((np.sqrt(8*n_bl + 1) + 1)/2)
+
+    # Dimensions
+    n_chan, n_dir = model.shape[1], model.shape[2]
+
+    # Matrix-size
+    axis_length = n_ant * n_chan * n_dir
+
+    # Original matrix size    
+    gains_shape = (n_time, n_ant, n_chan, n_dir, 2)
+
+    # Jacobian shape
+    shape = gains_shape[1:]
+
+    # Covariance shape (diagonal only)
+    covs_shape = (n_time, 2*axis_length)
+
+    # State vectors
+    m = np.zeros(gains_shape, dtype=mp.dtype)
+
+    # Covariance diagonals
+    P = np.zeros(covs_shape, dtype=Pp.real.dtype)
+    
+    # Initial state and covariance
+    m[0] = gains_reshape(mp, shape)
+    P[0] = Pp.real
+
+    # Run Extended Kalman Filter without
+    # building the jacobian, where the last
+    # time-bin has no next state to update
+    print("==> Extended Kalman Filter (MFREE|JIT): "\
+            + "filtering channels in parallel")
+    m[1:], P[1:] = mfree_chunk(mp, Pp, model, vis, weight, Q, 
+                        ant1, ant2, tbin_indices[:-1], 
+                        tbin_counts[:-1], alpha, n_ant, row_chunk)
+
+    # Return Posterior states and covariance diagonals
+    return m, P
+
+
+@jit(nopython=True, fastmath=True, nogil=True, parallel=True,
+        cache=True)
+def info_algorithm(
+    mp           : np.ndarray, 
+    Pp           : np.ndarray, 
+    model        : np.ndarray, 
+    vis          : np.ndarray, 
+    weight       : np.ndarray, 
+    Q            : np.ndarray, 
+    R            : np.ndarray, 
+    ant1         : np.ndarray, 
+    ant2         : np.ndarray, 
+    tbin_indices : np.ndarray, 
+    tbin_counts  : np.ndarray,
+    alpha        : np.float64,
+    row_chunk    : np.int32=0):  
+
+    """Information-form implementation of the matrix-free EKF 
+    algorithm. The inverse of the covariance diagonal is carried
+    between time-bins instead of the covariance, so the diagonal
+    of JHJ (and JHr) is added directly to it and is only inverted
+    when recording `P`. The diagonal of JHJ and JHr of a time-bin
+    are accumulated over `row_chunk` rows at a time (all at once
+    if 0) before a single update. Each channel is filtered 
+    independently and in parallel. It is numba-compiled."""
+
+    # Time counts
+    n_time = len(tbin_indices)
+
+    # Number of Baselines
+    n_bl = model.shape[0]//n_time
+
+    # Number of Antennas
+    n_ant = int((np.sqrt(8*n_bl + 1) + 1)/2)
+
+    # Dimensions
+    n_chan, n_dir = model.shape[1], model.shape[2]
+
+    # Matrix-size
+    axis_length = n_ant * n_chan * n_dir
+
+    # Original matrix size    
+    gains_shape = (n_time, n_ant, n_chan, n_dir, 2)
+
+    # Jacobian shape
+    shape = gains_shape[1:]
+
+    # Single channel jacobian shape
+    chan_shape = (n_ant, 1, n_dir, 2)
+
+    # Covariance shape (diagonal only)
+    covs_shape = (n_time, 2*axis_length)
+
+    # State vectors
+    m = np.zeros(gains_shape, dtype=mp.dtype)
+
+    # Covariance diagonals
+    P = np.zeros(covs_shape, dtype=Pp.real.dtype)
+    
+    # Initial state and covariance
+    m[0] = gains_reshape(mp, shape)
+    P[0] = Pp.real
+
+    # Run Extended Kalman Filter in information
+    # form, per channel in parallel
+    print("==> Extended Kalman Filter (INFO|JIT): "\
+            + "filtering channels in parallel")
+    for nu in prange(n_chan):
+
+        # Prior state, information and process noise for channel
+        mk = chan_vector(mp, nu, n_chan).astype(np.complex128)
+        lam = 1.0/chan_vector(Pp.real, nu, n_chan).astype(np.float64)
+        q = chan_vector(Q.real, nu, n_chan).astype(np.float64)
+
+        for k in range(1, n_time): 
+        
+            # Predict Step
+            lam_p = info_predict(lam, q)
+            
+            # Slice indices
+            start = tbin_indices[k - 1]
+            end = start + tbin_counts[k - 1]
+            
+            # Calculate Slices
+            row_slice = slice(start, end)
+            vis_slice = vis[row_slice, nu:nu + 1]
+            model_slice = model[row_slice, nu:nu + 1]
+            weight_slice = weight[row_slice]
+            ant1_slice = ant1[row_slice]
+            ant2_slice = ant2[row_slice]
+            jones_slice = gains_reshape(mk, chan_shape).astype(model.dtype)
+
+            # Diagonal of JHJ and JHr
+            u, z = chunked_jhj_jhr(model_slice, weight_slice, vis_slice,
+                            jones_slice, jones_slice, ant1_slice, ant2_slice,
+                            row_chunk)
+
+            # Update Step
+            mk = mk + alpha * z / (lam_p + u)
+            lam = info_update(lam_p, u, alpha)
+            
+            # Record Posterior values
+            m[k, :, nu:nu + 1] = gains_reshape(mk, chan_shape)
+            chan_vector_assign(P[k], 1.0/lam, nu, n_chan)
+
+    # Return Posterior states and covariance diagonals
+    return m, P
@@ -1,6 +1,8 @@
 import numpy as np
+from numba import jit
 from kalcal.tools.utils import gains_vector, gains_reshape, measure_vector,\
-                        state_ensemble, measure_noise, process_noise
+                        state_ensemble, measure_noise, process_noise,\
+                        ensemble_measure_vector
 from kalcal.tools.jacobian import compute_aug_csr
 
 
@@ -114,12 +116,7 @@ def sparse_algorithm(
         
         e = measure_noise(R)
 
-        Y = np.zeros((y.shape[0], Nsamples), dtype=np.complex128)
-        Mf = np.zeros_like(M)
-
-        for i in range(Nsamples):
-            Y[:, i] = y + e[:, i] 
-            jones_slice = gains_reshape(M[:, i], shape)
+        Y = y[:, None] + e
 
         Mf = M + K @ (Y - J @ M)
         
@@ -132,4 +129,215 @@ def sparse_algorithm(
     print()
 
     # Return Posterior states and covariances
-    return m
\ No newline at end of file
+    return m
+
+
+@jit(nopython=True, fastmath=True, nogil=True, cache=True)
+def _state_noise(std, Nsamples):
+    """Complex noise for an ensemble of stacked gains vectors,
+    with standard deviation `std` on the real and imaginary 
+    parts and the second half the conjugate of the first."""
+
+    axis_length = std.shape[0]//2
+    E = np.zeros((2 * axis_length, Nsamples), dtype=np.complex128)
+
+    for i in range(axis_length):
+        for j in range(Nsamples):
+            e = np.random.normal(0.0, std[i])\
+                    + 1.0j * np.random.normal(0.0, std[i])
+            E[i, j] = e
+            E[axis_length + i, j] = e.conjugate()
+
+    return E
+
+
+@jit(nopython=True, fastmath=True, nogil=True, cache=True)
+def _measure_noise(std, Nsamples, n_chan):
+    """Complex noise for an ensemble of stacked measurement
+    vectors, with standard deviation `std` on the real and 
+    imaginary parts and the lower rows of each channel the 
+    conjugate of the upper rows."""
+
+    n_bl = std.shape[0]//(2 * n_chan)
+    E = np.zeros((std.shape[0], Nsamples), dtype=np.complex128)
+
+    for nu in range(n_chan):
+        for b in range(n_bl):
+            row_upper = 2 * n_bl * nu + b
+            row_lower = row_upper + n_bl
+            for j in range(Nsamples):
+                e = np.random.normal(0.0, std[row_upper])\
+                        + 1.0j * np.random.normal(0.0, std[row_upper])
+                E[row_upper, j] = e
+                E[row_lower, j] = e.conjugate()
+
+    return E
+
+
+@jit(nopython=True, fastmath=True, nogil=True, cache=True)
+def _ensemble_gains(X, shape):
+    """Gains of each ensemble member, with shape (Nsamples, 
+    n_ant, n_chan, n_dir), from the first half of the stacked
+    gains vectors in the columns of `X`."""
+
+    n_ant, n_chan, n_dir, _ = shape
+    Nsamples = X.shape[1]
+    gains = np.zeros((Nsamples, n_ant, n_chan, n_dir), 
+                        dtype=np.complex128)
+
+    for j in range(Nsamples):
+        for a in range(n_ant):
+            for nu in range(n_chan):
+                for s in range(n_dir):
+                    row = a + n_ant * s + n_ant * n_dir * nu
+                    gains[j, a, nu, s] = X[row, j]
+
+    return gains
+
+
+@jit(nopython=True, fastmath=True, nogil=True, cache=True)
+def numba_algorithm(
+    mp           : np.ndarray, 
+    Pp           : np.ndarray, 
+    model        : np.ndarray, 
+    vis          : np.ndarray, 
+    weight       : np.ndarray, 
+    Q            : np.ndarray, 
+    R            : np.ndarray, 
+    ant1         : np.ndarray, 
+    ant2         : np.ndarray, 
+    tbin_indices : np.ndarray, 
+    tbin_counts  : np.ndarray,
+    Nsamples     : np.int32=10,
+    seed         : np.int64=-1): 
+
+    """Numba-compiled EnKF algorithm with diagonal `Pp`, `Q` and
+    `R` given as 1D arrays. The ensemble of `Nsamples` states is 
+    kept as the (low-rank) covariance factor, noise is sampled 
+    from the diagonals only and the update is solved in the 
+    ensemble space, so no matrix larger than the measurements by
+    `Nsamples` is formed. The update is derivative-free, using 
+    the visibilities predicted for every member rather than a 
+    jacobian. Returns the posterior states and the ensemble 
+    covariance diagonals. A non-negative `seed` seeds the 
+    random draws."""
+
+    # Seed random draws
+    if seed >= 0:
+        np.random.seed(seed)
+
+    # Time counts
+    n_time = len(tbin_indices)
+
+    # Number of Baselines
+    n_bl = model.shape[0]//n_time
+
+    # Number of Antennas
+    n_ant = int((np.sqrt(8*n_bl + 1) + 1))//2
+    
+    # Dimensions
+    n_chan, n_dir = model.shape[1], model.shape[2]
+
+    # Matrix-size
+    axis_length = n_ant * n_chan * n_dir
+
+    # Original matrix size    
+    gains_shape = (n_time, n_ant, n_chan, n_dir, 2)
+
+    # Jacobian shape
+    shape = gains_shape[1:]
+
+    # Covariance shape (diagonal only)
+    covs_shape = (n_time, 2*axis_length)
+
+    # State vectors
+    m = np.zeros(gains_shape, dtype=np.complex128)
+
+    # Covariance diagonals
+    P = np.zeros(covs_shape, dtype=np.float64)
+    
+    # Initial state and covariance
+    m[0] = gains_reshape(mp, shape)
+    P[0] = Pp.real
+
+    # Standard deviations and R^{-1} for diagonals
+    sqrtQ = np.sqrt(Q.real)
+    sqrtR = np.sqrt(R.real)
+    Rinv = 1.0/R.real
+
+    # Initial ensemble
+    X = _state_noise(np.sqrt(Pp.real), Nsamples)
+    for j in range(Nsamples):
+        X[:, j] += mp
+
+    # Ensemble-space identity
+    I = np.eye(Nsamples, dtype=np.complex128)
+
+    # Run Ensemble Kalman Filter with 
+    # low-rank ensemble covariance
+    print("==> Ensemble Kalman Filter (NUMBA|JIT): "\
+            + "filtering time-bins")
+    for k in range(1, n_time): 
+
+        # Predict Step
+        X = X + _state_noise(sqrtQ, Nsamples)
+
+        # Ensemble mean and scaled anomalies
+        mx = np.zeros(2 * axis_length, dtype=np.complex128)
+        for j in range(Nsamples):
+            mx += X[:, j]
+        mx /= Nsamples
+        A = np.zeros_like(X)
+        for j in range(Nsamples):
+            A[:, j] = (X[:, j] - mx)/np.sqrt(Nsamples - 1)
+
+        # Slice indices
+        start = tbin_indices[k - 1]
+        end = start + tbin_counts[k - 1]
+        
+        # Calculate Slices
+        row_slice = slice(start, end)
+        vis_slice = vis[row_slice]
+        model_slice = model[row_slice]
+        weight_slice = weight[row_slice]
+        ant1_slice = ant1[row_slice]
+        ant2_slice = ant2[row_slice]
+
+        # Calculate Measure Vector
+        y = measure_vector(vis_slice, weight_slice, 
+                            n_ant, n_chan)
+
+        # Predicted measurements of each member
+        Yp = ensemble_measure_vector(model_slice, weight_slice, 
+                    _ensemble_gains(X, shape), ant1_slice, 
+                    ant2_slice, n_ant, n_chan)
+
+        # Perturbed innovations and measurement anomalies
+        D = _measure_noise(sqrtR, Nsamples, n_chan) - Yp
+        my = np.zeros(Yp.shape[0], dtype=np.complex128)
+        for j in range(Nsamples):
+            D[:, j] += y
+            my += Yp[:, j]
+        my /= Nsamples
+        S = np.zeros_like(Yp)
+        for j in range(Nsamples):
+            S[:, j] = (Yp[:, j] - my)/np.sqrt(Nsamples - 1)
+
+        # Update Step, with K = A (I + S^H R^{-1} S)^{-1} S^H R^{-1}
+        SR = np.ascontiguousarray(S.conj().T)
+        for i in range(SR.shape[1]):
+            SR[:, i] *= Rinv[i]
+        W = np.linalg.solve(I + SR @ S, SR @ D)
+        X = X + A @ W
+
+        # Record Posterior values
+        mx = np.zeros(2 * axis_length, dtype=np.complex128)
+        for j in range(Nsamples):
+            mx += X[:, j]
+        mx /= Nsamples
+        m[k] = gains_reshape(mx, shape)
+        for j in range(Nsamples):
+            P[k] += np.abs(X[:, j] - mx)**2/(Nsamples - 1)
+
+    # Return Posterior states and covariance diagonals
+    return m, P
@@ -1,8 +1,11 @@
 import numpy as np
-from numba import jit, objmode
+from numba import jit, prange
 from kalcal.tools.utils import diag_mat_dot_mat, gains_vector, gains_reshape, measure_vector, progress_bar
-from kalcal.tools.jacobian import compute_aug_csr, compute_aug_np
-from kalcal.tools.sparseops import csr_dot_vec
+from kalcal.tools.utils import chan_vector, chan_vector_assign, cov_diagonal
+from kalcal.tools.utils import info_predict, info_update
+from kalcal.tools.jacobian import compute_aug_csr_pattern, update_aug_csr, compute_aug_np, chunked_jhj_jhr
+from kalcal.tools.jacobian import compute_residual_norm
+from kalcal.tools.sparseops import csr_dot_vec, chan_block_solve
 
 
 def sparse_algorithm(
@@ -22,7 +25,11 @@ def sparse_algorithm(
     alpha        : np.float64=0.5): 
 
     """Sparse-matrix implementation of Iterated-EKF algorithm. Not
-    numba-compiled."""
+    numba-compiled. The covariances `Pp`, `Q` and `R` are 
+    diagonal and can be given as matrices or 1D diagonals, 
+    with `P` returned in the same form as `Pp`. The update is 
+    solved in information form per channel, without inverting
+    any dense matrices."""
 
     # Time counts
     n_time = len(tbin_indices)
@@ -45,24 +52,29 @@ def sparse_algorithm(
     # Jacobian shape
     shape = gains_shape[1:]
 
-    # Covariance shape
-    covs_shape = (n_time, 2*axis_length, 2*axis_length)
+    # Return covariance matrices if given
+    full_cov = np.ndim(Pp) == 2
+
+    # Covariances as diagonals
+    Pp, Q, R = cov_diagonal(Pp), cov_diagonal(Q), cov_diagonal(R)
 
     # State vectors
     m = np.zeros(gains_shape, dtype=np.complex128)
 
-    # Covariance matrices
-    P = np.zeros(covs_shape, dtype=np.complex128)
+    # Covariance diagonals
+    P = np.zeros((n_time, 2*axis_length), dtype=np.float64)
     
     # Initial state and covariance
     m[0] = gains_reshape(mp, shape)
     P[0] = Pp
     
-    # Select CSR jacobian function 
-    aug_jac = compute_aug_csr
+    # CSR jacobian pattern and its baselines, built 
+    # once and refilled in-place at each iteration
+    J = None
+    J_ant1 = J_ant2 = None
     
     # Calculate R^{-1} for a diagonal
-    Rinv = np.diag(1.0/np.diag(R))
+    Rinv = 1.0/R
 
     # Run Iterated Extended Kalman Filter with 
     # Sparse matrices
@@ -91,12 +103,13 @@ def sparse_algorithm(
         # Current Iteration jones
         jones_slice = gains_reshape(mp, shape)                   
 
-        # Calculate Augmented Jacobian
-        J = aug_jac(model_slice, weight_slice, 
-                        jones_slice, ant1_slice, ant2_slice)       
-
-        # Hermitian of Jacobian
-        J_herm = J.conjugate().T
+        # Rebuild jacobian pattern if baselines changed
+        if J is None or not (np.array_equal(J_ant1, ant1_slice)
+                and np.array_equal(J_ant2, ant2_slice)):
+            J = compute_aug_csr_pattern(ant1_slice, ant2_slice, 
+                                        n_ant, n_chan, n_dir, 
+                                        model_slice.dtype)
+            J_ant1, J_ant2 = ant1_slice, ant2_slice
 
         # Calculate Measure Vector
         y = measure_vector(vis_slice, weight_slice, 
@@ -109,7 +122,7 @@ def sparse_algorithm(
         mn = mp
 
         # Inverse of Prior Covariance
-        Pinv = np.diag(1.0/np.diag(Pp)) 
+        Pinv = 1.0/Pp
 
         # Iteration counter
         i = 0
@@ -117,21 +130,16 @@ def sparse_algorithm(
         # State Estimation to reduce bias on 
         # estimation
         while i < maxiter: 
-            # Calculate Augmented Jacobian
-            J = aug_jac(model_slice, weight_slice, 
+            # Refill Augmented Jacobian in-place
+            J = update_aug_csr(J, model_slice, weight_slice, 
                             jones_slice, ant1_slice, ant2_slice)           
 
-            # Hermitian of Jacobian
-            J_herm = J.conjugate().T
-            
-            # Update Step
+            # Update Step, with K v = T^{-1} J^H R^{-1} v
             v = y - csr_dot_vec(J, mi)                 
-            Tinv = np.linalg.inv(Pinv + J_herm @ Rinv @ J)
-            Sinv = Rinv - Rinv @ J @ Tinv @ J_herm @ Rinv
-            K = Pp @ J_herm @ Sinv
+            Kv, Tinv = chan_block_solve(J, Pinv, Rinv, v, n_chan)
 
             # Next state update
-            mt = mn + alpha*(mi - mn + K @ v)            
+            mt = mn + alpha*(mi - mn + Kv)            
 
             # Stop if tolerance reached
             if np.mean(np.abs(mt - mn)) <= tol:
@@ -146,16 +154,20 @@ def sparse_algorithm(
 
         # Record Posterior values from last iterated state
         m[k] = gains_reshape(mt, shape)
-        P[k] = np.diag(np.diag(Pp - K @ J @ Pp).real)
+        P[k] = Tinv
 
     # Newline
     print()
 
+    # Covariance matrices, if given as matrices
+    if full_cov:
+        P = np.array([np.diag(p) for p in P], dtype=np.complex128)
+
     # Return Posterior states and covariances
     return m, P
 
 
-@jit(nopython=True, fastmath=True)
+@jit(nopython=True, fastmath=True, cache=True)
 def numba_algorithm(
     mp           : np.ndarray, 
     Pp           : np.ndarray, 
@@ -217,13 +229,10 @@ def numba_algorithm(
     
     # Run Extended Kalman Filter with 
     # Sparse matrices
-    head = "==> Iterated Extended Kalman Filter (NUMPY|JIT): "
+    print("==> Iterated Extended Kalman Filter (NUMPY|JIT): "\
+            + "filtering time-bins")
     for k in range(1, n_time): 
-        
-        # Progress Bar in object-mode
-        with objmode():
-            progress_bar(head, n_time, k)
-        
+                
         # Predict Step
         mp = gains_vector(m[k - 1])
         Pp = P[k - 1] + Q
@@ -295,8 +304,656 @@ def numba_algorithm(
         est_P = (1 - alpha) * p + alpha / (pinv + u)
         P[k] = np.diag(est_P.real)
 
-    # Newline
-    print()
-
     # Return Posterior states and covariances
-    return m, P
\ No newline at end of file
+    return m, P
+
+@jit(nopython=True, fastmath=True, nogil=True, parallel=True,
+        cache=True)
+def diag_algorithm(
+    mp           : np.ndarray, 
+    Pp           : np.ndarray, 
+    model        : np.ndarray, 
+    vis          : np.ndarray, 
+    weight       : np.ndarray, 
+    Q            : np.ndarray, 
+    R            : np.ndarray, 
+    ant1         : np.ndarray, 
+    ant2         : np.ndarray, 
+    tbin_indices : np.ndarray, 
+    tbin_counts  : np.ndarray,
+    alpha        : np.float64,
+    tol          : np.float64=1e-5,
+    maxiter      : np.int32=5):  
+
+    """Numpy-matrix implementation of Iterated-EKF algorithm with
+    diagonal-only covariance storage, i.e. `Pp`, `Q` and `R` 
+    are the diagonals of their matrices and `P` is returned 
+    with shape (n_time, 2N). The jacobian is block diagonal
+    over channels, so each channel is filtered independently 
+    and in parallel, with the tolerance checked per channel.
+    It is numba-compiled."""
+
+    # Time counts
+    n_time = len(tbin_indices)
+
+    # Number of Baselines
+    n_bl = model.shape[0]//n_time
+
+    # Number of Antennas
+    n_ant = int((np.sqrt(8*n_bl + 1) + 1)/2)
+
+    # Dimensions
+    n_chan, n_dir = model.shape[1], model.shape[2]
+
+    # Matrix-size
+    axis_length = n_ant * n_chan * n_dir
+
+    # Original matrix size    
+    gains_shape = (n_time, n_ant, n_chan, n_dir, 2)
+
+    # Jacobian shape
+    shape = gains_shape[1:]
+
+    # Single channel jacobian shape
+    chan_shape = (n_ant, 1, n_dir, 2)
+
+    # Covariance shape (diagonal only)
+    covs_shape = (n_time, 2*axis_length)
+
+    # State vectors
+    m = np.zeros(gains_shape, dtype=mp.dtype)
+
+    # Covariance diagonals
+    P = np.zeros(covs_shape, dtype=Pp.real.dtype)
+    
+    # Initial state and covariance
+    m[0] = gains_reshape(mp, shape)
+    P[0] = Pp.real
+    
+    # Select numpy jacobian function 
+    aug_jac = compute_aug_np
+    
+    # Run Iterated Extended Kalman Filter with 
+    # NUMPY matrices and diagonal covariances,
+    # per channel in parallel
+    print("==> Iterated Extended Kalman Filter (DIAG|JIT): "\
+            + "filtering channels in parallel")
+    for nu in prange(n_chan):
+
+        # Process noise for channel
+        q = chan_vector(Q.real, nu, n_chan).astype(np.float64)
+
+        for k in range(1, n_time): 
+        
+            # Predict Step
+            mk = gains_vector(m[k - 1, :, nu:nu + 1]).astype(np.complex128)
+            p = chan_vector(P[k - 1], nu, n_chan).astype(np.float64) + q
+
+            # Slice indices
+            start = tbin_indices[k - 1]
+            end = start + tbin_counts[k - 1]
+            
+            # Calculate Slices
+            row_slice = slice(start, end)
+            vis_slice = vis[row_slice, nu:nu + 1]
+            model_slice = model[row_slice, nu:nu + 1]
+            weight_slice = weight[row_slice]
+            ant1_slice = ant1[row_slice]
+            ant2_slice = ant2[row_slice]
+
+            # Current Iteration jones
+            jones_slice = gains_reshape(mk, chan_shape).astype(model.dtype)
+
+            # Calculate Measure Vector
+            y = measure_vector(vis_slice, weight_slice, 
+                                n_ant, 1)
+
+            # Initial state
+            mi = mk.copy()
+
+            # Current state
+            mn = mk
+
+            # Inverse of Prior Covariance
+            pinv = 1.0/p
+
+            # Next state and diagonal of JHJ
+            mt = mk.copy()
+            u = np.zeros_like(p)
+
+            # Iteration counter
+            i = 0
+
+            # State Estimation to reduce bias on 
+            # estimation
+            while i < maxiter:
+                # Calculate Augmented Jacobian (channel block)
+                J = aug_jac(model_slice, weight_slice, 
+                                jones_slice, ant1_slice, ant2_slice)           
+
+                # Hermitian of Jacobian
+                J_herm = J.conjugate().T
+                
+                # Update Step, with the jacobian products in the 
+                # precision of the jacobian and the update in double
+                v = y - J @ mi.astype(J.dtype)
+                u = np.sum(np.abs(J)**2, axis=0).astype(np.float64) # Diagonal of JHJ
+                z = J_herm @ v
+        
+                # Next state update
+                mt = mn + alpha * (mi - mn) + alpha * z / (pinv + u)
+
+                # Stop if tolerance reached
+                if np.mean(np.abs(mt - mn)) <= tol:
+                    break
+                
+                # Else iterate next step
+                i += 1
+                mn = mt
+
+                # Next Iteration jones           
+                jones_slice = gains_reshape(mn, chan_shape).astype(model.dtype)
+
+            # Record Posterior values
+            m[k, :, nu:nu + 1] = gains_reshape(mt, chan_shape)
+            chan_vector_assign(P[k], (1 - alpha) * p + alpha / (pinv + u), 
+                                nu, n_chan)
+
+    # Return Posterior states and covariance diagonals
+    return m, P
+
+
+@jit(nopython=True, fastmath=True, nogil=True, parallel=True,
+        cache=True)
+def mfree_algorithm(
+    mp           : np.ndarray, 
+    Pp           : np.ndarray, 
+    model        : np.ndarray, 
+    vis          : np.ndarray, 
+    weight       : np.ndarray, 
+    Q            : np.ndarray, 
+    R            : np.ndarray, 
+    ant1         : np.ndarray, 
+    ant2         : np.ndarray, 
+    tbin_indices : np.ndarray, 
+    tbin_counts  : np.ndarray,
+    alpha        : np.float64,
+    tol          : np.float64=1e-5,
+    maxiter      : np.int32=5,
+    row_chunk    : np.int32=0):  
+
+    """Matrix-free implementation of Iterated-EKF algorithm with
+    diagonal-only covariance storage. The diagonal of JHJ and JHr 
+    are computed directly from the data at each iteration, so the
+    jacobian is never built. The sums over a time-bin are taken 
+    over `row_chunk` rows at a time (all at once if 0). Each 
+    channel is filtered independently and in parallel, with the
+    tolerance checked per channel. It is numba-compiled."""
+
+    # Time counts
+    n_time = len(tbin_indices)
+
+    # Number of Baselines
+    n_bl = model.shape[0]//n_time
+
+    # Number of Antennas
+    n_ant = int((np.sqrt(8*n_bl + 1) + 1)/2)
+
+    # Dimensions
+    n_chan, n_dir = model.shape[1], model.shape[2]
+
+    # Matrix-size
+    axis_length = n_ant * n_chan * n_dir
+
+    # Original matrix size    
+    gains_shape = (n_time, n_ant, n_chan, n_dir, 2)
+
+    # Jacobian shape
+    shape = gains_shape[1:]
+
+    # Single channel jacobian shape
+    chan_shape = (n_ant, 1, n_dir, 2)
+
+    # Covariance shape (diagonal only)
+    covs_shape = (n_time, 2*axis_length)
+
+    # State vectors
+    m = np.zeros(gains_shape, dtype=mp.dtype)
+
+    # Covariance diagonals
+    P = np.zeros(covs_shape, dtype=Pp.real.dtype)
+    
+    # Initial state and covariance
+    m[0] = gains_reshape(mp, shape)
+    P[0] = Pp.real
+    
+    # Run Iterated Extended Kalman Filter without
+    # building the jacobian, per channel in parallel
+    print("==> Iterated Extended Kalman Filter (MFREE|JIT): "\
+            + "filtering channels in parallel")
+    for nu in prange(n_chan):
+
+        # Process noise for channel
+        q = chan_vector(Q.real, nu, n_chan).astype(np.float64)
+
+        for k in range(1, n_time): 
+        
+            # Predict Step
+            mk = gains_vector(m[k - 1, :, nu:nu + 1]).astype(np.complex128)
+            p = chan_vector(P[k - 1], nu, n_chan).astype(np.float64) + q
+
+            # Slice indices
+            start = tbin_indices[k - 1]
+            end = start + tbin_counts[k - 1]
+            
+            # Calculate Slices
+            row_slice = slice(start, end)
+            vis_slice = vis[row_slice, nu:nu + 1]
+            model_slice = model[row_slice, nu:nu + 1]
+            weight_slice = weight[row_slice]
+            ant1_slice = ant1[row_slice]
+            ant2_slice = ant2[row_slice]
+
+            # Prior and current iteration jones
+            prior_slice = m[k - 1, :, nu:nu + 1]
+            jones_slice = gains_reshape(mk, chan_shape).astype(model.dtype)
+
+            # Initial state
+            mi = mk.copy()
+
+            # Current state
+            mn = mk
+
+            # Inverse of Prior Covariance
+            pinv = 1.0/p
+
+            # Next state and diagonal of JHJ
+            mt = mk.copy()
+            u = np.zeros_like(p)
+
+            # Iteration counter
+            i = 0
+
+            # State Estimation to reduce bias on 
+            # estimation
+            while i < maxiter:
+                # Diagonal of JHJ and JHr, with residual 
+                # taken at the prior state
+                u, z = chunked_jhj_jhr(model_slice, weight_slice, vis_slice,
+                            jones_slice, prior_slice, ant1_slice, ant2_slice,
+                            row_chunk)
+        
+                # Next state update
+                mt = mn + alpha * (mi - mn) + alpha * z / (pinv + u)
+
+                # Stop if tolerance reached
+                if np.mean(np.abs(mt - mn)) <= tol:
+                    break
+                
+                # Else iterate next step
+                i += 1
+                mn = mt
+
+                # Next Iteration jones           
+                jones_slice = gains_reshape(mn, chan_shape).astype(model.dtype)
+
+            # Record Posterior values
+            m[k, :, nu:nu + 1] = gains_reshape(mt, chan_shape)
+            chan_vector_assign(P[k], (1 - alpha) * p + alpha / (pinv + u), 
+                                nu, n_chan)
+
+    # Return Posterior states and covariance diagonals
+    return m, P
+
+
+@jit(nopython=True, fastmath=True, nogil=True, parallel=True,
+        cache=True)
+def info_algorithm(
+    mp           : np.ndarray, 
+    Pp           : np.ndarray, 
+    model        : np.ndarray, 
+    vis          : np.ndarray, 
+    weight       : np.ndarray, 
+    Q            : np.ndarray, 
+    R            : np.ndarray, 
+    ant1         : np.ndarray, 
+    ant2         : np.ndarray, 
+    tbin_indices : np.ndarray, 
+    tbin_counts  : np.ndarray,
+    alpha        : np.float64,
+    tol          : np.float64=1e-5,
+    maxiter      : np.int32=5,
+    row_chunk    : np.int32=0):  
+
+    """Information-form implementation of the matrix-free 
+    Iterated-EKF algorithm. The inverse of the covariance 
+    diagonal is carried between time-bins instead of the 
+    covariance and is only inverted when recording `P`. The 
+    diagonal of JHJ and JHr of a time-bin are accumulated over
+    `row_chunk` rows at a time (all at once if 0). Each channel
+    is filtered independently and in parallel, with the 
+    tolerance checked per channel. It is numba-compiled."""
+
+    # Time counts
+    n_time = len(tbin_indices)
+
+    # Number of Baselines
+    n_bl = model.shape[0]//n_time
+
+    # Number of Antennas
+    n_ant = int((np.sqrt(8*n_bl + 1) + 1)/2)
+
+    # Dimensions
+    n_chan, n_dir = model.shape[1], model.shape[2]
+
+    # Matrix-size
+    axis_length = n_ant * n_chan * n_dir
+
+    # Original matrix size    
+    gains_shape = (n_time, n_ant, n_chan, n_dir, 2)
+
+    # Jacobian shape
+    shape = gains_shape[1:]
+
+    # Single channel jacobian shape
+    chan_shape = (n_ant, 1, n_dir, 2)
+
+    # Covariance shape (diagonal only)
+    covs_shape = (n_time, 2*axis_length)
+
+    # State vectors
+    m = np.zeros(gains_shape, dtype=mp.dtype)
+
+    # Covariance diagonals
+    P = np.zeros(covs_shape, dtype=Pp.real.dtype)
+    
+    # Initial state and covariance
+    m[0] = gains_reshape(mp, shape)
+    P[0] = Pp.real
+    
+    # Run Iterated Extended Kalman Filter in 
+    # information form, per channel in parallel
+    print("==> Iterated Extended Kalman Filter (INFO|JIT): "\
+            + "filtering channels in parallel")
+    for nu in prange(n_chan):
+
+        # Prior state, information and process noise for channel
+        mk = chan_vector(mp, nu, n_chan).astype(np.complex128)
+        lam = 1.0/chan_vector(Pp.real, nu, n_chan).astype(np.float64)
+        q = chan_vector(Q.real, nu, n_chan).astype(np.float64)
+
+        for k in range(1, n_time): 
+        
+            # Predict Step
+            lam_p = info_predict(lam, q)
+
+            # Slice indices
+            start = tbin_indices[k - 1]
+            end = start + tbin_counts[k - 1]
+            
+            # Calculate Slices
+            row_slice = slice(start, end)
+            vis_slice = vis[row_slice, nu:nu + 1]
+            model_slice = model[row_slice, nu:nu + 1]
+            weight_slice = weight[row_slice]
+            ant1_slice = ant1[row_slice]
+            ant2_slice = ant2[row_slice]
+
+            # Prior and current iteration jones
+            prior_slice = gains_reshape(mk, chan_shape).astype(model.dtype)
+            jones_slice = prior_slice
+
+            # Initial state
+            mi = mk.copy()
+
+            # Current state
+            mn = mk
+
+            # Next state and diagonal of JHJ
+            mt = mk.copy()
+            u = np.zeros_like(lam_p)
+
+            # Iteration counter
+            i = 0
+
+            # State Estimation to reduce bias on 
+            # estimation
+            while i < maxiter:
+                # Diagonal of JHJ and JHr, with residual 
+                # taken at the prior state
+                u, z = chunked_jhj_jhr(model_slice, weight_slice, vis_slice,
+                            jones_slice, prior_slice, ant1_slice, ant2_slice,
+                            row_chunk)
+        
+                # Next state update
+                mt = mn + alpha * (mi - mn) + alpha * z / (lam_p + u)
+
+                # Stop if tolerance reached
+                if np.mean(np.abs(mt - mn)) <= tol:
+                    break
+                
+                # Else iterate next step
+                i += 1
+                mn = mt
+
+                # Next Iteration jones           
+                jones_slice = gains_reshape(mn, chan_shape).astype(model.dtype)
+
+            # Record Posterior values
+            mk = mt
+            lam = info_update(lam_p, u, alpha)
+            m[k, :, nu:nu + 1] = gains_reshape(mk, chan_shape)
+            chan_vector_assign(P[k], 1.0/lam, nu, n_chan)
+
+    # Return Posterior states and covariance diagonals
+    return m, P
+
+
+@jit(nopython=True, fastmath=True, nogil=True, parallel=True,
+        cache=True)
+def adaptive_algorithm(
+    mp           : np.ndarray, 
+    Pp           : np.ndarray, 
+    model        : np.ndarray, 
+    vis          : np.ndarray, 
+    weight       : np.ndarray, 
+    Q            : np.ndarray, 
+    R            : np.ndarray, 
+    ant1         : np.ndarray, 
+    ant2         : np.ndarray, 
+    tbin_indices : np.ndarray, 
+    tbin_counts  : np.ndarray,
+    alpha        : np.float64,
+    tol          : np.float64=1e-5,
+    maxiter      : np.int32=5,
+    row_chunk    : np.int32=0,
+    reuse_tol    : np.float64=0.0,
+    damping      : np.float64=0.0):  
+
+    """Information-form, matrix-free Iterated-EKF algorithm (see 
+    `info_algorithm`) with adaptive iteration control:
+
+    - Each direction of each channel stops iterating (and is held
+      fixed) once its mean absolute change is within `tol`.
+    - The diagonal of JHJ and JHr are reused, instead of computed
+      again, after an iteration that changed the state by less 
+      than `reuse_tol` (maximum absolute change).
+    - With `damping` of 0, Gauss-Newton steps are taken. Otherwise
+      Levenberg steps are taken, starting from this damping, which
+      is increased on steps that increase the residual (which are
+      rejected) and decreased on steps that do not.
+
+    Returns the posterior states and covariance diagonals, the 
+    iterations done per time-bin, channel and direction, with 
+    shape (n_time, n_chan, n_dir), and the norm of the weighted
+    residual of each posterior state per time-bin and channel, 
+    with shape (n_time, n_chan). The prior (index 0) has no 
+    iterations or residual."""
+
+    # Time counts
+    n_time = len(tbin_indices)
+
+    # Number of Baselines
+    n_bl = model.shape[0]//n_time
+
+    # Number of Antennas
+    n_ant = int((np.sqrt(8*n_bl + 1) + 1)/2)
+
+    # Dimensions
+    n_chan, n_dir = model.shape[1], model.shape[2]
+
+    # Matrix-size
+    axis_length = n_ant * n_chan * n_dir
+
+    # Original matrix size    
+    gains_shape = (n_time, n_ant, n_chan, n_dir, 2)
+
+    # Jacobian shape
+    shape = gains_shape[1:]
+
+    # Single channel jacobian shape
+    chan_shape = (n_ant, 1, n_dir, 2)
+
+    # Single channel state size
+    chan_length = n_ant * n_dir
+
+    # Covariance shape (diagonal only)
+    covs_shape = (n_time, 2*axis_length)
+
+    # State vectors
+    m = np.zeros(gains_shape, dtype=mp.dtype)
+
+    # Covariance diagonals
+    P = np.zeros(covs_shape, dtype=Pp.real.dtype)
+
+    # Iteration counts and residual norms
+    iters = np.zeros((n_time, n_chan, n_dir), dtype=np.int32)
+    resid = np.zeros((n_time, n_chan), dtype=np.float64)
+    
+    # Initial state and covariance
+    m[0] = gains_reshape(mp, shape)
+    P[0] = Pp.real
+    
+    # Run Iterated Extended Kalman Filter with adaptive
+    # iterations, per channel in parallel
+    print("==> Iterated Extended Kalman Filter (ADAPTIVE|JIT): "\
+            + "filtering channels in parallel")
+    for nu in prange(n_chan):
+
+        # Prior state, information and process noise for channel
+        mk = chan_vector(mp, nu, n_chan).astype(np.complex128)
+        lam = 1.0/chan_vector(Pp.real, nu, n_chan).astype(np.float64)
+        q = chan_vector(Q.real, nu, n_chan).astype(np.float64)
+
+        for k in range(1, n_time): 
+        
+            # Predict Step
+            lam_p = info_predict(lam, q)
+
+            # Slice indices
+            start = tbin_indices[k - 1]
+            end = start + tbin_counts[k - 1]
+            
+            # Calculate Slices
+            row_slice = slice(start, end)
+            vis_slice = vis[row_slice, nu:nu + 1]
+            model_slice = model[row_slice, nu:nu + 1]
+            weight_slice = weight[row_slice]
+            ant1_slice = ant1[row_slice]
+            ant2_slice = ant2[row_slice]
+
+            # Prior and current iteration jones
+            prior_slice = gains_reshape(mk, chan_shape).astype(model.dtype)
+            jones_slice = prior_slice
+
+            # Initial state
+            mi = mk.copy()
+
+            # Current state and its residual
+            mn = mk
+            rn = compute_residual_norm(model_slice, weight_slice, 
+                        vis_slice, jones_slice, ant1_slice, ant2_slice)
+
+            # Diagonal of JHJ and JHr
+            u = np.zeros_like(lam_p)
+            z = np.zeros_like(mk)
+
+            # Directions still iterating, damping and 
+            # whether to reuse the last JHJ and JHr
+            active = np.ones(n_dir, dtype=np.bool_)
+            mu = damping
+            reuse = False
+
+            # Iteration counter
+            i = 0
+
+            # State Estimation to reduce bias on 
+            # estimation
+            while i < maxiter:
+                # Diagonal of JHJ and JHr, with residual 
+                # taken at the prior state
+                if not reuse:
+                    u, z = chunked_jhj_jhr(model_slice, weight_slice, 
+                                vis_slice, jones_slice, prior_slice, 
+                                ant1_slice, ant2_slice, row_chunk)
+        
+                # Next state update (damped if Levenberg)
+                mt = mn + alpha * (mi - mn)\
+                        + alpha * z / (lam_p + (1.0 + mu) * u)
+
+                # Hold converged directions fixed
+                for s in range(n_dir):
+                    if active[s]:
+                        iters[k, nu, s] += 1
+                    else:
+                        for a in range(n_ant):
+                            j = a + n_ant * s
+                            mt[j] = mn[j]
+                            mt[chan_length + j] = mn[chan_length + j]
+
+                i += 1
+                next_slice = gains_reshape(mt, chan_shape).astype(model.dtype)
+
+                # Levenberg, reject steps that increase the residual
+                if damping > 0.0:
+                    rt = compute_residual_norm(model_slice, weight_slice, 
+                            vis_slice, next_slice, ant1_slice, ant2_slice)
+                    if rt > rn:
+                        mu *= 10.0
+                        reuse = True
+                        continue
+                    mu /= 10.0
+                    rn = rt
+
+                # Stop directions within tolerance
+                for s in range(n_dir):
+                    change = 0.0
+                    for a in range(n_ant):
+                        j = a + n_ant * s
+                        change += np.abs(mt[j] - mn[j])\
+                                    + np.abs(mt[chan_length + j]\
+                                        - mn[chan_length + j])
+                    if change / (2 * n_ant) <= tol:
+                        active[s] = False
+
+                # Reuse JHJ and JHr after a small change
+                reuse = np.max(np.abs(mt - mn)) < reuse_tol
+                
+                # Next iteration
+                mn = mt
+                jones_slice = next_slice
+
+                # Stop if all directions converged
+                if not active.any():
+                    break
+
+            # Record Posterior values
+            mk = mn
+            lam = info_update(lam_p, u, alpha)
+            m[k, :, nu:nu + 1] = gains_reshape(mk, chan_shape)
+            chan_vector_assign(P[k], 1.0/lam, nu, n_chan)
+            resid[k, nu] = compute_residual_norm(model_slice, weight_slice,
+                        vis_slice, jones_slice, ant1_slice, ant2_slice)
+
+    # Return Posterior states, covariance diagonals and telemetry
+    return m, P, iters, resid
@@ -1,9 +1,9 @@
 import numpy as np
-from numba import njit, objmode
-from kalcal.tools.utils import gains_vector, gains_reshape, progress_bar
+from numba import njit, prange, get_num_threads
+from kalcal.tools.utils import gains_vector, gains_reshape
 
 
-@njit(fastmath=True, nogil=True)
+@njit(fastmath=True, nogil=True, cache=True)
 def numba_algorithm(
     m : np.ndarray, 
     P : np.ndarray, 
@@ -28,13 +28,10 @@ def numba_algorithm(
 
     # Run Extended Kalman Smoother with
     # Numpy matrices
-    head = "==> Extended Kalman Smoother (NUMPY|JIT): "
+    print("==> Extended Kalman Smoother (NUMPY|JIT): "\
+            + "smoothing time-bins")
     for k in range(-2, -(n_time + 1), -1):   
          
-        # Progress Bar in object-mode
-        with objmode():
-            progress_bar(head, n_time, -k - 1)
-
         # Predict Step
         mp = gains_vector(m[k])
         Pt = P[k].astype(np.complex128)
@@ -52,8 +49,168 @@ def numba_algorithm(
 
         G_values[k] = G.real
 
-    # Newline
-    print()
-
     # Return Posterior smooth states and covariances
-    return ms, Ps, G_values
\ No newline at end of file
+    return ms, Ps, G_values
+
+@njit(fastmath=True, nogil=True, cache=True, parallel=True)
+def diag_algorithm(
+    m : np.ndarray, 
+    P : np.ndarray, 
+    Q : np.ndarray):
+
+    """Extended Kalman Smoother with diagonal-only covariance
+    storage, i.e. `P` has shape (n_time, 2N) and `Q` is the
+    diagonal of the process noise. The smoother gains are 
+    returned in the same diagonal form. Each channel is 
+    smoothed independently and in parallel."""
+
+    # State dimensions
+    n_time, n_ant, n_chan, n_dir, n_aug = m.shape
+
+    # Matrix-size
+    axis_length = n_ant * n_chan * n_dir
+
+    # Smooth State Vectors
+    ms = np.zeros_like(m)
+
+    # Smooth Covariance diagonals
+    Ps = np.zeros_like(P)
+    G_values = np.zeros_like(P)
+
+    # Set Initial Smooth Values
+    ms[-1] = m[-1]
+    Ps[-1] = P[-1]
+
+    # Run Extended Kalman Smoother with
+    # diagonal covariances, per channel in parallel
+    print("==> Extended Kalman Smoother (DIAG|JIT): "\
+            + "smoothing channels in parallel")
+    for nu in prange(n_chan):
+        for k in range(n_time - 2, -1, -1):
+            for s in range(n_dir):
+                for a in range(n_ant):
+                    for i in range(n_aug):
+                        # Index in stacked gains vector
+                        j = a + n_ant * s + n_ant * n_dir * nu\
+                                + i * axis_length
+
+                        # Predict Step (in double precision)
+                        Pt = np.float64(P[k, j])
+                        Pp = Pt + np.float64(Q[j].real)
+
+                        # Smooth Step
+                        G = Pt / Pp
+
+                        # Record Posterior Smooth Values
+                        e = ms[k + 1, a, nu, s, i] - m[k, a, nu, s, i]
+                        E = Ps[k + 1, j] - Pp
+                        ms[k, a, nu, s, i] = m[k, a, nu, s, i] + G * e
+                        Ps[k, j] = Pt + G * E * G
+
+                        G_values[k, j] = G
+
+    # Return Posterior smooth states and covariance diagonals
+    return ms, Ps, G_values
+
+
+def scan_algorithm(
+    m : np.ndarray, 
+    P : np.ndarray, 
+    Q : np.ndarray):
+
+    """Extended Kalman Smoother with diagonal-only covariance
+    storage, as in `diag_algorithm`, but parallel in time. Each
+    smoother step is an affine map of the next smoothed values,
+    so the maps over chunks of time are composed in parallel, 
+    the values at the chunk boundaries are found serially, and
+    each chunk is then smoothed in parallel (a chunked scan)."""
+
+    # One chunk of time per thread
+    return _scan_algorithm(m, P, Q, get_num_threads())
+
+
+@njit(fastmath=True, nogil=True, cache=True, parallel=True)
+def _scan_algorithm(
+    m         : np.ndarray, 
+    P         : np.ndarray, 
+    Q         : np.ndarray,
+    n_threads : np.int64):
+
+    # State dimensions
+    n_time = m.shape[0]
+
+    # Original State Shape
+    gains_shape = m.shape[1:]
+
+    # Stacked state size
+    n_state = P.shape[1]
+
+    # Stacked filter states and process noise
+    mv = np.zeros((n_time, n_state), dtype=np.complex128)
+    for k in prange(n_time):
+        mv[k] = gains_vector(m[k])
+    q = Q.real.astype(np.float64)
+
+    # Smoother gains (do not depend on smoothed values)
+    G = np.zeros((n_time, n_state), dtype=np.float64)
+    for k in prange(n_time - 1):
+        G[k] = P[k] / (P[k] + q)
+
+    # Chunks of time steps, one per thread
+    n_steps = n_time - 1
+    n_chunks = min(n_threads, n_steps)
+    bounds = np.linspace(0, n_steps, n_chunks + 1).astype(np.int64)
+
+    # Affine maps, x[start] = A + B * x[end], for each chunk
+    A_m = np.zeros((n_chunks, n_state), dtype=np.complex128)
+    B_m = np.ones((n_chunks, n_state), dtype=np.float64)
+    A_P = np.zeros((n_chunks, n_state), dtype=np.float64)
+    B_P = np.ones((n_chunks, n_state), dtype=np.float64)
+
+    # Compose maps over each chunk in parallel
+    for c in prange(n_chunks):
+        for k in range(bounds[c + 1] - 1, bounds[c] - 1, -1):
+            Pt = P[k].astype(np.float64)
+            Pp = Pt + q
+            G2 = G[k] * G[k]
+            A_m[c] = (1 - G[k]) * mv[k] + G[k] * A_m[c]
+            B_m[c] = G[k] * B_m[c]
+            A_P[c] = Pt - G2 * Pp + G2 * A_P[c]
+            B_P[c] = G2 * B_P[c]
+
+    # Smooth State Vectors and Covariance diagonals
+    msv = np.zeros((n_time, n_state), dtype=np.complex128)
+    Psv = np.zeros((n_time, n_state), dtype=np.float64)
+
+    # Set Initial Smooth Values
+    msv[-1] = mv[-1]
+    Psv[-1] = P[-1]
+
+    # Values at the start of each chunk, serially
+    for c in range(n_chunks - 1, -1, -1):
+        msv[bounds[c]] = A_m[c] + B_m[c] * msv[bounds[c + 1]]
+        Psv[bounds[c]] = A_P[c] + B_P[c] * Psv[bounds[c + 1]]
+
+    # Run Extended Kalman Smoother within each 
+    # chunk, from its known end, in parallel
+    print("==> Extended Kalman Smoother (SCAN|JIT): "\
+            + "smoothing time chunks in parallel")
+    for c in prange(n_chunks):
+        for k in range(bounds[c + 1] - 1, bounds[c], -1):
+            # Predict Step
+            Pt = P[k].astype(np.float64)
+            Pp = Pt + q
+
+            # Record Posterior Smooth Values
+            msv[k] = mv[k] + G[k] * (msv[k + 1] - mv[k])
+            Psv[k] = Pt + G[k] * (Psv[k + 1] - Pp) * G[k]
+
+    # Back to original shapes and precision
+    ms = np.zeros_like(m)
+    for k in prange(n_time):
+        ms[k] = gains_reshape(msv[k], gains_shape)
+    Ps = Psv.astype(P.dtype)
+    G_values = G.astype(P.dtype)
+
+    # Return Posterior smooth states and covariance diagonals
+    return ms, Ps, G_values
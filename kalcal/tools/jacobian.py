@@ -1,10 +1,9 @@
-from dask.optimization import inline
 import numpy as np
 from scipy import sparse
 from numba import njit
 
 
-@njit(parallel=False, fastmath=True, nogil=True)
+@njit(parallel=False, fastmath=True, nogil=True, cache=True)
 def _construct_coo_lists(
     model : np.ndarray, 
     weight : np.ndarray, 
@@ -21,7 +20,7 @@ def _construct_coo_lists(
     # COO lists
     rows = np.zeros(n_terms, dtype=np.int32)
     cols = np.zeros(n_terms, dtype=np.int32)
-    data = np.zeros(n_terms, dtype=np.complex128)
+    data = np.zeros(n_terms, dtype=model.dtype)
 
     # Populate lists
     for s in range(n_dir):
@@ -118,7 +117,7 @@ def compute_aug_coo(
     J = 1/2*sparse.hstack((J_lhs, J_rhs))
 
     # Return jacobian
-    return J.astype(np.complex128)
+    return J.astype(model.dtype)
     
 
 
@@ -131,10 +130,140 @@ def compute_aug_csr(
     ):
     
     return compute_aug_coo(model, weight, aug_jones, 
-            antenna1, antenna2).tocsr().astype(np.complex128)
+            antenna1, antenna2).tocsr().astype(model.dtype)
 
 
-@njit(fastmath=True, nogil=True, inline="always")
+@njit(fastmath=True, nogil=True, cache=True)
+def _aug_csr_indices(
+    antenna1 : np.ndarray, 
+    antenna2 : np.ndarray,
+    n_ant : np.int32,
+    n_chan : np.int32,
+    n_dir : np.int32
+    ):
+
+    # Dimensions
+    n_row = antenna1.shape[0]
+    axis_length = n_ant * n_chan * n_dir
+    n_rows = n_chan * n_ant * (n_ant - 1)
+
+    # Each populated row holds n_dir entries per half
+    indptr = np.zeros(n_rows + 1, dtype=np.int32)
+    for row in range(n_row):
+        for nu in range(n_chan):
+            r1 = 2 * n_row * nu + row
+            r2 = r1 + n_row
+            indptr[r1 + 1] = 2 * n_dir
+            indptr[r2 + 1] = 2 * n_dir
+    indptr = np.cumsum(indptr).astype(np.int32)
+
+    # Column indices, sorted per row
+    indices = np.zeros(indptr[-1], dtype=np.int32)
+    for row in range(n_row):
+        # Antenna pairings
+        p = antenna1[row]
+        q = antenna2[row]
+
+        for nu in range(n_chan):
+            # Row Indices
+            r1 = 2 * n_row * nu + row
+            r2 = r1 + n_row
+
+            for s in range(n_dir):
+                # Column Indices
+                c1 = n_ant * n_dir * nu + n_ant * s + p
+                c2 = n_ant * n_dir * nu + n_ant * s + q
+
+                indices[indptr[r1] + s] = c1
+                indices[indptr[r1] + n_dir + s] = axis_length + c2
+                indices[indptr[r2] + s] = c2
+                indices[indptr[r2] + n_dir + s] = axis_length + c1
+
+    return indptr, indices
+
+
+@njit(fastmath=True, nogil=True, cache=True)
+def _fill_aug_csr(
+    data : np.ndarray,
+    indptr : np.ndarray,
+    model : np.ndarray, 
+    weight : np.ndarray, 
+    aug_jones : np.ndarray,
+    antenna1 : np.ndarray, 
+    antenna2 : np.ndarray    
+    ):
+
+    # Dimensions
+    n_ant, n_chan, n_dir, _ = aug_jones.shape
+    n_row = model.shape[0]
+
+    for row in range(n_row):
+        # Antenna pairings
+        p = antenna1[row]
+        q = antenna2[row]
+
+        # Square-root of weight
+        sqrtW = np.sqrt(weight[row])
+
+        for nu in range(n_chan):
+            # Row Indices
+            r1 = 2 * n_row * nu + row
+            r2 = r1 + n_row
+
+            for s in range(n_dir):
+                lhs_p, lhs_q, rhs_q, rhs_p = _aug_jac_terms(
+                    sqrtW, model[row, nu, s], aug_jones, p, q, nu, s)
+
+                data[indptr[r1] + s] = lhs_p
+                data[indptr[r1] + n_dir + s] = rhs_q
+                data[indptr[r2] + s] = lhs_q
+                data[indptr[r2] + n_dir + s] = rhs_p
+
+
+def compute_aug_csr_pattern(
+    antenna1 : np.ndarray, 
+    antenna2 : np.ndarray,
+    n_ant : np.int32,
+    n_chan : np.int32,
+    n_dir : np.int32,
+    dtype=np.complex128
+    ):
+
+    """Empty augmented jacobian in CSR format for the baselines
+    in `antenna1` and `antenna2`, with entries of `dtype`. The 
+    sparsity pattern only depends on the baselines, channels and 
+    directions, so it is built once and then refilled with 
+    `update_aug_csr`."""
+
+    indptr, indices = _aug_csr_indices(antenna1, antenna2, 
+                                        n_ant, n_chan, n_dir)
+    data = np.zeros(indices.shape[0], dtype=dtype)
+    jac_shape = (n_chan * n_ant * (n_ant - 1),
+                    2 * n_chan * n_dir * n_ant)
+
+    return sparse.csr_matrix((data, indices, indptr), shape=jac_shape)
+
+
+def update_aug_csr(
+    J : sparse.csr_matrix,
+    model : np.ndarray, 
+    weight : np.ndarray, 
+    aug_jones : np.ndarray,
+    antenna1 : np.ndarray, 
+    antenna2 : np.ndarray    
+    ):
+
+    """Refill the data of the augmented jacobian `J`, from 
+    `compute_aug_csr_pattern` with the same baselines, in-place 
+    and return it. Gives the same matrix as `compute_aug_csr`."""
+
+    _fill_aug_csr(J.data, J.indptr, model, weight, aug_jones,
+                    antenna1, antenna2)
+
+    return J
+
+
+@njit(fastmath=True, nogil=True, cache=True, inline="always")
 def _build_np_matrix(
     model : np.ndarray, 
     weight : np.ndarray, 
@@ -149,8 +278,8 @@ def _build_np_matrix(
     jac_shape = (n_chan * n_ant * (n_ant - 1),
                     n_chan * n_dir * n_ant)
 
-    # Empty Jacobian
-    jacobian = np.zeros(jac_shape, dtype=np.complex128)
+    # Empty Jacobian, in the precision of the model
+    jacobian = np.zeros(jac_shape, dtype=model.dtype)
 
     # Populate lists
     for row in range(n_row):
@@ -183,7 +312,7 @@ def _build_np_matrix(
     return jacobian
 
 
-@njit(fastmath=True, nogil=True, inline="always")
+@njit(fastmath=True, nogil=True, cache=True, inline="always")
 def compute_aug_np(
     model : np.ndarray, 
     weight : np.ndarray, 
@@ -201,8 +330,314 @@ def compute_aug_np(
     J_rhs = _build_np_matrix(model, weight, aug_jones[:, :, :, 1], 
                                 antenna2, antenna1)
 
-    # Horizontal stack halves
-    J = 1/2*np.hstack((J_lhs, J_rhs))
+    # Horizontal stack halves, halved in-place 
+    # to keep the precision of the model
+    J = np.hstack((J_lhs, J_rhs))
+    J *= 0.5
 
     # Return jacobian
-    return J
\ No newline at end of file
+    return J
+
+@njit(fastmath=True, nogil=True, cache=True, inline="always")
+def _aug_jac_terms(
+    sqrtW : np.complex128,
+    Xpq : np.complex128,
+    aug_jones : np.ndarray,
+    p : np.int32,
+    q : np.int32,
+    nu : np.int32,
+    s : np.int32
+    ):
+
+    """Non-zero entries of the augmented jacobian for a single
+    baseline (p, q), channel and direction. Returns the entries 
+    (upper row, column p), (lower row, column q) of the left 
+    half and (upper row, column q), (lower row, column p) of
+    the right half, in the precision of `aug_jones`."""
+
+    # Half, as the real type of the jones, since a float64 
+    # literal would promote single precision terms to double
+    half = aug_jones.real.dtype.type(0.5)
+
+    # Left half
+    lhs_p = half * sqrtW * Xpq * aug_jones[q, nu, s, 0].conjugate()
+    lhs_q = half * sqrtW * Xpq.conjugate()\
+                * aug_jones[p, nu, s, 0].conjugate()
+
+    # Right half
+    rhs_q = half * sqrtW * Xpq * aug_jones[p, nu, s, 1].conjugate()
+    rhs_p = half * sqrtW * Xpq.conjugate()\
+                * aug_jones[q, nu, s, 1].conjugate()
+
+    return lhs_p, lhs_q, rhs_q, rhs_p
+
+
+@njit(fastmath=True, nogil=True, cache=True)
+def compute_jhj_diag(
+    model : np.ndarray, 
+    weight : np.ndarray, 
+    aug_jones : np.ndarray,
+    antenna1 : np.ndarray, 
+    antenna2 : np.ndarray    
+    ):
+
+    """Diagonal of J^H J for the augmented jacobian at `aug_jones`,
+    computed per row without building the jacobian.
+
+    Args:
+        model (numpy.ndarray): Model visibilities with shape
+            (n_row, n_chan, n_dir).
+        weight (numpy.ndarray): Weights with shape (n_row,).
+        aug_jones (numpy.ndarray): Augmented jones with shape
+            (n_ant, n_chan, n_dir, 2).
+        antenna1 (numpy.ndarray): First antenna of each row.
+        antenna2 (numpy.ndarray): Second antenna of each row.
+
+    Returns:
+        u (numpy.ndarray): Diagonal of J^H J with shape (2N,), in
+        the same ordering as `gains_vector`.
+    """
+
+    # Dimensions
+    n_ant, n_chan, n_dir, _ = aug_jones.shape
+    n_row = model.shape[0]
+    axis_length = n_ant * n_chan * n_dir
+
+    # Result
+    u = np.zeros(2 * axis_length, dtype=np.float64)
+
+    for row in range(n_row):
+        # Antenna pairings
+        p = antenna1[row]
+        q = antenna2[row]
+
+        # Square-root of weight
+        sqrtW = np.sqrt(weight[row])
+
+        for nu in range(n_chan):
+            for s in range(n_dir):
+                lhs_p, lhs_q, rhs_q, rhs_p = _aug_jac_terms(
+                    sqrtW, model[row, nu, s], aug_jones, p, q, nu, s)
+
+                # State indices
+                idx_p = p + n_ant * s + n_ant * n_dir * nu
+                idx_q = q + n_ant * s + n_ant * n_dir * nu
+
+                # Sum of squared magnitudes per column
+                u[idx_p] += (lhs_p * lhs_p.conjugate()).real
+                u[idx_q] += (lhs_q * lhs_q.conjugate()).real
+                u[axis_length + idx_q] += (rhs_q * rhs_q.conjugate()).real
+                u[axis_length + idx_p] += (rhs_p * rhs_p.conjugate()).real
+
+    return u
+
+
+@njit(fastmath=True, nogil=True, cache=True)
+def accumulate_jhj_jhr(
+    u : np.ndarray,
+    z : np.ndarray,
+    model : np.ndarray, 
+    weight : np.ndarray, 
+    vis : np.ndarray,
+    aug_jones : np.ndarray,
+    aug_state : np.ndarray,
+    antenna1 : np.ndarray, 
+    antenna2 : np.ndarray    
+    ):
+
+    """Add the diagonal of J^H J and J^H r for the given rows 
+    to `u` and `z` in-place, see `compute_jhj_jhr`. The sums 
+    are over rows, so a time-bin can be passed in chunks of 
+    rows, or chunks accumulated separately and then added."""
+
+    # Dimensions
+    n_ant, n_chan, n_dir, _ = aug_jones.shape
+    n_row = model.shape[0]
+    axis_length = n_ant * n_chan * n_dir
+
+    for row in range(n_row):
+        # Antenna pairings
+        p = antenna1[row]
+        q = antenna2[row]
+
+        # Square-root of weight
+        sqrtW = np.sqrt(weight[row])
+
+        for nu in range(n_chan):
+            # Upper and lower residual, y - J x, 
+            # accumulated in double precision
+            r_upper = np.complex128(sqrtW * vis[row, nu])
+            r_lower = np.complex128(sqrtW * vis[row, nu].conjugate())
+
+            for s in range(n_dir):
+                lhs_p, lhs_q, rhs_q, rhs_p = _aug_jac_terms(
+                    sqrtW, model[row, nu, s], aug_jones, p, q, nu, s)
+
+                r_upper -= lhs_p * aug_state[p, nu, s, 0]\
+                            + rhs_q * aug_state[q, nu, s, 1]
+                r_lower -= lhs_q * aug_state[q, nu, s, 0]\
+                            + rhs_p * aug_state[p, nu, s, 1]
+
+            for s in range(n_dir):
+                lhs_p, lhs_q, rhs_q, rhs_p = _aug_jac_terms(
+                    sqrtW, model[row, nu, s], aug_jones, p, q, nu, s)
+
+                # State indices
+                idx_p = p + n_ant * s + n_ant * n_dir * nu
+                idx_q = q + n_ant * s + n_ant * n_dir * nu
+
+                # Diagonal of JHJ
+                u[idx_p] += (lhs_p * lhs_p.conjugate()).real
+                u[idx_q] += (lhs_q * lhs_q.conjugate()).real
+                u[axis_length + idx_q] += (rhs_q * rhs_q.conjugate()).real
+                u[axis_length + idx_p] += (rhs_p * rhs_p.conjugate()).real
+
+                # JHr
+                z[idx_p] += lhs_p.conjugate() * r_upper
+                z[idx_q] += lhs_q.conjugate() * r_lower
+                z[axis_length + idx_q] += rhs_q.conjugate() * r_upper
+                z[axis_length + idx_p] += rhs_p.conjugate() * r_lower
+
+
+
+@njit(fastmath=True, nogil=True, cache=True)
+def compute_jhj_jhr(
+    model : np.ndarray, 
+    weight : np.ndarray, 
+    vis : np.ndarray,
+    aug_jones : np.ndarray,
+    aug_state : np.ndarray,
+    antenna1 : np.ndarray, 
+    antenna2 : np.ndarray    
+    ):
+
+    """Diagonal of J^H J and J^H r, with r = y - J x, for the 
+    augmented jacobian at `aug_jones`, computed in a single pass
+    over the rows without building the jacobian or measurement
+    vector.
+
+    Args:
+        model (numpy.ndarray): Model visibilities with shape
+            (n_row, n_chan, n_dir).
+        weight (numpy.ndarray): Weights with shape (n_row,).
+        vis (numpy.ndarray): Visibilities with shape (n_row, n_chan).
+        aug_jones (numpy.ndarray): Augmented jones to linearise at, 
+            with shape (n_ant, n_chan, n_dir, 2).
+        aug_state (numpy.ndarray): Augmented jones form of the state, 
+            x, in the residual.
+        antenna1 (numpy.ndarray): First antenna of each row.
+        antenna2 (numpy.ndarray): Second antenna of each row.
+
+    Returns:
+        u (numpy.ndarray): Diagonal of J^H J with shape (2N,).
+        z (numpy.ndarray): J^H r with shape (2N,).
+    """
+
+    # Dimensions
+    n_ant, n_chan, n_dir, _ = aug_jones.shape
+    axis_length = n_ant * n_chan * n_dir
+
+    # Results
+    u = np.zeros(2 * axis_length, dtype=np.float64)
+    z = np.zeros(2 * axis_length, dtype=np.complex128)
+
+    # Accumulate over all rows
+    accumulate_jhj_jhr(u, z, model, weight, vis, aug_jones, 
+                        aug_state, antenna1, antenna2)
+
+    return u, z
+
+
+@njit(fastmath=True, nogil=True, cache=True)
+def chunked_jhj_jhr(
+    model : np.ndarray, 
+    weight : np.ndarray, 
+    vis : np.ndarray,
+    aug_jones : np.ndarray,
+    aug_state : np.ndarray,
+    antenna1 : np.ndarray, 
+    antenna2 : np.ndarray,
+    row_chunk : np.int32
+    ):
+
+    """Same as `compute_jhj_jhr`, but accumulated over chunks of 
+    `row_chunk` rows (all rows at once if 0), so only a single
+    chunk of rows is worked on at a time."""
+
+    # Dimensions
+    n_ant, n_chan, n_dir, _ = aug_jones.shape
+    n_row = model.shape[0]
+    axis_length = n_ant * n_chan * n_dir
+
+    # Results
+    u = np.zeros(2 * axis_length, dtype=np.float64)
+    z = np.zeros(2 * axis_length, dtype=np.complex128)
+
+    # Accumulate over chunks of rows
+    row_chunk = n_row if row_chunk < 1 else row_chunk
+    for start in range(0, n_row, row_chunk):
+        end = min(start + row_chunk, n_row)
+        accumulate_jhj_jhr(u, z, model[start:end], weight[start:end], 
+                            vis[start:end], aug_jones, aug_state, 
+                            antenna1[start:end], antenna2[start:end])
+
+    return u, z
+
+
+@njit(fastmath=True, nogil=True, cache=True)
+def compute_jhr(
+    model : np.ndarray, 
+    weight : np.ndarray, 
+    vis : np.ndarray,
+    aug_jones : np.ndarray,
+    aug_state : np.ndarray,
+    antenna1 : np.ndarray, 
+    antenna2 : np.ndarray    
+    ):
+
+    """J^H r, with r = y - J x, for the augmented jacobian at
+    `aug_jones`, computed without building the jacobian. See
+    `compute_jhj_jhr` for the arguments."""
+
+    _, z = compute_jhj_jhr(model, weight, vis, aug_jones, 
+                            aug_state, antenna1, antenna2)
+
+    return z
+
+
+@njit(fastmath=True, nogil=True, cache=True)
+def compute_residual_norm(
+    model : np.ndarray, 
+    weight : np.ndarray, 
+    vis : np.ndarray,
+    aug_jones : np.ndarray,
+    antenna1 : np.ndarray, 
+    antenna2 : np.ndarray    
+    ):
+
+    """Norm of the weighted residual between the visibilities and 
+    the visibilities predicted with `aug_jones`, i.e. the upper
+    half of y - J x with the jacobian taken at x. See 
+    `compute_jhj_jhr` for the arguments."""
+
+    # Dimensions
+    _, n_chan, n_dir, _ = aug_jones.shape
+    n_row = model.shape[0]
+
+    # Sum of squares, in double precision
+    norm2 = 0.0
+
+    for row in range(n_row):
+        # Antenna pairings
+        p = antenna1[row]
+        q = antenna2[row]
+
+        for nu in range(n_chan):
+            r = np.complex128(vis[row, nu])
+            for s in range(n_dir):
+                r -= aug_jones[p, nu, s, 0] * model[row, nu, s]\
+                        * aug_jones[q, nu, s, 1]
+            
+            norm2 += weight[row].real * (r.real**2 + r.imag**2)
+
+    return np.sqrt(norm2)
@@ -1,9 +1,10 @@
 import numpy as np
-from numba import jit, prange
+from numba import jit, prange, get_num_threads
+from scipy.linalg import cho_factor, cho_solve
 
 
-@jit(nopython=True, parallel=False,
-        fastmath=True, nogil=True)
+@jit(nopython=True, parallel=True,
+        fastmath=True, nogil=True, cache=True)
 def _csr_dot_vec_fn(
     A_data, 
     A_indices, 
@@ -14,7 +15,7 @@ def _csr_dot_vec_fn(
 
     Ax = np.zeros(A_rows, dtype=A_dtype)
 
-    for i in range(A_rows):
+    for i in prange(A_rows):
         Ax_i = 0.0
         for dataIdx in range(A_indptr[i], A_indptr[i + 1]):
             j = A_indices[dataIdx]
@@ -25,6 +26,139 @@ def _csr_dot_vec_fn(
     return Ax 
 
 
+@jit(nopython=True, parallel=True,
+        fastmath=True, nogil=True, cache=True)
+def _csr_dot_mat_fn(
+    A_data, 
+    A_indices, 
+    A_indptr, 
+    A_rows, 
+    A_dtype,
+    X):
+
+    AX = np.zeros((A_rows, X.shape[1]), dtype=A_dtype)
+
+    for i in prange(A_rows):
+        for dataIdx in range(A_indptr[i], A_indptr[i + 1]):
+            j = A_indices[dataIdx]
+            AX[i] += A_data[dataIdx] * X[j]
+
+    return AX
+
+
+@jit(nopython=True, fastmath=True, nogil=True, cache=True)
+def _row_bounds(A_rows, n_threads):
+    # Rows split into one chunk per thread
+    n_chunks = max(min(n_threads, A_rows), 1)
+    return np.linspace(0, A_rows, n_chunks + 1).astype(np.int64)
+
+
+@jit(nopython=True, parallel=True,
+        fastmath=True, nogil=True, cache=True)
+def _csr_herm_dot_mat_fn(
+    A_data, 
+    A_indices, 
+    A_indptr, 
+    A_rows, 
+    A_cols,
+    A_dtype,
+    X,
+    n_threads):
+
+    # Per-thread buffers, to scatter into columns without races
+    bounds = _row_bounds(A_rows, n_threads)
+    n_chunks = bounds.size - 1
+    buffers = np.zeros((n_chunks, A_cols, X.shape[1]), dtype=A_dtype)
+
+    for c in prange(n_chunks):
+        for i in range(bounds[c], bounds[c + 1]):
+            for dataIdx in range(A_indptr[i], A_indptr[i + 1]):
+                j = A_indices[dataIdx]
+                buffers[c, j] += np.conj(A_data[dataIdx]) * X[i]
+
+    # Reduce buffers
+    AhX = np.zeros((A_cols, X.shape[1]), dtype=A_dtype)
+    for j in prange(A_cols):
+        for c in range(n_chunks):
+            AhX[j] += buffers[c, j]
+
+    return AhX
+
+
+@jit(nopython=True, parallel=True,
+        fastmath=True, nogil=True, cache=True)
+def _csr_diag_aha_fn(
+    A_data, 
+    A_indices, 
+    A_indptr, 
+    A_rows, 
+    A_cols,
+    w,
+    n_threads):
+
+    # Per-thread buffers, to scatter into columns without races
+    bounds = _row_bounds(A_rows, n_threads)
+    n_chunks = bounds.size - 1
+    buffers = np.zeros((n_chunks, A_cols), dtype=np.float64)
+
+    for c in prange(n_chunks):
+        for i in range(bounds[c], bounds[c + 1]):
+            for dataIdx in range(A_indptr[i], A_indptr[i + 1]):
+                j = A_indices[dataIdx]
+                a = A_data[dataIdx]
+                buffers[c, j] += w[i] * (a.real * a.real + a.imag * a.imag)
+
+    # Reduce buffers
+    d = np.zeros(A_cols, dtype=np.float64)
+    for j in prange(A_cols):
+        for c in range(n_chunks):
+            d[j] += buffers[c, j]
+
+    return d
+
+
+@jit(nopython=True, parallel=True,
+        fastmath=True, nogil=True, cache=True)
+def _csr_chan_blocks_fn(
+    A_data, 
+    A_indices, 
+    A_indptr, 
+    A_rows, 
+    A_cols,
+    w,
+    n_chan):
+
+    # Channel block sizes
+    axis_length = A_cols//2
+    chan_length = axis_length//n_chan
+
+    T = np.zeros((n_chan, 2 * chan_length, 2 * chan_length), 
+                    dtype=np.complex128)
+
+    for nu in prange(n_chan):
+        for i in range(A_rows):
+            # Skip empty rows and rows of other channels
+            if A_indptr[i] == A_indptr[i + 1]:
+                continue
+            if (A_indices[A_indptr[i]] % axis_length)//chan_length != nu:
+                continue
+
+            for dataIdx1 in range(A_indptr[i], A_indptr[i + 1]):
+                # Column within channel block
+                j1 = A_indices[dataIdx1]
+                b1 = j1 % axis_length - nu * chan_length\
+                        + (j1 // axis_length) * chan_length
+                a1 = np.conj(A_data[dataIdx1]) * w[i]
+
+                for dataIdx2 in range(A_indptr[i], A_indptr[i + 1]):
+                    j2 = A_indices[dataIdx2]
+                    b2 = j2 % axis_length - nu * chan_length\
+                            + (j2 // axis_length) * chan_length
+                    T[nu, b1, b2] += a1 * A_data[dataIdx2]
+
+    return T
+
+
 def csr_dot_vec(A, x):
     A_data = A.data
     A_indices = A.indices
@@ -37,4 +171,98 @@ def csr_dot_vec(A, x):
                            A_indptr, 
                            A_rows,
                            A_dtype, 
-                           x)
\ No newline at end of file
+                           x)
+
+
+def csr_herm_dot_vec(A, x):
+    """Calculate A^H x for a CSR matrix A, without 
+    forming the conjugate transpose of A."""
+
+    return csr_herm_dot_mat(A, x[:, None])[:, 0]
+
+
+def csr_dot_mat(A, X):
+    """Calculate A X for a CSR matrix A and a dense 
+    matrix X, i.e. A applied to each column of X."""
+
+    A_dtype = np.result_type(A.dtype, X.dtype)
+
+    return _csr_dot_mat_fn(A.data, 
+                           A.indices,
+                           A.indptr, 
+                           A.shape[0],
+                           A_dtype, 
+                           X)
+
+
+def csr_herm_dot_mat(A, X):
+    """Calculate A^H X for a CSR matrix A and a dense
+    matrix X, without forming the conjugate transpose 
+    of A."""
+
+    A_dtype = np.result_type(A.dtype, X.dtype)
+
+    return _csr_herm_dot_mat_fn(A.data, 
+                                A.indices,
+                                A.indptr, 
+                                A.shape[0],
+                                A.shape[1],
+                                A_dtype, 
+                                X,
+                                get_num_threads())
+
+
+def csr_diag_aha(A, w=None):
+    """Calculate the diagonal of A^H W A for a CSR matrix 
+    A and diagonal W given as a 1D array (the identity
+    if not given), without forming A^H A."""
+
+    if w is None:
+        w = np.ones(A.shape[0], dtype=np.float64)
+
+    return _csr_diag_aha_fn(A.data, 
+                            A.indices,
+                            A.indptr, 
+                            A.shape[0],
+                            A.shape[1],
+                            w,
+                            get_num_threads())
+
+
+def chan_block_solve(J, Pinv, Rinv, v, n_chan):
+    """Solve the information form of the update, 
+    (Pinv + J^H Rinv J) x = J^H Rinv v, for the augmented 
+    jacobian `J` (CSR) with diagonal `Pinv` and `Rinv` given 
+    as 1D arrays. Channels do not couple, so the system is 
+    block-diagonal and each channel block is solved with a 
+    Cholesky factorisation. Returns x and the diagonal of 
+    (Pinv + J^H Rinv J)^{-1}."""
+
+    # Matrix-size
+    axis_length = J.shape[1]//2
+    chan_length = axis_length//n_chan
+
+    # Channel blocks of information matrix and vector
+    T = _csr_chan_blocks_fn(J.data, J.indices, J.indptr, 
+                            J.shape[0], J.shape[1], Rinv, n_chan)
+    b = csr_herm_dot_vec(J, Rinv * v)
+
+    # Solve per channel block
+    x = np.zeros(2 * axis_length, dtype=np.complex128)
+    Tinv_diag = np.zeros(2 * axis_length, dtype=np.float64)
+    for nu in range(n_chan):
+        # Stacked indices of channel
+        start = nu * chan_length
+        idx = np.r_[start:start + chan_length,
+                    axis_length + start:axis_length + start + chan_length]
+        
+        # Cholesky factor of dense channel block
+        T_nu = T[nu] + np.diag(Pinv[idx])
+        cho = cho_factor(T_nu, lower=True, check_finite=False)
+
+        # Solution and diagonal of the inverse
+        x[idx] = cho_solve(cho, b[idx], check_finite=False)
+        Tinv_diag[idx] = cho_solve(cho, np.eye(idx.size), 
+                                    check_finite=False).diagonal().real
+
+    return x, Tinv_diag
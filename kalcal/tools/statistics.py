@@ -1,5 +1,15 @@
 import numpy as np
-from kalcal.tools.utils import diag_cov_reshape
+from kalcal.tools.utils import diag_cov_reshape, gains_reshape
+
+
+def _cov_reshape(cov, shape):
+    """Reshape either a full covariance or only its diagonal
+    to jones-format."""
+
+    if cov.ndim == 1:
+        return gains_reshape(cov, shape).real
+    
+    return diag_cov_reshape(cov, shape)
     
 
 def state_sigma_test(states, true_jones, cov, n=1):
@@ -12,7 +22,7 @@ def state_sigma_test(states, true_jones, cov, n=1):
     stats = np.zeros_like(states, dtype=np.int16)
     shape = (n_ant, n_chan, n_dir, 2)
     for t in range(n_time):        
-        std = np.sqrt(diag_cov_reshape(cov[t], shape))    
+        std = np.sqrt(_cov_reshape(cov[t], shape))    
 
         for a in range(n_ant):
             for c in range(n_chan):
@@ -38,7 +48,7 @@ def magnitude_sigma_test(states, true_jones, cov, n=1, ref_ant=0):
     stats = np.zeros_like(states, dtype=np.int16)
     shape = (n_ant, n_chan, n_dir, 2)
     for t in range(n_time):        
-        std = np.sqrt(diag_cov_reshape(cov[t], shape))    
+        std = np.sqrt(_cov_reshape(cov[t], shape))    
 
         for a in range(n_ant):
             if a == ref_ant:
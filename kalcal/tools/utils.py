@@ -1,12 +1,11 @@
-from dask.optimization import inline
 from numba import jit, prange
 import numpy as np
 import dask.array as da
-import os
+import shutil
 
 
 def progress_bar(head, n_time, k):
-    width, _ = os.get_terminal_size()
+    width, _ = shutil.get_terminal_size()
     bar_len = width//5
     total = n_time - 1
     filled_len = int(round(bar_len*k/float(n_time - 1)))
@@ -17,31 +16,24 @@ def progress_bar(head, n_time, k):
 
 
 def concat_dir_axis(ms, model_columns):
-    """Special function to concatenate
-    all the sources in the MS by along
-    the direction axis."""
+    """Special function to lazily stack
+    all the sources in the MS along the
+    direction axis, in the precision of the
+    columns. Only the slices of the result
+    that are computed are read."""
 
-    sources = [ms.get(c).data for c in model_columns]
-    
-    n_row, n_chan, n_corr  = sources[0].shape
-    n_dir = len(sources)
-
-    model = np.zeros((n_row, n_chan, n_dir, n_corr), dtype=np.complex128)
-    for d, source in enumerate(sources):
-        model[:, :, d] = source.compute()
-    
     # Return Dask form
-    return da.from_array(model, chunks=model.shape)
+    return da.stack([ms.get(c).data for c in model_columns], axis=2)
 
 
-@jit(nopython=True, fastmath=True, nogil=True)
+@jit(nopython=True, fastmath=True, nogil=True, cache=True)
 def gains_reshape(g, shape):
     """Reshape the state-vector (gains) back to
     jones-format."""
 
     n_ant, n_chan, n_dir, _ = shape
     row_shape = n_ant * n_chan * n_dir
-    m = np.zeros((n_ant, n_chan, n_dir, 2), dtype=np.complex128)
+    m = np.zeros((n_ant, n_chan, n_dir, 2), dtype=g.dtype)
 
     for a in range(n_ant):
         for nu in range(n_chan):
@@ -53,14 +45,14 @@ def gains_reshape(g, shape):
     return m
 
 
-@jit(nopython=True, fastmath=True, nogil=True)
+@jit(nopython=True, fastmath=True, nogil=True, cache=True)
 def gains_vector(m):
     """Create stacked gains vector using the
     state vector."""
 
     n_ant, n_chan, n_dir, _ = m.shape
     row_shape = n_ant * n_chan * n_dir
-    g = np.zeros((2*row_shape), dtype=np.complex128)
+    g = np.zeros((2*row_shape), dtype=m.dtype)
 
     for a in range(n_ant):
         for nu in range(n_chan):
@@ -72,14 +64,47 @@ def gains_vector(m):
     return g
 
 
-@jit(nopython=True, fastmath=True, nogil=True)
+@jit(nopython=True, fastmath=True, nogil=True, cache=True)
+def chan_vector(g, nu, n_chan):
+    """Select the entries of a stacked gains vector (or 
+    covariance diagonal) that belong to channel `nu`, in 
+    the ordering of a single channel gains vector."""
+
+    axis_length = g.shape[0]//2
+    chan_length = axis_length//n_chan
+    start = nu * chan_length
+    end = start + chan_length
+
+    g_nu = np.zeros((2 * chan_length), dtype=g.dtype)
+    g_nu[:chan_length] = g[start:end]
+    g_nu[chan_length:] = g[axis_length + start:axis_length + end]
+
+    return g_nu
+
+
+@jit(nopython=True, fastmath=True, nogil=True, cache=True)
+def chan_vector_assign(g, g_nu, nu, n_chan):
+    """Inverse of `chan_vector`, i.e. place a single channel
+    gains vector (or covariance diagonal) for channel `nu` 
+    back into the stacked vector, in-place."""
+
+    axis_length = g.shape[0]//2
+    chan_length = axis_length//n_chan
+    start = nu * chan_length
+    end = start + chan_length
+
+    g[start:end] = g_nu[:chan_length]
+    g[axis_length + start:axis_length + end] = g_nu[chan_length:]
+
+
+@jit(nopython=True, fastmath=True, nogil=True, cache=True)
 def measure_vector(vis_data, weight, n_ant, n_chan):
     """Create stacked measurement vector using visibility
     data from the measurement."""
 
     n_bl = n_ant * (n_ant - 1)//2
     row_shape = n_chan * n_ant * (n_ant - 1)
-    y = np.zeros(row_shape, dtype=np.complex128)
+    y = np.zeros(row_shape, dtype=vis_data.dtype)
 
     n_row = vis_data.shape[0]
 
@@ -95,7 +120,44 @@ def measure_vector(vis_data, weight, n_ant, n_chan):
     return y
 
 
-@jit(nopython=True, fastmath=True, nogil=True)
+@jit(nopython=True, fastmath=True, nogil=True, parallel=True,
+        cache=True)
+def ensemble_measure_vector(model, weight, gains, ant1, ant2, 
+                                n_ant, n_chan):
+    """Predict stacked measurement vectors, as in `measure_vector`,
+    from the model and an ensemble of gains with shape (Nsamples, 
+    n_ant, n_chan, n_dir), one member per column. Members are 
+    predicted in parallel."""
+
+    Nsamples = gains.shape[0]
+    n_dir = model.shape[2]
+    n_bl = n_ant * (n_ant - 1)//2
+    row_shape = n_chan * n_ant * (n_ant - 1)
+    Y = np.zeros((row_shape, Nsamples), dtype=np.complex128)
+
+    n_row = model.shape[0]
+
+    for j in prange(Nsamples):
+        for row in range(n_row):
+            p = ant1[row]
+            q = ant2[row]
+            sqrtW = np.sqrt(weight[row])
+            for nu in range(n_chan):
+                # RIME over directions
+                data = 0.0j
+                for s in range(n_dir):
+                    data += gains[j, p, nu, s] * model[row, nu, s]\
+                            * gains[j, q, nu, s].conjugate()
+
+                row_upper = 2 * n_bl * nu + row % n_bl
+                row_lower = row_upper + n_bl
+                Y[row_upper, j] = sqrtW * data
+                Y[row_lower, j] = sqrtW * data.conjugate()
+
+    return Y
+
+
+@jit(nopython=True, fastmath=True, nogil=True, cache=True)
 def true_gains_vector(m):
     """Create stacked gains vector, but using the
     true jones rather than a state-vector for debug
@@ -156,13 +218,46 @@ def diag_mat_dot_mat(
     return C
 
 
-@jit(nopython=True, fastmath=True, nogil=True)
+@jit(nopython=True, fastmath=True, nogil=True, cache=True)
+def info_predict(lam, q):
+    """Predict step of a random-walk process in information
+    form, i.e. 1/(1/lam + q) for the inverse covariance 
+    diagonal `lam` and process noise diagonal `q`, without
+    converting `lam` back to a covariance."""
+
+    return lam / (1.0 + q * lam)
+
+
+@jit(nopython=True, fastmath=True, nogil=True, cache=True)
+def info_update(lam_p, u, alpha):
+    """Update step in information form for the predicted inverse
+    covariance diagonal `lam_p`, diagonal of JHJ `u` and step 
+    size `alpha`, i.e. the inverse of (1 - alpha)/lam_p + 
+    alpha/(lam_p + u). With alpha = 1 this is lam_p + u. Since 
+    `u` adds, it can be accumulated over (and merged from) parts
+    of the data before the update."""
+
+    return lam_p * (lam_p + u) / (lam_p + (1.0 - alpha) * u)
+
+
+def cov_diagonal(C):
+    """Real diagonal of a covariance given either as a 
+    (diagonal) matrix or as its diagonal only."""
+
+    C = np.asarray(C)
+    if C.ndim == 2:
+        C = np.diag(C)
+
+    return C.real.astype(np.float64)
+
+
+@jit(nopython=True, fastmath=True, nogil=True, cache=True)
 def diag_cov_reshape(P, shape):
 
     return gains_reshape(np.diag(P), shape).real
 
     
-@jit(nopython=True, fastmath=True, nogil=True)
+@jit(nopython=True, fastmath=True, nogil=True, cache=True)
 def diag_cov_flatten(P):
 
     return np.diag(gains_vector(P).real)
@@ -41,4 +41,43 @@ def new_Q(T, ms, Ps, G):
     Q_diag = np.diag(SIGMA - C - C.conj().T + PHI).real
 
     # Return new Q
-    return np.diag(Q_diag).real
\ No newline at end of file
+    return np.diag(Q_diag).real
+
+def new_P0_diag(m0, ms0, Ps0, alpha=1.0):
+    """Diagonal-only version of `new_P0`, where `Ps0` is the
+    diagonal of the smoothed covariance."""
+
+    print("==> Tuning P0 (DIAG)")
+    # Calculate diagonal of P0 - considering only the
+    # real values
+    e = gains_vector(ms0 - m0)
+    P0_diag = (Ps0 + e * e.conj()).real
+                 
+    # Return diagonal of P0 with alpha component
+    return alpha * P0_diag
+
+
+def new_Q_diag(T, ms, Ps, G):
+    """Diagonal-only version of `new_Q`, where `Ps` and `G`
+    are the diagonals of the smoothed covariances and 
+    smoother gains."""
+
+    print("==> Tuning Q (DIAG)")
+    SIGMA = np.zeros_like(Ps[0], dtype=np.complex128)
+    PHI = np.zeros_like(Ps[0], dtype=np.complex128)
+    C = np.zeros_like(Ps[0], dtype=np.complex128)
+    
+    for k in range(1, T + 1):
+        m1 = gains_vector(ms[k])
+        m2 = gains_vector(ms[k - 1])
+
+        SIGMA += Ps[k] + m1 * m1.conj()
+        PHI += Ps[k - 1] + m2 * m2.conj()
+        C += Ps[k] * G[k - 1].conj() + m1 * m2.conj()
+
+    SIGMA *= 1/T
+    PHI *= 1/T
+    C *= 1/T
+
+    # Return diagonal of new Q (real-values)
+    return (SIGMA - C - C.conj() + PHI).real
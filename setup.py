@@ -20,11 +20,11 @@ setuptools.setup(
     classifiers=[
         "Natural Language :: English",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.6",
+        "Programming Language :: Python :: 3.9",
         "License :: OSI Approved :: MIT License",
         "Operating System :: Unix",
     ],
-    python_requires='>=3.6',
+    python_requires='>=3.9',
     test_suite='tests',
     install_requires=requirements,
     include_package_data=True,
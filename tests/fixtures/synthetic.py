@@ -0,0 +1,61 @@
+import numpy as np
+
+
+def synthetic_data(n_ant=4, n_time=5, n_chan=2, n_dir=2,
+                    sigma_n=0.1, seed=42):
+    """A small synthetic observation in the layout of the
+    `load_data` fixture, with every baseline in every time-bin,
+    random model visibilities and weights, and gains that vary
+    smoothly in time. Needs no ms or sky model, so the numeric
+    checks run without the conftest fixtures."""
+
+    rng = np.random.default_rng(seed)
+
+    # Baselines of each time-bin
+    ant1, ant2 = np.triu_indices(n_ant, 1)
+    n_bl = ant1.size
+    n_row = n_bl * n_time
+    ant1 = np.tile(ant1.astype(np.int32), n_time)
+    ant2 = np.tile(ant2.astype(np.int32), n_time)
+    tbin_indices = np.arange(0, n_row, n_bl, dtype=np.int64)
+    tbin_counts = np.full(n_time, n_bl, dtype=np.int64)
+
+    # Gains around one, with their conjugate on the last axis
+    t = np.linspace(0, 1, n_time).reshape((-1, 1, 1, 1))
+    offset = rng.uniform(0, 2 * np.pi, (2, n_ant, n_chan, n_dir))
+    amplitude = 1.0 + 0.1 * np.sin(2 * np.pi * t + offset[0])
+    phase = 0.2 * np.cos(2 * np.pi * t + offset[1])
+    jones = np.zeros((n_time, n_ant, n_chan, n_dir, 2),
+                        dtype=np.complex128)
+    jones[..., 0] = amplitude * np.exp(1.0j * phase)
+    jones[..., 1] = jones[..., 0].conj()
+
+    # Model visibilities and weights
+    shape = (n_row, n_chan, n_dir)
+    model = rng.normal(size=shape) + 1.0j * rng.normal(size=shape)
+    weight = rng.uniform(0.5, 2.0, n_row)
+
+    # Visibilities from the RIME, without and with noise
+    k = np.repeat(np.arange(n_time), n_bl)
+    clean_vis = np.sum(jones[k, ant1, ..., 0] * model\
+                        * jones[k, ant2, ..., 0].conj(), axis=-1)
+    noise = rng.normal(size=shape[:2]) + 1.0j * rng.normal(size=shape[:2])
+    vis = clean_vis + sigma_n * noise/np.sqrt(2)
+
+    return tbin_indices, tbin_counts, ant1, ant2,\
+            clean_vis, vis, model, weight, jones
+
+
+def time_slice(data, k):
+    """Rows of time-bin `k` of `synthetic_data`, in the layout
+    of the `data_slice` fixture."""
+
+    tbin_indices, tbin_counts, ant1, ant2,\
+            clean_vis, vis, model, weight, jones = data
+
+    # Calculate Slices
+    row_slice = slice(tbin_indices[k], tbin_indices[k] + tbin_counts[k])
+
+    return (clean_vis[row_slice], vis[row_slice], model[row_slice],
+            weight[row_slice], ant1[row_slice], ant2[row_slice],
+            jones[k])
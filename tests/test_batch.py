@@ -0,0 +1,41 @@
+import os
+from kalcal.calibration.batch import expand_ms, ms_labels, _out_path
+import pytest
+
+
+# ~~!~~ TESTS ~~!~~
+
+def test_expand_ms(tmp_path):
+    for name in ["b.ms", "a.ms", "c.txt"]:
+        (tmp_path / name).mkdir()
+    pattern = str(tmp_path / "*.ms")
+    missing = str(tmp_path / "missing.ms")
+
+    msnames = expand_ms([pattern, str(tmp_path / "a.ms"),
+                            str(tmp_path / "." / "b.ms"), missing])
+
+    assert msnames == [str(tmp_path / "a.ms"),
+                        str(tmp_path / "b.ms"), missing]
+
+
+def test_ms_labels():
+    assert ms_labels(["data/obs1.ms/", "obs2.ms"]) == ["obs1", "obs2"]
+
+    # Same name in different directories
+    msnames = [os.path.join("data", "a", "obs.ms"),
+                os.path.join("data", "b", "obs.ms"),
+                os.path.join("data", "c.ms")]
+    assert ms_labels(msnames) == ["a-obs", "b-obs", "c"]
+
+    with pytest.raises(ValueError):
+        ms_labels([os.path.join("data", "a", "obs.ms"),
+                    os.path.join("data", "b", "obs.ms"),
+                    os.path.join("data", "a-obs.ms")])
+
+
+def test_out_path():
+
+    assert _out_path("obs1", "out", "gains/filter.npy")\
+            == os.path.join("out", "obs1-filter.npy")
+    assert _out_path("obs1.ms", "out", "") == ""
+    assert _out_path("obs1.ms", "out", None) is None
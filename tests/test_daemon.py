@@ -0,0 +1,55 @@
+from kalcal.calibration.daemon import MSCache, run_job
+from kalcal.calibration.vanilla import _setup
+from daskms import xds_from_ms, xds_to_table
+from .test_vanilla import write_ms, corrects_four_corr
+import dask.array as da
+import pytest
+
+
+def daemon_options(tmp_path, **kwargs):
+    kwargs = dict(kwargs, model_column="MODEL_DATA", algorithm="MFREE",
+                    sigma_n=1.0, ncpu=1, yaml=None,
+                    out_filter=str(tmp_path / "filter.npy"),
+                    out_smoother=str(tmp_path / "smoother.npy"))
+    return _setup(kwargs)
+
+
+def write_column(msname, column, scale):
+    MS = xds_from_ms(msname)[0]
+    MS = MS.assign(**{column : (("row", "chan", "corr"),
+                                    scale * MS.DATA.data)})
+    da.compute(xds_to_table(MS, msname, [column]))
+
+
+# ~~!~~ TESTS ~~!~~
+
+def test_jobs_stay_cached(tmp_path):
+    if not corrects_four_corr():
+        pytest.skip("codex-africanus cannot correct four correlations")
+
+    msname = str(tmp_path / "obs.ms")
+    write_ms(msname)
+    cache, options = MSCache(), daemon_options(tmp_path)
+
+    # Default options write corrected data to the ms
+    first = run_job(cache, options, {"ms" : msname})
+    second = run_job(cache, options, {"ms" : msname})
+
+    assert not first["cached"] and second["cached"]
+
+
+def test_cache_columns_read(tmp_path):
+    msname = str(tmp_path / "obs.ms")
+    write_ms(msname)
+    cache = MSCache()
+    options = daemon_options(tmp_path, out_data="", out_weight="")
+
+    assert not run_job(cache, options, {"ms" : msname})["cached"]
+
+    # Columns not read keep the ms cached
+    write_column(msname, "CORRECTED_DATA", 2.0)
+    assert run_job(cache, options, {"ms" : msname})["cached"]
+
+    # Columns read load it again
+    write_column(msname, "DATA", 2.0)
+    assert not run_job(cache, options, {"ms" : msname})["cached"]
@@ -0,0 +1,271 @@
+from kalcal.filters import ekf, iekf, enkf
+from kalcal.smoothers import eks
+from kalcal.tools.utils import gains_vector
+from .fixtures.synthetic import synthetic_data
+import numpy as np
+import pytest
+
+
+def make_priors(n_ant=4, n_chan=2, n_dir=2, sigma_f=0.01, sigma_n=0.1):
+    """Diagonal priors and noise for `synthetic_data`."""
+
+    mp = np.ones((n_ant, n_chan, n_dir, 2), dtype=np.complex128)
+    mp = gains_vector(mp)
+    Pp = np.ones(mp.size, dtype=np.float64)
+    Q = 2 * sigma_f * np.ones(mp.size, dtype=np.float64)
+    R = 2 * sigma_n * np.ones(n_ant * (n_ant - 1) * n_chan, 
+                                dtype=np.float64)
+
+    return mp, Pp, Q, R
+
+
+# ~~!~~ TESTS ~~!~~
+
+def test_ekf_diag_matches_numba():
+
+    (tbin_indices, tbin_counts, ant1, ant2,
+            _, vis, model, weight, _) = synthetic_data()
+    mp, Pp, Q, R = make_priors()
+
+    m_full, P_full = ekf.numba_algorithm(mp, np.diag(Pp).astype(np.complex128), 
+                            model, vis, weight, np.diag(Q).astype(np.complex128), 
+                            np.diag(R).astype(np.complex128), ant1, ant2, 
+                            tbin_indices, tbin_counts, 0.5)
+
+    m_diag, P_diag = ekf.diag_algorithm(mp, Pp, model, vis, weight, Q, R, 
+                            ant1, ant2, tbin_indices, tbin_counts, 0.5)
+
+    assert P_diag.shape == P_full.shape[:2]
+    assert np.allclose(m_full, m_diag)
+    assert np.allclose(np.diagonal(P_full, axis1=1, axis2=2).real, P_diag)
+
+
+def test_iekf_diag_matches_numba():
+
+    (tbin_indices, tbin_counts, ant1, ant2,
+            _, vis, model, weight, _) = synthetic_data()
+    mp, Pp, Q, R = make_priors()
+
+    # Tolerance is checked per channel in the diagonal
+    # version, so run the maximum iterations for both
+    m_full, P_full = iekf.numba_algorithm(mp, np.diag(Pp).astype(np.complex128), 
+                            model, vis, weight, np.diag(Q).astype(np.complex128), 
+                            np.diag(R).astype(np.complex128), ant1, ant2, 
+                            tbin_indices, tbin_counts, 0.5, 0.0)
+
+    m_diag, P_diag = iekf.diag_algorithm(mp, Pp, model, vis, weight, Q, R, 
+                            ant1, ant2, tbin_indices, tbin_counts, 0.5, 0.0)
+
+    assert np.allclose(m_full, m_diag)
+    assert np.allclose(np.diagonal(P_full, axis1=1, axis2=2).real, P_diag)
+
+
+def test_eks_diag_matches_numba():
+
+    (tbin_indices, tbin_counts, ant1, ant2,
+            _, vis, model, weight, _) = synthetic_data()
+    mp, Pp, Q, R = make_priors()
+
+    m, P = ekf.diag_algorithm(mp, Pp, model, vis, weight, Q, R, 
+                    ant1, ant2, tbin_indices, tbin_counts, 0.5)
+
+    ms_full, Ps_full, _ = eks.numba_algorithm(m, 
+            np.array([np.diag(p) for p in P]), np.diag(Q))
+    ms_diag, Ps_diag, _ = eks.diag_algorithm(m, P, Q)
+
+    assert np.allclose(ms_full, ms_diag)
+    assert np.allclose(np.diagonal(Ps_full, axis1=1, axis2=2), Ps_diag)
+
+
+def test_eks_scan_matches_diag():
+
+    (tbin_indices, tbin_counts, ant1, ant2,
+            _, vis, model, weight, _) = synthetic_data()
+    mp, Pp, Q, R = make_priors()
+
+    m, P = ekf.diag_algorithm(mp, Pp, model, vis, weight, Q, R, 
+                            ant1, ant2, tbin_indices, tbin_counts, 0.5)
+
+    ms_diag, Ps_diag, G_diag = eks.diag_algorithm(m, P, Q)
+    ms_scan, Ps_scan, G_scan = eks.scan_algorithm(m, P, Q)
+
+    assert np.allclose(ms_diag, ms_scan)
+    assert np.allclose(Ps_diag, Ps_scan)
+    assert np.allclose(G_diag, G_scan)
+
+
+@pytest.mark.parametrize("filt", [ekf, iekf])
+def test_mfree_matches_diag(filt):
+
+    (tbin_indices, tbin_counts, ant1, ant2,
+            _, vis, model, weight, _) = synthetic_data()
+    mp, Pp, Q, R = make_priors()
+
+    m_diag, P_diag = filt.diag_algorithm(mp, Pp, model, vis, weight, Q, R, 
+                            ant1, ant2, tbin_indices, tbin_counts, 0.5)
+
+    m_free, P_free = filt.mfree_algorithm(mp, Pp, model, vis, weight, Q, R, 
+                            ant1, ant2, tbin_indices, tbin_counts, 0.5)
+
+    assert np.allclose(m_diag, m_free)
+    assert np.allclose(P_diag, P_free)
+
+
+@pytest.mark.parametrize("filt", [ekf, iekf])
+def test_mfree_single_precision(filt):
+
+    (tbin_indices, tbin_counts, ant1, ant2,
+            _, vis, model, weight, _) = synthetic_data()
+    mp, Pp, Q, R = make_priors()
+
+    m_double, P_double = filt.mfree_algorithm(mp, Pp, model, vis, weight, 
+                            Q, R, ant1, ant2, tbin_indices, tbin_counts, 0.5)
+
+    single = [x.astype(np.complex64) for x in (mp, model, vis)]
+    single += [x.real.astype(np.float32) for x in (Pp, weight, Q, R)]
+    mp, model, vis, Pp, weight, Q, R = single
+
+    m_single, P_single = filt.mfree_algorithm(mp, Pp, model, vis, weight, 
+                            Q, R, ant1, ant2, tbin_indices, tbin_counts, 0.5)
+
+    assert m_single.dtype == np.complex64
+    assert P_single.dtype == np.float32
+    assert np.allclose(m_double, m_single, atol=1e-4)
+    assert np.allclose(P_double, P_single, atol=1e-4)
+
+
+def test_mfree_chunks_match_whole():
+
+    (tbin_indices, tbin_counts, ant1, ant2,
+            _, vis, model, weight, _) = synthetic_data()
+    mp, Pp, Q, R = make_priors()
+
+    m_whole, P_whole = ekf.mfree_algorithm(mp, Pp, model, vis, weight, 
+                            Q, R, ant1, ant2, tbin_indices, tbin_counts, 0.5)
+
+    # Feed the filter two time-chunks, one after the other
+    split = len(tbin_indices)//2
+    rows = tbin_indices[split]
+    ms, Ps = [], []
+    for sel, sl in [(slice(0, split), slice(0, rows)), 
+                        (slice(split, None), slice(rows, None))]:
+        m, P = ekf.mfree_chunk(mp, Pp, model[sl], vis[sl], weight[sl], Q, 
+                    ant1[sl], ant2[sl], tbin_indices[sel] - sl.start, 
+                    tbin_counts[sel], 0.5, ant2.max() + 1)
+        mp, Pp = gains_vector(m[-1]), P[-1]
+        ms.append(m)
+        Ps.append(P)
+
+    assert np.allclose(m_whole[1:], np.concatenate(ms)[:-1])
+    assert np.allclose(P_whole[1:], np.concatenate(Ps)[:-1])
+
+
+@pytest.mark.parametrize("filt", [ekf, iekf])
+def test_sparse_diagonal_priors(filt):
+
+    (tbin_indices, tbin_counts, ant1, ant2,
+            _, vis, model, weight, _) = synthetic_data()
+    mp, Pp, Q, R = make_priors()
+
+    m_full, P_full = filt.sparse_algorithm(mp, np.diag(Pp), 
+                            model, vis, weight, np.diag(Q), np.diag(R), 
+                            ant1, ant2, tbin_indices, tbin_counts, 
+                            alpha=0.5)
+
+    m_diag, P_diag = filt.sparse_algorithm(mp, Pp, model, vis, weight, 
+                            Q, R, ant1, ant2, tbin_indices, tbin_counts, 
+                            alpha=0.5)
+
+    assert P_full.ndim == 3 and P_diag.ndim == 2
+    assert np.allclose(m_full, m_diag)
+    assert np.allclose(np.diagonal(P_full, axis1=1, axis2=2).real, P_diag)
+
+
+def test_enkf_ensemble():
+
+    (tbin_indices, tbin_counts, ant1, ant2,
+            _, vis, model, weight, _) = synthetic_data()
+    mp, Pp, Q, R = make_priors()
+
+    m1, P1 = enkf.numba_algorithm(mp, Pp, model, vis, weight, Q, R, 
+                    ant1, ant2, tbin_indices, tbin_counts, 20, 42)
+    m2, P2 = enkf.numba_algorithm(mp, Pp, model, vis, weight, Q, R, 
+                    ant1, ant2, tbin_indices, tbin_counts, 20, 42)
+
+    assert P1.shape == (m1.shape[0], Pp.size)
+    assert np.array_equal(m1, m2) and np.array_equal(P1, P2)
+    assert np.allclose(m1[..., 1], m1[..., 0].conj())
+    assert (P1 > 0).all()
+
+
+@pytest.mark.parametrize("filt", [ekf, iekf])
+def test_info_matches_mfree(filt):
+
+    (tbin_indices, tbin_counts, ant1, ant2,
+            _, vis, model, weight, _) = synthetic_data()
+    mp, Pp, Q, R = make_priors()
+
+    m_mfree, P_mfree = filt.mfree_algorithm(mp, Pp, model, vis, weight, 
+                    Q, R, ant1, ant2, tbin_indices, tbin_counts, 0.5)
+    m_info, P_info = filt.info_algorithm(mp, Pp, model, vis, weight, 
+                    Q, R, ant1, ant2, tbin_indices, tbin_counts, 0.5)
+
+    assert np.allclose(m_mfree, m_info)
+    assert np.allclose(P_mfree, P_info)
+
+
+def test_iekf_adaptive_telemetry():
+
+    (tbin_indices, tbin_counts, ant1, ant2,
+            _, vis, model, weight, _) = synthetic_data()
+    mp, Pp, Q, R = make_priors()
+
+    # Without tolerance, all directions run every iteration
+    m_info, P_info = iekf.info_algorithm(mp, Pp, model, vis, weight, 
+                    Q, R, ant1, ant2, tbin_indices, tbin_counts, 
+                    0.5, 0.0, 3)
+    m, P, iters, resid = iekf.adaptive_algorithm(mp, Pp, model, vis, 
+                    weight, Q, R, ant1, ant2, tbin_indices, tbin_counts, 
+                    0.5, 0.0, 3)
+
+    n_time, n_chan, n_dir = len(tbin_indices), *model.shape[1:]
+    assert iters.shape == (n_time, n_chan, n_dir)
+    assert resid.shape == (n_time, n_chan)
+    assert (iters[1:] == 3).all() and (resid[1:] > 0).all()
+    assert np.allclose(m_info, m)
+    assert np.allclose(P_info, P)
+
+    # Levenberg steps with early exit per direction
+    _, _, iters, _ = iekf.adaptive_algorithm(mp, Pp, model, vis, 
+                    weight, Q, R, ant1, ant2, tbin_indices, tbin_counts, 
+                    0.5, 1e-3, 10, 0, 0.0, 1.0)
+
+    assert (iters[1:] >= 1).all() and (iters <= 10).all()
+
+
+@pytest.mark.parametrize("filt", [ekf, iekf])
+def test_diag_channels_parallel(filt):
+    from numba import jit
+    from numba.core.errors import NumbaPerformanceWarning
+    from kalcal.calibration.warmup import _observation
+    import warnings
+
+    n_ant, n_chan = 3, 1
+    model, vis, weight, ant1, ant2, tbin_indices, tbin_counts\
+        = _observation(np.complex128, n_ant)
+    mp = gains_vector(np.ones((n_ant, n_chan, 1, 2), dtype=np.complex128))
+    Pp = np.ones(mp.size, dtype=np.float64)
+    Q = 0.1 * np.ones(mp.size, dtype=np.float64)
+    R = np.ones(n_ant * (n_ant - 1) * n_chan, dtype=np.float64)
+
+    # Compile without the on-disk cache, where a loop that is
+    # not parallelised only warns
+    options = dict(filt.diag_algorithm.targetoptions)
+    options.pop("cache", None)
+    algorithm = jit(**options)(filt.diag_algorithm.py_func)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", NumbaPerformanceWarning)
+        algorithm(mp, Pp, model, np.ascontiguousarray(vis),
+                    np.ascontiguousarray(weight.real), Q, R, ant1, ant2,
+                    tbin_indices, tbin_counts, 0.5)
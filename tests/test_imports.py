@@ -18,6 +18,19 @@ def import_modules_list(imports):
     return True
 
 
+def test_import_calibration():
+    levels = [
+        "calibration",
+        "calibration.batch",
+        "calibration.daemon",
+        "calibration.stream",
+        "calibration.vanilla",
+        "calibration.warmup"
+    ]
+
+    assert import_modules_list(levels)
+
+
 def test_import_datasets():
     levels = [
         "datasets",
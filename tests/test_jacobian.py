@@ -1,5 +1,24 @@
 import numpy as np
 import pytest
+from kalcal.tools.jacobian import (compute_jhj_diag, 
+    compute_jhj_jhr, compute_jhr, compute_aug_csr_pattern,
+    update_aug_csr, chunked_jhj_jhr, compute_aug_np, 
+    compute_aug_coo, compute_aug_csr, _aug_jac_terms)
+from kalcal.tools.sparseops import chan_block_solve
+from kalcal.tools.utils import gains_vector, measure_vector
+from .fixtures.synthetic import synthetic_data, time_slice
+
+
+def synthetic_slice(k=2, **kwargs):
+    """Time-bin `k` of `synthetic_data`, with its numpy and 
+    CSR augmented jacobians."""
+
+    data_slice = time_slice(synthetic_data(**kwargs), k)
+    _, _, model, weight, ant1, ant2, jones = data_slice
+    jac_np = compute_aug_np(model, weight, jones, ant1, ant2)
+    jac_csr = compute_aug_csr(model, weight, jones, ant1, ant2)
+
+    return data_slice, jac_np, jac_csr
 
 
 # ~~!~~ TESTS ~~!~~
@@ -21,4 +40,112 @@ def test_sparse_csr_properties(jac_csr, jac_shape, jac_nnz):
 def test_numpy_properties(jac_np, jac_shape):    
 
     assert jac_np.dtype == np.complex128
-    assert jac_np.shape == jac_shape
\ No newline at end of file
+    assert jac_np.shape == jac_shape
+
+def test_csr_pattern():
+    data_slice, jac_np, _ = synthetic_slice()
+    _, _, model, weight, ant1, ant2, jones = data_slice
+    n_ant, n_chan, n_dir, _ = jones.shape
+    jac_nnz = 2 * n_chan * n_dir * n_ant * (n_ant - 1)
+
+    J = compute_aug_csr_pattern(ant1, ant2, n_ant, n_chan, n_dir)
+    data = J.data
+
+    J = update_aug_csr(J, model, weight, jones, ant1, ant2)
+    
+    assert J.data is data
+    assert J.has_sorted_indices
+    assert J.nnz == jac_nnz
+    assert np.allclose(J.toarray(), jac_np)
+
+
+def test_jhj_diag():
+    data_slice, jac_np, _ = synthetic_slice()
+    _, _, model, weight, ant1, ant2, jones = data_slice
+
+    u = compute_jhj_diag(model, weight, jones, ant1, ant2)
+
+    assert np.allclose(u, np.sum(np.abs(jac_np)**2, axis=0))
+
+
+def test_jhj_jhr():
+    data_slice, jac_np, _ = synthetic_slice()
+    _, vis, model, weight, ant1, ant2, jones = data_slice
+    n_ant, n_chan = jones.shape[:2]
+
+    y = measure_vector(vis, weight, n_ant, n_chan)
+    r = y - jac_np @ gains_vector(jones)
+
+    u, z = compute_jhj_jhr(model, weight, vis, jones, 
+                                jones, ant1, ant2)
+
+    assert np.allclose(u, np.sum(np.abs(jac_np)**2, axis=0))
+    assert np.allclose(z, jac_np.conjugate().T @ r)
+    assert np.allclose(z, compute_jhr(model, weight, vis, jones,
+                                        jones, ant1, ant2))
+
+
+@pytest.mark.parametrize("row_chunk", [0, 1, 5])
+def test_chunked_jhj_jhr(row_chunk):
+    data_slice, _, _ = synthetic_slice()
+    _, vis, model, weight, ant1, ant2, jones = data_slice
+
+    u, z = compute_jhj_jhr(model, weight, vis, jones, 
+                                jones, ant1, ant2)
+    u_chunk, z_chunk = chunked_jhj_jhr(model, weight, vis, jones,
+                                jones, ant1, ant2, row_chunk)
+
+    assert np.allclose(u, u_chunk)
+    assert np.allclose(z, z_chunk)
+
+
+def test_chan_block_solve():
+    data_slice, jac_np, jac_csr = synthetic_slice()
+    _, vis, _, weight, _, _, jones = data_slice
+    n_ant, n_chan = jones.shape[:2]
+
+    v = measure_vector(vis, weight, n_ant, n_chan)\
+            - jac_np @ gains_vector(jones)
+    Pinv = np.random.uniform(0.5, 2.0, jac_np.shape[1])
+    Rinv = np.random.uniform(0.5, 2.0, jac_np.shape[0])
+
+    Tinv = np.linalg.inv(np.diag(Pinv)\
+            + jac_np.conj().T @ np.diag(Rinv) @ jac_np)
+    x, Tinv_diag = chan_block_solve(jac_csr, Pinv, Rinv, v, n_chan)
+
+    assert np.allclose(x, Tinv @ jac_np.conj().T @ (Rinv * v))
+    assert np.allclose(Tinv_diag, np.diag(Tinv).real)
+
+
+def test_single_precision_kernels():
+    from numba import types
+    from kalcal.calibration.warmup import _observation
+
+    n_ant = 4
+    model, _, weight, ant1, ant2, _, tbin_counts\
+        = _observation(np.complex64, n_ant, 1)
+    weight = np.ascontiguousarray(weight.real)
+    jones = np.random.uniform(0.5, 2.0, (n_ant, 1, 1, 2))\
+                .astype(np.complex64)
+
+    J = compute_aug_np(model, weight, jones, ant1, ant2)
+    J_pattern = compute_aug_csr_pattern(ant1, ant2, n_ant, 1, 1,
+                                        np.complex64)
+    J_pattern = update_aug_csr(J_pattern, model, weight, jones, 
+                                ant1, ant2)
+
+    assert J.dtype == np.complex64
+    assert J_pattern.dtype == np.complex64
+    assert compute_aug_coo(model, weight, jones, 
+                            ant1, ant2).dtype == np.complex64
+    assert compute_aug_csr(model, weight, jones, 
+                            ant1, ant2).dtype == np.complex64
+    assert np.allclose(J_pattern.toarray(), J)
+
+    # Jacobian entries stay in single precision
+    _aug_jac_terms(np.sqrt(weight[0]), model[0, 0, 0], jones, 
+                    ant1[0], ant2[0], 0, 0)
+    signature = [sig for sig in _aug_jac_terms.nopython_signatures
+                    if sig.args[2].dtype == types.complex64][0]
+
+    assert signature.return_type == types.UniTuple(types.complex64, 4)
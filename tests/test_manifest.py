@@ -0,0 +1,41 @@
+import numpy as np
+from kalcal.cli.manifest import (resource_digest, step_fingerprint,
+    up_to_date, record)
+
+
+# ~~!~~ TESTS ~~!~~
+
+def test_resource_digest(tmp_path):
+    path = str(tmp_path / "gains.npy")
+    assert resource_digest(path) is None
+
+    np.save(path, np.ones(3))
+    digest = resource_digest(path)
+    assert digest == resource_digest(path)
+
+    np.save(path, np.zeros(3))
+    assert resource_digest(path) != digest
+
+
+def test_up_to_date(tmp_path):
+    source = str(tmp_path / "true.npy")
+    output = str(tmp_path / "filter.npy")
+    np.save(source, np.ones(3))
+    np.save(output, np.ones(3))
+
+    fingerprint = step_fingerprint("kal-calibrate vanilla",
+                                    {"sigma_f" : 0.1}, [source])
+    assert not up_to_date(fingerprint, [output])
+
+    record(fingerprint, [output])
+    assert up_to_date(fingerprint, [output])
+    assert (tmp_path / ".kalcal-manifest.json").is_file()
+
+    # Changed options, inputs or outputs
+    assert not up_to_date(step_fingerprint("kal-calibrate vanilla",
+                                    {"sigma_f" : 0.2}, [source]), [output])
+    np.save(source, np.zeros(3))
+    assert step_fingerprint("kal-calibrate vanilla",
+                            {"sigma_f" : 0.1}, [source]) != fingerprint
+    np.save(output, np.zeros(3))
+    assert not up_to_date(fingerprint, [output])
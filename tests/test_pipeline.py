@@ -0,0 +1,61 @@
+import click
+import pytest
+from kalcal.cli.calibrate_vanilla import vanilla
+from kalcal.cli.pipeline import (step_command, step_params,
+    infer_resources, step_dependencies)
+
+
+# ~~!~~ TESTS ~~!~~
+
+def test_step_command():
+    groups = {"kal-calibrate" : click.Group(commands=[vanilla])}
+
+    assert step_command(groups, "kal-calibrate vanilla") is vanilla
+    with pytest.raises(ValueError):
+        step_command(groups, "kal-calibrate batch")
+
+
+def test_step_params():
+    _, params = step_params(vanilla, "kal-calibrate vanilla",
+                            {"ms" : "obs.ms"}, {"sigma_f" : 0.5})
+
+    assert params["ms"] == "obs.ms"
+    assert params["sigma_f"] == 0.5
+    assert params["filter"] == 1
+    assert params["yaml"] is None
+
+    with pytest.raises(ValueError):
+        step_params(vanilla, "kal-calibrate vanilla",
+                    {"ms" : "obs.ms"}, {"sigma_q" : 0.5})
+
+
+def test_infer_resources():
+    _, params = step_params(vanilla, "kal-calibrate vanilla",
+                            {"ms" : "obs.ms"}, {"out_weight" : ""})
+    inputs, outputs = infer_resources("kal-calibrate vanilla", params)
+
+    assert inputs == ["obs.ms::MODEL_VIS", "obs.ms::DATA", "obs.ms::WEIGHT"]
+    assert outputs == ["filter.npy", "smoother.npy",
+                        "obs.ms::CORRECTED_DATA"]
+    assert infer_resources("kal-calibrate warmup", {}) is None
+
+    # Iteration statistics are saved next to the filter gains
+    params.update(algorithm="ADAPTIVE", out_data="")
+    _, outputs = infer_resources("kal-calibrate vanilla", params)
+    assert outputs == ["filter.npy", "smoother.npy", "filter.stats.npz"]
+
+
+def test_step_dependencies():
+    resources = [
+        ([], ["obs.ms"]),
+        (["obs.ms"], ["gains.npy"]),
+        (["obs.ms", "gains.npy"], ["obs.ms::DATA"]),
+        (["./obs.ms::DATA"], ["filter.npy"]),
+        (["obs.ms::DATA"], ["other.npy"]),
+        None,
+        (["filter.npy"], ["plot.png"])
+    ]
+
+    assert step_dependencies(resources) == [set(), {0}, {0, 1}, {0, 2},
+                                            {0, 2}, {0, 1, 2, 3, 4}, 
+                                            {3, 5}]
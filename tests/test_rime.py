@@ -1,5 +1,7 @@
 import numpy as np
 import pytest
+from kalcal.tools.utils import ensemble_measure_vector, measure_vector
+from .fixtures.synthetic import synthetic_data, time_slice
 
 
 # ~~!~~ TESTS ~~!~~
@@ -26,4 +28,20 @@ def test_rime_equation(n_time, n_chan, n_dir, load_data):
                     RHS += sqrtW * g_p * M_pq\
                             * g_q.conjugate()
                 
-                assert LHS == RHS
\ No newline at end of file
+                assert LHS == RHS
+
+
+def test_ensemble_rime_equation():
+
+    (clean_vis, _, model, weight, 
+            ant1, ant2, jones) = time_slice(synthetic_data(), 2)
+    n_ant, n_chan = jones.shape[:2]
+
+    gains = np.stack([jones[..., 0], 2 * jones[..., 0]])
+    Y = ensemble_measure_vector(model, weight, gains, 
+                                ant1, ant2, n_ant, n_chan)
+    y = measure_vector(clean_vis, weight, n_ant, n_chan)
+
+    assert Y.shape == (y.shape[0], 2)
+    assert np.allclose(Y[:, 0], y)
+    assert np.allclose(Y[:, 1], 4 * y)
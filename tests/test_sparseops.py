@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from kalcal.tools.sparseops import (csr_dot_vec, csr_herm_dot_vec,
+    csr_dot_mat, csr_herm_dot_mat, csr_diag_aha)
+from .test_jacobian import synthetic_slice
+
+
+# ~~!~~ TESTS ~~!~~
+
+def test_csr_dot_vec():
+    _, jac_np, jac_csr = synthetic_slice()
+    x = np.random.randn(jac_np.shape[1])\
+            + 1.0j * np.random.randn(jac_np.shape[1])
+
+    assert np.allclose(csr_dot_vec(jac_csr, x), jac_np @ x)
+
+
+def test_csr_herm_dot_vec():
+    _, jac_np, jac_csr = synthetic_slice()
+    x = np.random.randn(jac_np.shape[0])\
+            + 1.0j * np.random.randn(jac_np.shape[0])
+
+    assert np.allclose(csr_herm_dot_vec(jac_csr, x), 
+                        jac_np.conj().T @ x)
+
+
+@pytest.mark.parametrize("n_vec", [1, 5])
+def test_csr_dot_mat(n_vec):
+    _, jac_np, jac_csr = synthetic_slice()
+    X = np.random.randn(jac_np.shape[1], n_vec)\
+            + 1.0j * np.random.randn(jac_np.shape[1], n_vec)
+    Y = np.random.randn(jac_np.shape[0], n_vec)\
+            + 1.0j * np.random.randn(jac_np.shape[0], n_vec)
+
+    assert np.allclose(csr_dot_mat(jac_csr, X), jac_np @ X)
+    assert np.allclose(csr_herm_dot_mat(jac_csr, Y), 
+                        jac_np.conj().T @ Y)
+
+
+def test_csr_diag_aha():
+    _, jac_np, jac_csr = synthetic_slice()
+    w = np.random.uniform(0.5, 2.0, jac_np.shape[0])
+
+    assert np.allclose(csr_diag_aha(jac_csr), 
+                        np.diag(jac_np.conj().T @ jac_np).real)
+    assert np.allclose(csr_diag_aha(jac_csr, w), 
+                        np.diag(jac_np.conj().T @ np.diag(w) @ jac_np).real)
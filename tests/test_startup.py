@@ -0,0 +1,41 @@
+import subprocess
+import sys
+import os
+
+
+# Modules too slow to import when the cli starts
+HEAVY = ["dask", "daskms", "xarray", "africanus", "numba", "numpy",
+         "scipy", "matplotlib", "Tigger", "simms", "omegaconf",
+         "pkg_resources"]
+
+
+def run_python(code):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.run([sys.executable, "-c", code], cwd=root,
+                            capture_output=True, text=True, check=True)
+
+
+# ~~!~~ TESTS ~~!~~
+
+def test_cli_imports():
+    code = "import sys\n"\
+         + "import kalcal.cli.main\n"\
+         + f"print(','.join(m for m in {HEAVY} if m in sys.modules))"
+
+    assert run_python(code).stdout.strip() == ""
+
+
+def test_cli_startup_time():
+    code = "from time import perf_counter\n"\
+         + "start = perf_counter()\n"\
+         + "from kalcal.cli.main import kalcal_calibrate\n"\
+         + "try:\n"\
+         + "    kalcal_calibrate(['vanilla', '--help'])\n"\
+         + "except SystemExit:\n"\
+         + "    pass\n"\
+         + "print(perf_counter() - start)"
+
+    # Best of a few runs, to ignore a busy machine
+    times = [float(run_python(code).stdout.splitlines()[-1])
+                for _ in range(3)]
+    assert min(times) < 0.5
@@ -0,0 +1,39 @@
+from kalcal.calibration.stream import Prefetcher
+import threading
+import pytest
+
+
+# ~~!~~ TESTS ~~!~~
+
+@pytest.mark.parametrize("depth", [0, 1, 3])
+def test_prefetcher_order(depth):
+    prefetch = Prefetcher(lambda item: 2 * item, range(10), depth)
+
+    assert list(prefetch) == [2 * item for item in range(10)]
+
+
+@pytest.mark.parametrize("depth", [1, 3])
+def test_prefetcher_stops_early(depth):
+    loaded = []
+    def load(item):
+        loaded.append(item)
+        return item
+
+    before = threading.active_count()
+    for item in Prefetcher(load, range(100), depth):
+        if item == 2:
+            break
+
+    # Thread stopped, having loaded at most depth + 1 ahead
+    assert threading.active_count() == before
+    assert len(loaded) <= 3 + depth + 1
+
+
+def test_prefetcher_error():
+    def load(item):
+        if item == 2:
+            raise ValueError("Unreadable chunk")
+        return item
+
+    with pytest.raises(ValueError):
+        list(Prefetcher(load, range(5), 1))
@@ -0,0 +1,164 @@
+from kalcal.calibration.vanilla import (calibrate, _correction_jones,
+    _setup, _algorithms, _threadsafe_layer, stats_path, _window_bounds)
+from kalcal.filters import ekf
+from daskms import Dataset, xds_from_ms, xds_to_table
+import dask.array as da
+import numpy as np
+import pytest
+
+
+def write_ms(path, n_ant=4, n_time=3, n_chan=1, corr=(0,)):
+    """Write a main table with every baseline in every time-bin,
+    unit data and model visibilities in `corr` only."""
+
+    ant1, ant2 = np.triu_indices(n_ant, 1)
+    n_row = ant1.size * n_time
+    time = np.repeat(np.arange(n_time, dtype=np.float64), ant1.size)
+
+    model = np.zeros((n_row, n_chan, 4), dtype=np.complex64)
+    model[..., list(corr)] = 1.0
+    shape = (n_row, n_chan, 4)
+    dims = ("row", "chan", "corr")
+    columns = {
+        "TIME" : (("row",), da.from_array(time)),
+        "ANTENNA1" : (("row",), da.from_array(np.tile(ant1, n_time))),
+        "ANTENNA2" : (("row",), da.from_array(np.tile(ant2, n_time))),
+        "FIELD_ID" : (("row",), da.zeros(n_row, dtype=np.int32)),
+        "DATA_DESC_ID" : (("row",), da.zeros(n_row, dtype=np.int32)),
+        "MODEL_DATA" : (dims, da.from_array(model)),
+        "DATA" : (dims, da.from_array(model.copy())),
+        "FLAG" : (dims, da.zeros(shape, dtype=bool)),
+        "WEIGHT" : (("row", "corr"), da.ones((n_row, 4), 
+                                                dtype=np.float32))
+    }
+
+    da.compute(xds_to_table([Dataset(columns)], path, columns="ALL"))
+
+
+def corrects_four_corr():
+    """Whether the installed codex-africanus corrects four
+    correlations with diagonal gains (newer versions reject
+    more than two)."""
+
+    from africanus.calibration.utils import correct_vis
+
+    try:
+        correct_vis(np.array([0]), np.array([1]), np.array([0]),
+                    np.array([1]), np.ones((1, 2, 1, 1, 4), np.complex128),
+                    np.ones((1, 1, 4), np.complex128),
+                    np.zeros((1, 1, 4), bool))
+    except ValueError:
+        return False
+
+    return True
+
+
+# ~~!~~ TESTS ~~!~~
+
+@pytest.mark.parametrize("corr", [[0], [0, 3], [0, 1, 2, 3]])
+def test_correction_jones(corr):
+    gains = np.zeros((2, 3, 1, 1, 4, 2), dtype=np.complex128)
+    gains[..., corr, 0] = 1.0 + np.arange(len(corr))
+
+    jones = _correction_jones(gains, corr)
+    last = len(corr) if 3 in corr else 1
+
+    assert np.all(jones[..., 0] == 1.0)
+    assert np.all(jones[..., [1, 2]] == 1.0)
+    assert np.all(jones[..., 3] == last)
+
+
+def test_write_columns_none_mode(tmp_path):
+    if not corrects_four_corr():
+        pytest.skip("codex-africanus cannot correct four correlations")
+
+    msname = str(tmp_path / "none.ms")
+    write_ms(msname)
+
+    calibrate(msname, filter=1, smoother=1, algorithm="MFREE",
+                precision="DOUBLE", scan_smoother=False, sigma_f=0.01,
+                sigma_n=1.0, step_control=0.5, model_column="MODEL_DATA",
+                vis_column="DATA", weight_column="WEIGHT",
+                out_filter="", out_smoother="",
+                out_data="CORRECTED_DATA", out_weight="WEIGHT_SPECTRUM",
+                utime=None, prefetch=1, row_chunk=None, windows=None,
+                overlap=10, concurrent=False, ncpu=1, yaml=None)
+
+    MS = xds_from_ms(msname)[0]
+    corrected = MS.CORRECTED_DATA.data.compute()
+    weight = MS.WEIGHT_SPECTRUM.data.compute()
+
+    # Last correlation corrected with the first's gains
+    assert np.isfinite(corrected).all()
+    assert (weight[..., 3] > 0).all()
+    assert np.allclose(weight[..., 3], weight[..., 0])
+
+
+def test_setup_without_new_options(tmp_path):
+    # Config from before the newer options were added
+    config = tmp_path / "calibrate_vanilla.yml"
+    config.write_text("filter: 1\n"\
+                    + "smoother: 1\n"\
+                    + "algorithm: \"DIAG\"\n"\
+                    + "sigma_f: 0.0075\n"\
+                    + "sigma_n: 1.0\n"\
+                    + "step_control: 0.5\n"\
+                    + "model_column: \"MODEL_DATA\"\n"\
+                    + "vis_column: \"DATA\"\n"\
+                    + "weight_column: \"WEIGHT\"\n"\
+                    + "out_filter: \"filter.npy\"\n"\
+                    + "out_smoother: \"smoother.npy\"\n"\
+                    + "out_data: \"\"\n"\
+                    + "out_weight: \"\"\n")
+
+    for kwargs in [{"yaml" : str(config)},
+                    {"filter" : 1, "smoother" : 1, "algorithm" : "DIAG",
+                     "sigma_f" : 0.0075, "sigma_n" : 1.0, "yaml" : None}]:
+        options = _setup(kwargs)
+        kalman_filter, _, diag_cov = _algorithms(options)
+
+        assert kalman_filter is ekf.diag_algorithm and diag_cov
+        assert options.sigma_f == 0.0075
+        assert options.precision == "DOUBLE"
+        assert options.row_chunk is None and not options.concurrent
+
+
+def test_threadsafe_layer():
+    import numba
+
+    # Starts the threading layer if needed, without changing it
+    threadsafe = _threadsafe_layer()
+    assert threadsafe == (numba.threading_layer() in ["tbb", "omp"])
+
+
+def test_adaptive_statistics(tmp_path):
+    msname = str(tmp_path / "adaptive.ms")
+    write_ms(msname, n_time=4, corr=(0, 3))
+    out_filter = str(tmp_path / "filter.npy")
+
+    # Two filter runs, where the last runs backward in time
+    calibrate(msname, filter=2, smoother=1, algorithm="ADAPTIVE",
+                sigma_f=0.01, sigma_n=1.0, maxiter=3, 
+                model_column="MODEL_DATA", out_filter=out_filter, 
+                out_smoother="", out_data="", ncpu=1, yaml=None)
+
+    stats = np.load(stats_path(out_filter))
+    iters, resid = stats["iters"], stats["resid"]
+
+    # Iterations per time-bin, channel, direction and correlation
+    assert iters.shape == (4, 1, 1, 4)
+    assert resid.shape == (4, 1, 4)
+    assert (iters[:-1, ..., [0, 3]] >= 1).all() and (iters <= 3).all()
+    assert (iters[..., [1, 2]] == 0).all()
+    assert np.isfinite(resid).all()
+
+
+@pytest.mark.parametrize("n_windows, overlap", [(2, 0), (5, 0), (8, 1)])
+def test_window_bounds(n_windows, overlap):
+    n_time = 5
+    bounds = _window_bounds(n_time, n_windows, overlap)
+
+    # No more windows than time-bins, none empty
+    assert len(bounds) == min(n_windows, n_time)
+    assert all(t0 < t1 for t0, t1 in bounds)
+    assert bounds[0][0] == 0 and bounds[-1][1] == n_time